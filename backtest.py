@@ -0,0 +1,217 @@
+"""Backtesting vectorizado de la regla de puntuación Uptrend.
+
+La regla evaluada es la de ``detect_uptrend_signal``: se entra cuando el score
+cruza al alza el umbral (60 por defecto) y se sale cuando vuelve a caer por
+debajo. Todo se calcula con arrays (fechas × símbolos): eventos de entrada y
+salida, retornos a varios horizontes, tasa de acierto, retorno y máxima
+excursión adversa de cada operación, curva de una cartera equiponderada con
+su drawdown y rotación diaria.
+
+El universo se divide en bloques de símbolos que se procesan en paralelo en un
+pool de procesos; cada bloque devuelve sumas parciales que se combinan al
+final. Los símbolos guardados en el almacén columnar (``column_store``) no se
+envían a los procesos: cada uno lee su bloque de los ficheros mapeados.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from column_store import StoreSlice
+from indicators import Panel, compute_indicators, pack_rows, unpack_rows
+from pipeline import process_pool
+from scoring import MIN_BARS, UPTREND_THRESHOLD, bar_numbers, score_arrays
+
+DEFAULT_HORIZONS = (5, 10, 20)
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def backtest_chunk(chunk, threshold=UPTREND_THRESHOLD, horizons=DEFAULT_HORIZONS):
+    """Resultados parciales (sumables) del backtest de un bloque de símbolos
+
+    ``chunk`` es un diccionario símbolo -> DataFrame o un ``StoreSlice``.
+    """
+    panel = chunk.panel() if isinstance(chunk, StoreSlice) else Panel.from_frames(chunk)
+    panel = compute_indicators(panel)
+    close = panel['Close']
+    valid = ~np.isnan(close)
+    _, score = score_arrays(panel.columns, bar_numbers(close))
+    signal = (score >= threshold) & valid
+
+    # Cada símbolo sobre su propia secuencia de barras (filas válidas al principio)
+    order, lengths = pack_rows(valid)
+    c = np.take_along_axis(close, order, axis=0)
+    s = np.take_along_axis(signal, order, axis=0)
+    n_rows = len(c)
+    rows = np.arange(n_rows)[:, None]
+    inside = rows < lengths
+    s &= inside
+
+    prev = np.vstack([np.zeros((1, s.shape[1]), dtype=bool), s[:-1]])
+    entries = s & ~prev
+    exits = ~s & prev & inside
+
+    # Retornos a cada horizonte desde la barra de entrada (y de referencia: todas las barras puntuables)
+    scorable = inside & (rows >= MIN_BARS - 1)
+    horizon_stats = {}
+    for h in horizons:
+        forward = np.full_like(c, np.nan)
+        if h < n_rows:
+            forward[:-h] = c[h:] / c[:-h] - 1
+        forward[rows + h >= lengths] = np.nan
+        at_entry = forward[entries]
+        at_entry = at_entry[~np.isnan(at_entry)]
+        base = forward[scorable]
+        base = base[~np.isnan(base)]
+        horizon_stats[h] = {
+            'n': len(at_entry),
+            'hits': int((at_entry > 0).sum()),
+            'sum': float(at_entry.sum()),
+            'base_n': len(base),
+            'base_sum': float(base.sum()),
+        }
+
+    # Operaciones: desde la entrada hasta la primera barra fuera de señal (o el final)
+    exit_rows = np.where(~s & inside, rows, n_rows)
+    next_exit = np.minimum.accumulate(exit_rows[::-1], axis=0)[::-1]
+    next_exit = np.minimum(next_exit, lengths - 1)
+
+    entry_cols, entry_rows = np.nonzero(entries.T)
+    exit_at = next_exit[entry_rows, entry_cols]
+    entry_price = c[entry_rows, entry_cols]
+    trade_return = c[exit_at, entry_cols] / entry_price - 1
+    still_open = s[exit_at, entry_cols]
+
+    # Máxima excursión adversa: mínimo del cierre dentro de cada operación
+    flat = np.append(c.T.ravel(), np.nan)
+    bounds = np.empty(2 * len(entry_rows), dtype=np.int64)
+    bounds[0::2] = entry_cols * n_rows + entry_rows
+    bounds[1::2] = entry_cols * n_rows + exit_at + 1
+    if len(bounds):
+        adverse = np.minimum.reduceat(flat, bounds)[0::2] / entry_price - 1
+    else:
+        adverse = np.empty(0)
+
+    trades = pd.DataFrame({
+        'symbol': np.array(panel.symbols, dtype=object)[entry_cols],
+        'entry_date': panel.dates[order[entry_rows, entry_cols]],
+        'exit_date': panel.dates[order[exit_at, entry_cols]],
+        'bars': exit_at - entry_rows,
+        'return': trade_return,
+        'max_adverse': adverse,
+        'open': still_open,
+    })
+
+    # Cartera equiponderada: posición mantenida desde el cierre de la barra con señal
+    held = prev & inside
+    daily_return = np.full_like(c, np.nan)
+    daily_return[1:] = c[1:] / c[:-1] - 1
+    contribution = np.where(held, daily_return, 0.0)
+    changes = (entries | exits).astype('float64')
+
+    def on_dates(values):
+        return np.nan_to_num(unpack_rows(values.astype('float64'), order, valid)).sum(axis=1)
+
+    daily = pd.DataFrame({
+        'return_sum': on_dates(contribution),
+        'positions': on_dates(held),
+        'changes': on_dates(changes),
+        'active': valid.sum(axis=1).astype('float64'),
+    }, index=panel.dates)
+
+    return {'horizons': horizon_stats, 'trades': trades, 'daily': daily, 'symbols': len(panel.symbols)}
+
+
+def _backtest_chunk_args(args):
+    return backtest_chunk(*args)
+
+
+def combine(partials, horizons=DEFAULT_HORIZONS):
+    """Combina los resultados parciales de todos los bloques en métricas finales"""
+    partials = [p for p in partials if p['symbols']]
+    trades = pd.concat([p['trades'] for p in partials], ignore_index=True) if partials else pd.DataFrame()
+    daily = None
+    for p in partials:
+        daily = p['daily'] if daily is None else daily.add(p['daily'], fill_value=0)
+    if daily is None:
+        daily = pd.DataFrame(columns=['return_sum', 'positions', 'changes', 'active'])
+
+    horizon_rows = []
+    for h in horizons:
+        n = sum(p['horizons'][h]['n'] for p in partials)
+        hits = sum(p['horizons'][h]['hits'] for p in partials)
+        total = sum(p['horizons'][h]['sum'] for p in partials)
+        base_n = sum(p['horizons'][h]['base_n'] for p in partials)
+        base_total = sum(p['horizons'][h]['base_sum'] for p in partials)
+        mean = total / n if n else np.nan
+        base_mean = base_total / base_n if base_n else np.nan
+        horizon_rows.append({
+            'horizon': h,
+            'signals': n,
+            'hit_rate': hits / n if n else np.nan,
+            'mean_return': mean,
+            'baseline_return': base_mean,
+            'excess_return': mean - base_mean,
+        })
+    horizon_table = pd.DataFrame(horizon_rows).set_index('horizon')
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        portfolio_return = np.where(daily['positions'] > 0, daily['return_sum'] / daily['positions'], 0.0)
+        turnover = np.where(daily['active'] > 0, daily['changes'] / daily['active'], np.nan)
+    equity = pd.Series(np.cumprod(1 + portfolio_return), index=daily.index, name='equity')
+    drawdown = equity / equity.cummax() - 1
+
+    closed = trades[~trades['open']] if len(trades) else trades
+    summary = {
+        'symbols': sum(p['symbols'] for p in partials),
+        'trades': len(trades),
+        'open_trades': int(trades['open'].sum()) if len(trades) else 0,
+        'win_rate': float((closed['return'] > 0).mean()) if len(closed) else np.nan,
+        'mean_trade_return': float(closed['return'].mean()) if len(closed) else np.nan,
+        'mean_holding_bars': float(closed['bars'].mean()) if len(closed) else np.nan,
+        'mean_max_adverse': float(trades['max_adverse'].mean()) if len(trades) else np.nan,
+        'total_return': float(equity.iloc[-1] - 1) if len(equity) else np.nan,
+        'max_drawdown': float(drawdown.min()) if len(drawdown) else np.nan,
+        'exposure': float((daily['positions'] > 0).mean()) if len(daily) else np.nan,
+        'mean_daily_turnover': float(np.nanmean(turnover)) if len(daily) else np.nan,
+    }
+    return {
+        'summary': summary,
+        'horizons': horizon_table,
+        'trades': trades,
+        'equity': equity,
+        'drawdown': drawdown,
+    }
+
+
+def run_backtest(frames, threshold=UPTREND_THRESHOLD, horizons=DEFAULT_HORIZONS,
+                 chunk_size=50, workers=None, store=None, start=None):
+    """Backtest del universo completo repartiendo bloques de símbolos entre procesos
+
+    Con ``store`` (``ColumnStore``) los símbolos guardados en él se leen desde
+    ``start`` en cada proceso en lugar de enviar sus DataFrames.
+    """
+    frames = {s: d for s, d in frames.items() if d is not None and not d.empty}
+    stored = set(store.symbols) if store is not None else set()
+    in_store = [s for s in frames if s in stored]
+    loose = [s for s in frames if s not in stored]
+    tasks = [
+        (StoreSlice(store.path, chunk, start), threshold, tuple(horizons))
+        for chunk in _chunks(in_store, chunk_size)
+    ] + [
+        ({s: frames[s] for s in chunk}, threshold, tuple(horizons))
+        for chunk in _chunks(loose, chunk_size)
+    ]
+    if workers is None:
+        workers = min(len(tasks), os.cpu_count() or 1)
+
+    if workers <= 1 or len(tasks) <= 1:
+        partials = [backtest_chunk(*task) for task in tasks]
+    else:
+        with process_pool(workers) as executor:
+            partials = list(executor.map(_backtest_chunk_args, tasks))
+    return combine(partials, horizons)
@@ -0,0 +1,315 @@
+"""Benchmarks del escáner sobre el mercado sintético, con detección de regresiones.
+
+Mide, para universos de 100, 1.000 y 10.000 símbolos:
+
+- ``synthetic``: generar el universo completo con 10 años diarios;
+- ``scan``: el escaneo completo de ``uptrend_scan.py scan`` (descarga en frío,
+  indicadores y puntuación de todos los símbolos);
+- ``get_data``, ``calculate_indicators``, ``detect_uptrend_signal`` y
+  ``analyze_symbol``: la mediana por llamada sobre una muestra de símbolos, con
+  la caché local ya poblada por el escaneo (el estado habitual tras el primero).
+
+Las descargas van contra un servidor local que responde como la API de gráficos
+de Yahoo con series de ``SyntheticMarket`` (en otro proceso, para no competir
+por el GIL): se mide el camino real de red, parseo y caché local sin depender de
+internet, y los datos son los mismos en cada ejecución. Cada tamaño usa una
+caché local nueva en un directorio temporal.
+
+Los tiempos se comparan con los de referencia guardados (``BASELINES_PATH``);
+un caso más lento que su referencia por encima de ``--tolerance`` se marca como
+regresión y el programa termina con error. ``--update-baseline`` guarda los
+tiempos de la ejecución como nueva referencia. Las referencias se guardan por
+número de núcleos (el escaneo reparte el cálculo entre procesos): en una
+máquina con otro número de núcleos no hay con qué comparar y la comprobación se
+omite hasta que se guarden las suyas.
+
+Ejemplos:
+    python benchmark.py
+    python benchmark.py --sizes 100 1000 --tolerance 0.5
+    python benchmark.py --update-baseline
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy as np
+import pandas as pd
+
+from column_store import ColumnStore
+from fetcher import FetchScheduler
+from indicators import OHLCV_COLUMNS
+from price_cache import PriceCache
+from synthetic import DEFAULT_SEED, SyntheticMarket
+from universe import Universe
+from uptrend_core import UptrendAnalyzer
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baselines.json')
+
+SIZES = (100, 1000, 10000)
+CASES = ('synthetic', 'scan', 'get_data', 'calculate_indicators', 'detect_uptrend_signal', 'analyze_symbol')
+# Casos medidos por llamada (mediana sobre la muestra); el resto, en total
+PER_CALL = {'get_data', 'calculate_indicators', 'detect_uptrend_signal', 'analyze_symbol'}
+
+SAMPLE = 50
+TOLERANCE = 0.25
+SYNTHETIC_PERIOD = '10y'
+
+# Hora de las barras diarias en las respuestas del servidor (apertura de Nueva York, en UTC)
+_BAR_OFFSET = pd.Timedelta(hours=13, minutes=30)
+
+
+def benchmark_symbols(count):
+    """Símbolos sintéticos del universo de ``count`` símbolos (los de uno menor son un prefijo)"""
+    return [f'SYN{i:05d}' for i in range(count)]
+
+
+class _ChartHandler(BaseHTTPRequestHandler):
+    """``/v8/finance/chart/<símbolo>`` con series del mercado sintético (``range`` o ``period1``)"""
+    protocol_version = 'HTTP/1.1'
+    # Cabeceras y cuerpo van en escrituras separadas: sin esto, Nagle y el ACK retardado suman ~40 ms
+    disable_nagle_algorithm = True
+    market = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        symbol = unquote(url.path.rsplit('/', 1)[-1])
+        interval = query.get('interval', ['1d'])[0]
+        if 'period1' in query:
+            start = pd.Timestamp(int(query['period1'][0]), unit='s').normalize()
+            dates = pd.bdate_range(start, pd.Timestamp.now().normalize())
+        else:
+            dates = self.market.dates(query.get('range', ['6mo'])[0], interval)
+        data = self.market.frame(symbol, dates, interval)
+
+        quote_ = {name.lower(): data[name].tolist() for name in OHLCV_COLUMNS}
+        stamps = pd.DatetimeIndex(data.index)
+        if stamps.tz is None:
+            stamps = stamps + _BAR_OFFSET
+        result = {
+            'meta': {'symbol': symbol, 'exchangeTimezoneName': 'America/New_York'},
+            'timestamp': (stamps.as_unit('s').asi8).tolist(),
+            'indicators': {'quote': [quote_], 'adjclose': [{'adjclose': quote_['close']}]},
+        }
+        body = json.dumps({'chart': {'result': [result], 'error': None}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _serve_charts(seed, ready):
+    _ChartHandler.market = SyntheticMarket(seed=seed)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _ChartHandler)
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+class ChartServer:
+    """Servidor local de series sintéticas en un proceso aparte (``with ChartServer() as url``)"""
+
+    def __init__(self, seed=DEFAULT_SEED):
+        self.seed = seed
+        self.process = None
+
+    def __enter__(self):
+        ready = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=_serve_charts, args=(self.seed, ready), daemon=True)
+        self.process.start()
+        return f'http://127.0.0.1:{ready.get(timeout=30)}'
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.join()
+        return False
+
+
+def _analyzer(url, cache_dir):
+    """Analizador sin modo demo que descarga del servidor local y guarda en ``cache_dir``"""
+    analyzer = UptrendAnalyzer(
+        fetcher=FetchScheduler(base_url=url, max_in_flight=32, rate=10000.0, backend='chart'),
+        universe=Universe({}),
+    )
+    analyzer.price_cache = PriceCache(os.path.join(cache_dir, 'prices.sqlite'))
+    analyzer.column_store = ColumnStore(os.path.join(cache_dir, 'columns'))
+    analyzer.indicator_states_path = os.path.join(cache_dir, 'indicator_states.json')
+    return analyzer
+
+
+def _timed(function, *args):
+    started = time.perf_counter()
+    value = function(*args)
+    return time.perf_counter() - started, value
+
+
+def _per_call(function, items):
+    """Mediana del tiempo por llamada de ``function`` sobre ``items`` y los valores devueltos"""
+    timings, values = [], []
+    for item in items:
+        elapsed, value = _timed(function, item)
+        timings.append(elapsed)
+        values.append(value)
+    return statistics.median(timings), values
+
+
+def run_size(size, url, cases=CASES, sample=SAMPLE, seed=DEFAULT_SEED):
+    """Tiempos (segundos) de cada caso para un universo de ``size`` símbolos"""
+    symbols = benchmark_symbols(size)
+    sampled = symbols[:sample]
+    timings = {}
+
+    if 'synthetic' in cases:
+        market = SyntheticMarket(seed=seed)
+        dates = market.dates(SYNTHETIC_PERIOD)
+        timings['synthetic'], _ = _timed(lambda: sum(1 for _ in market.iter_panels(symbols, dates)))
+
+    with tempfile.TemporaryDirectory(prefix='uptrend-bench-') as cache_dir:
+        analyzer = _analyzer(url, cache_dir)
+        # El escaneo va siempre primero: puebla la caché local para los casos por llamada
+        elapsed, results = _timed(analyzer.scan, {'Benchmark': symbols})
+        if len(results) != size:
+            raise RuntimeError(f"El escaneo devolvió {len(results)} resultados de {size}")
+        if 'scan' in cases:
+            timings['scan'] = elapsed
+
+        if 'get_data' in cases:
+            timings['get_data'], _ = _per_call(analyzer.get_data, sampled)
+        frames = [analyzer.get_data(symbol) for symbol in sampled]
+        elapsed, calculated = _per_call(analyzer.calculate_indicators, frames)
+        if 'calculate_indicators' in cases:
+            timings['calculate_indicators'] = elapsed
+        if 'detect_uptrend_signal' in cases:
+            timings['detect_uptrend_signal'], _ = _per_call(analyzer.detect_uptrend_signal, calculated)
+        if 'analyze_symbol' in cases:
+            timings['analyze_symbol'], _ = _per_call(analyzer.analyze_symbol, sampled)
+    return timings
+
+
+def machine_key(cpus=None):
+    """Clave de las referencias de una máquina: su número de núcleos"""
+    return str(cpus or os.cpu_count() or 1)
+
+
+def _read_baselines(path):
+    if not os.path.exists(path):
+        return {'machines': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_baselines(path=BASELINES_PATH, cpus=None):
+    """Referencias guardadas para ``cpus`` núcleos (por defecto, los de esta máquina); {} si no hay"""
+    return _read_baselines(path)['machines'].get(machine_key(cpus), {})
+
+
+def save_baselines(timings, path=BASELINES_PATH, previous=None):
+    """Guarda ``timings`` ({tamaño: {caso: segundos}}) sobre las referencias anteriores de esta máquina
+
+    Las referencias de máquinas con otro número de núcleos se conservan.
+    """
+    sizes = dict((previous or {}).get('sizes', {}))
+    for size, cases in timings.items():
+        sizes[str(size)] = {**sizes.get(str(size), {}), **cases}
+    stored = _read_baselines(path)
+    stored['machines'][machine_key()] = {
+        'updated_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'machine': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'sizes': sizes,
+    }
+    with open(path, 'w') as f:
+        json.dump(stored, f, indent=2)
+        f.write('\n')
+
+
+def compare(timings, baselines, tolerance=TOLERANCE):
+    """Filas (tamaño, caso, segundos, referencia, cociente, regresión) de la comparación"""
+    reference = baselines.get('sizes', {})
+    rows = []
+    for size, cases in timings.items():
+        for case, seconds in cases.items():
+            base = reference.get(str(size), {}).get(case)
+            ratio = seconds / base if base else None
+            rows.append((size, case, seconds, base, ratio, ratio is not None and ratio > 1 + tolerance))
+    return rows
+
+
+def _format_seconds(seconds, case):
+    if seconds is None:
+        return '-'
+    return f'{seconds * 1000:.2f} ms' if case in PER_CALL else f'{seconds:.2f} s'
+
+
+def report(rows):
+    lines = [f"{'símbolos':>8}  {'caso':<32} {'tiempo':>11} {'referencia':>11} {'cociente':>8}"]
+    for size, case, seconds, base, ratio, regressed in rows:
+        lines.append(
+            f"{size:>8}  {case + (' (llamada)' if case in PER_CALL else ''):<32} "
+            f"{_format_seconds(seconds, case):>11} {_format_seconds(base, case):>11} "
+            f"{'-' if ratio is None else f'{ratio:.2f}x':>8}{'  ⚠️ REGRESIÓN' if regressed else ''}"
+        )
+    return '\n'.join(lines)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmarks del escáner sobre el mercado sintético")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help="Tamaños del universo")
+    parser.add_argument('--cases', nargs='+', choices=CASES, default=list(CASES), help="Casos a medir")
+    parser.add_argument('--sample', type=int, default=SAMPLE,
+                        help=f"Símbolos de la muestra de los casos por llamada (por defecto {SAMPLE})")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="Semilla del mercado sintético")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help=f"Margen sobre la referencia antes de marcar una regresión (por defecto {TOLERANCE})")
+    parser.add_argument('--baseline', default=BASELINES_PATH, help="Fichero JSON de referencias")
+    parser.add_argument('--update-baseline', action='store_true', help="Guarda estos tiempos como referencia")
+    parser.add_argument('-o', '--output', help="Escribe también los tiempos en JSON")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    baselines = load_baselines(args.baseline)
+    if not baselines and not args.update_baseline:
+        print(f"Sin referencias para {machine_key()} núcleos: no se comprueban regresiones "
+              "(--update-baseline las guarda)", flush=True)
+    timings = {}
+    with ChartServer(args.seed) as url:
+        for size in args.sizes:
+            timings[size] = run_size(size, url, args.cases, args.sample, args.seed)
+            print(report(compare({size: timings[size]}, baselines, args.tolerance)).split('\n', 1)[1], flush=True)
+
+    rows = compare(timings, baselines, args.tolerance)
+    print()
+    print(report(rows))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({str(size): cases for size, cases in timings.items()}, f, indent=2)
+    if args.update_baseline:
+        save_baselines(timings, args.baseline, baselines)
+        print(f"Referencias actualizadas en {args.baseline}")
+        return
+
+    regressions = [f"{case} ({size} símbolos)" for size, case, *_, regressed in rows if regressed]
+    if regressions:
+        raise SystemExit(f"Regresiones de rendimiento: {', '.join(regressions)}")
+
+
+if __name__ == '__main__':
+    main()
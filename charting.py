@@ -0,0 +1,135 @@
+"""Gráficos de precio con reducción de puntos en el servidor y trazas WebGL.
+
+Un histórico largo (10 años diarios, 2 años de barras horarias) tiene miles o
+decenas de miles de barras, pero un gráfico de unos 1000 píxeles de ancho no
+muestra más de un par de puntos por píxel: enviarlos todos solo engorda la
+respuesta y ralentiza el navegador. Antes de graficar, la serie se reduce a
+``max_points`` con LTTB (Largest-Triangle-Three-Buckets, conserva la forma
+visual) o con el mínimo y el máximo de cada tramo (conserva los extremos
+exactos). Todas las columnas se toman en los mismos índices, así que medias y
+bandas siguen alineadas con el precio.
+
+Las trazas son ``Scattergl`` (WebGL) y las miniaturas de varias señales van en
+una sola figura (un solo contexto WebGL). Al acotar una ventana de fechas se
+vuelve a reducir solo esa ventana, con todo su detalle.
+"""
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+# Puntos por gráfico: unas dos muestras por píxel del ancho habitual de cada uno
+MAX_POINTS = 1500
+THUMBNAIL_POINTS = 300
+
+# Columna, nombre y estilo de línea de las trazas del gráfico de detalle
+PRICE_TRACES = [
+    ('Close', 'Precio', dict(color='blue', width=2)),
+    ('SMA_20', 'SMA 20', dict(color='orange', width=1)),
+    ('SMA_50', 'SMA 50', dict(color='red', width=1)),
+    ('BB_High', 'BB Superior', dict(color='gray', dash='dash', width=1)),
+    ('BB_Low', 'BB Inferior', dict(color='gray', dash='dash', width=1)),
+]
+
+
+def lttb_indices(y, max_points):
+    """Índices de los puntos que conserva LTTB (el eje x es la posición de la barra)
+
+    El primer y el último punto se conservan siempre; de cada tramo intermedio
+    se elige el punto que forma el triángulo de mayor área con el elegido en el
+    tramo anterior y la media del tramo siguiente.
+    """
+    y = np.asarray(y, dtype='float64')
+    n = len(y)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    # max_points - 2 tramos sobre los puntos interiores (al menos un punto por tramo)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    counts = np.diff(edges)
+    mean_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    mean_x = (edges[:-1] + edges[1:] - 1) / 2
+    next_x = np.r_[mean_x[1:], n - 1]
+    next_y = np.r_[mean_y[1:], y[-1]]
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for b in range(max_points - 2):
+        lo, hi = edges[b], edges[b + 1]
+        area = np.abs(
+            (a - next_x[b]) * (y[lo:hi] - y[a]) - (a - np.arange(lo, hi)) * (next_y[b] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[b + 1] = a
+    return selected
+
+
+def minmax_indices(y, max_points):
+    """Índices del mínimo y el máximo de cada tramo (más el primer y el último punto)"""
+    y = np.asarray(y, dtype='float64')
+    n = len(y)
+    if max_points >= n or max_points < 4:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, max_points // 2 + 1).astype(np.int64)
+    bucket = np.repeat(np.arange(len(edges) - 1), np.diff(edges))
+    picks = [0, n - 1]
+    for reduce in (np.fmin, np.fmax):
+        extreme = reduce.reduceat(y, edges[:-1])
+        hits = np.flatnonzero(y == extreme[bucket])
+        _, first = np.unique(bucket[hits], return_index=True)
+        picks.append(hits[first])
+    return np.unique(np.concatenate([np.atleast_1d(p) for p in picks]))
+
+
+DOWNSAMPLERS = {'lttb': lttb_indices, 'minmax': minmax_indices}
+
+
+def downsample(data, max_points=MAX_POINTS, method='lttb', window=None, column='Close'):
+    """Filas de ``data`` (dentro de ``window`` = (inicio, fin) si se indica) reducidas según ``column``"""
+    if window is not None:
+        data = data.loc[window[0]:window[1]]
+    return data.iloc[DOWNSAMPLERS[method](data[column].to_numpy(dtype='float64'), max_points)]
+
+
+def price_figure(data, title, max_points=MAX_POINTS, method='lttb', window=None, height=400):
+    """Precio, medias y bandas de Bollinger (WebGL) con la serie reducida"""
+    view = downsample(data, max_points, method, window)
+    fig = go.Figure()
+    for column, name, line in PRICE_TRACES:
+        if column not in view:
+            continue
+        trace = dict(x=view.index, y=view[column].to_numpy(), mode='lines', name=name, line=line)
+        if column == 'BB_Low':
+            trace.update(fill='tonexty', fillcolor='rgba(128,128,128,0.1)')
+        fig.add_trace(go.Scattergl(**trace))
+
+    fig.update_layout(title=title, xaxis_title='Fecha', yaxis_title='Precio', height=height)
+    return fig, len(view)
+
+
+def small_multiples(charts, columns=3, max_points=THUMBNAIL_POINTS, method='lttb', row_height=220):
+    """Miniaturas (precio y SMA 20) de varias series en una sola figura
+
+    ``charts`` es una lista de (título, DataFrame con indicadores).
+    """
+    rows = max(1, -(-len(charts) // columns))
+    fig = make_subplots(
+        rows=rows, cols=columns,
+        subplot_titles=[title for title, _ in charts],
+        vertical_spacing=min(0.12, 0.3 / rows),
+        horizontal_spacing=0.05,
+    )
+    for i, (_, data) in enumerate(charts):
+        view = downsample(data, max_points, method)
+        row, col = i // columns + 1, i % columns + 1
+        for column, name, line in PRICE_TRACES[:2]:
+            if column in view:
+                fig.add_trace(go.Scattergl(
+                    x=view.index, y=view[column].to_numpy(), mode='lines', name=name,
+                    line=dict(line, width=1.5 if column == 'Close' else 1), showlegend=False
+                ), row=row, col=col)
+
+    fig.update_layout(height=row_height * rows, margin=dict(t=40, b=20, l=20, r=20))
+    fig.update_xaxes(showticklabels=False)
+    return fig
@@ -0,0 +1,464 @@
+"""Almacén columnar de precios diarios en ficheros mapeados en memoria.
+
+Cada columna OHLCV es un fichero binario contiguo (fechas × símbolos): los
+precios en float32 y el volumen en int64, más un fichero con las fechas (int64,
+ns) y ``meta.json`` con el índice de símbolos. Abrir el almacén solo mapea los
+ficheros (``np.memmap``) y no lee nada hasta que se toca un trozo, así que un
+panel de miles de símbolos y años de historia se abre en milisegundos, y varios
+procesos (workers del backtest, sesiones de Streamlit) comparten las mismas
+páginas del sistema en lugar de tener cada uno su copia en pandas.
+
+Los ficheros se reservan con hueco libre de filas y de símbolos: las fechas y
+los símbolos nuevos se escriben en su sitio, en celdas que los lectores todavía
+no ven. Las celdas ya publicadas nunca se modifican mientras alguien puede
+leerlas. Las revisiones de las últimas ``TAIL_ROWS`` barras (la sesión en
+curso, el solapamiento de una descarga incremental) se publican en un fichero
+pequeño de cola (``tail.N.npz``, esas filas para todos los símbolos) que los
+lectores superponen a los ficheros mapeados; la escritura siguiente vuelca la
+cola en su sitio, en celdas que los lectores del ``meta.json`` publicado leen
+de la cola. Solo si cambia historia anterior (un split, un ajuste) o se
+sustituye la de un símbolo se escribe sobre una copia de la generación; si no
+caben (o llegan fechas anteriores a las guardadas), sobre una generación nueva
+de ficheros. Los escritores se coordinan con un bloqueo de fichero; los
+lectores no bloquean, porque ``meta.json`` se sustituye de forma atómica y solo
+después de escribir los datos, así que nunca ven filas a medias ni un símbolo
+recién borrado (salvo una vista abierta durante más de dos escrituras, que
+puede ver el volcado de la cola en su sitio).
+"""
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from indicators import OHLCV_COLUMNS, Panel
+from price_cache import DEFAULT_CACHE_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos (un único escritor)
+    fcntl = None
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close']
+DTYPES = {**dict.fromkeys(PRICE_COLUMNS, np.float32), 'Volume': np.int64}
+
+DAY_NS = 86_400 * 10**9
+
+# Últimas barras publicadas que se pueden revisar a través de la cola (sin copiar la generación)
+TAIL_ROWS = 5
+
+EMPTY_META = {'generation': 0, 'rows': 0, 'capacity': 0, 'n_dates': 0, 'symbols': [], 'tail': None, 'tail_seq': 0}
+
+
+def _round_up(n, step):
+    return max(step, -(-n // step) * step)
+
+
+class StoreSlice:
+    """Referencia serializable a unos símbolos del almacén (para enviarla a otros procesos)"""
+
+    def __init__(self, path, symbols, start=None):
+        self.path = path
+        self.symbols = list(symbols)
+        self.start = start
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def panel(self):
+        return ColumnStore(self.path).panel(self.symbols, start=self.start)
+
+
+class ColumnStore:
+    def __init__(self, path=None, row_slack=256, symbol_slack=512):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, 'columns')
+        os.makedirs(self.path, exist_ok=True)
+        # Hueco que se reserva al crear una generación: filas (fechas) y símbolos
+        self.row_slack = row_slack
+        self.symbol_slack = symbol_slack
+        # (marca de meta.json, metadatos, índice símbolo -> columna) y (generación, mapas)
+        self._state = (None, EMPTY_META, {})
+        self._mapped = (None, {})
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def refresh(self):
+        """Relee ``meta.json`` si otro proceso (o hilo) lo ha sustituido"""
+        try:
+            stat = os.stat(self._file('meta.json'))
+        except FileNotFoundError:
+            return self._state
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if stamp != self._state[0]:
+            with open(self._file('meta.json')) as f:
+                meta = json.load(f)
+            self._state = (stamp, meta, {s: j for j, s in enumerate(meta['symbols'])})
+        return self._state
+
+    def _open_maps(self, meta, mode='r', generation=None):
+        generation = meta['generation'] if generation is None else generation
+        shape = (meta['rows'], meta['capacity'])
+        maps = {
+            c: np.memmap(self._file(f'{c}.{generation}'), dtype=DTYPES[c], mode=mode, shape=shape)
+            for c in OHLCV_COLUMNS
+        }
+        maps['dates'] = np.memmap(self._file(f'dates.{generation}'), dtype=np.int64, mode=mode,
+                                  shape=(meta['rows'],))
+        return maps
+
+    def _open_tail(self, tail):
+        """Primera fila y columnas (filas de la cola × símbolos publicados) de la cola ``tail``"""
+        with np.load(self._file(f'tail.{tail["seq"]}.npz')) as data:
+            return tail['start'], {c: data[c] for c in OHLCV_COLUMNS}
+
+    def _snapshot(self):
+        """Metadatos, índice y ficheros mapeados (solo lectura) de la última versión publicada
+
+        Los mapas llevan además la cola publicada en ``'tail'`` (None si no hay).
+        """
+        for _ in range(5):
+            _, meta, index = self.refresh()
+            if not meta['n_dates']:
+                return meta, index, None
+            tail = meta.get('tail')
+            key = (meta['generation'], tail and tail['seq'])
+            mapped, maps = self._mapped
+            if mapped == key:
+                return meta, index, maps
+            try:
+                maps = self._open_maps(meta) if mapped is None or mapped[0] != key[0] else dict(maps)
+                maps['tail'] = self._open_tail(tail) if tail else None
+            except FileNotFoundError:
+                # Otro proceso acaba de publicar una generación (o una cola) nueva: se relee meta.json
+                self._state = (None,) + self._state[1:]
+                continue
+            self._mapped = (key, maps)
+            return meta, index, maps
+        raise RuntimeError(f"No se pudo abrir el almacén columnar {self.path}")
+
+    @property
+    def symbols(self):
+        return list(self.refresh()[1]['symbols'])
+
+    def __contains__(self, symbol):
+        return symbol in self.refresh()[2]
+
+    def __len__(self):
+        return len(self.refresh()[1]['symbols'])
+
+    def dates(self):
+        meta, _, maps = self._snapshot()
+        if maps is None:
+            return pd.DatetimeIndex([])
+        return pd.DatetimeIndex(maps['dates'][:meta['n_dates']].astype('datetime64[ns]'))
+
+    def _rows(self, meta, maps, start=None, end=None):
+        dates = maps['dates'][:meta['n_dates']]
+        first = 0 if start is None else int(np.searchsorted(dates, pd.Timestamp(start).value, 'left'))
+        last = len(dates) if end is None else int(np.searchsorted(dates, pd.Timestamp(end).value, 'right'))
+        return first, last
+
+    def view(self, symbols=None, start=None, end=None):
+        """Panel con vistas de los ficheros mapeados (precios float32, volumen int64)
+
+        Con ``symbols=None`` o un bloque contiguo de símbolos las columnas son
+        vistas sin copia; una selección arbitraria copia solo las celdas pedidas,
+        y si las fechas pedidas llegan a barras revisadas en la cola se copian
+        las columnas para superponerlas. Los símbolos que no están en el almacén
+        se omiten.
+        """
+        meta, index, maps = self._snapshot()
+        if maps is None:
+            return Panel(pd.DatetimeIndex([]), [], {c: np.empty((0, 0), DTYPES[c]) for c in OHLCV_COLUMNS})
+
+        if symbols is None:
+            names = list(meta['symbols'])
+            columns = slice(0, len(names))
+        else:
+            names = [s for s in dict.fromkeys(symbols) if s in index]
+            positions = [index[s] for s in names]
+            contiguous = positions and positions == list(range(positions[0], positions[0] + len(positions)))
+            columns = slice(positions[0], positions[-1] + 1) if contiguous else np.array(positions, dtype=np.intp)
+
+        first, last = self._rows(meta, maps, start, end)
+        dates = maps['dates'][first:last].astype('datetime64[ns]')
+        values = {c: maps[c][first:last, columns] for c in OHLCV_COLUMNS}
+        if maps['tail'] is not None:
+            values = self._overlay(values, maps['tail'], first, last, columns)
+        return Panel(dates, names, values)
+
+    @staticmethod
+    def _overlay(values, tail, first, last, columns):
+        """Columnas con las barras revisadas de la cola superpuestas (copia si se solapan)"""
+        start, revised = tail
+        stop = start + len(revised['Close'])
+        low, high = max(first, start), min(last, stop)
+        if low >= high:
+            return values
+        values = {c: np.array(v) for c, v in values.items()}
+        for c in OHLCV_COLUMNS:
+            values[c][low - first:high - first] = revised[c][low - start:high - start][:, columns]
+        return values
+
+    def panel(self, symbols=None, start=None, end=None):
+        """Panel float64 listo para ``compute_indicators`` (como ``Panel.from_frames``)
+
+        Solo se leen (y copian) las celdas pedidas; se omiten las fechas en las
+        que ninguno de los símbolos tiene barra.
+        """
+        view = self.view(symbols, start, end)
+        valid = ~np.isnan(view['Close'])
+        rows = valid.any(axis=1)
+        columns = {c: np.array(view[c][rows], dtype='float64') for c in OHLCV_COLUMNS}
+        columns['Volume'][~valid[rows]] = np.nan
+        return Panel(view.dates[rows], view.symbols, columns)
+
+    def frame(self, symbol, start=None, end=None):
+        """Serie OHLCV de un símbolo (como ``PriceCache.load``); None si no está guardado"""
+        view = self.view([symbol], start, end)
+        if not view.symbols:
+            return None
+        close = view['Close'][:, 0]
+        valid = ~np.isnan(close)
+        if not valid.any():
+            return None
+        data = pd.DataFrame(
+            {c: np.array(view[c][valid, 0], dtype='float64') for c in PRICE_COLUMNS},
+            index=view.dates[valid]
+        )
+        data['Volume'] = np.array(view['Volume'][valid, 0])
+        return data
+
+    @contextmanager
+    def _locked(self):
+        """Bloqueo exclusivo de escritura entre procesos (y entre hilos: cada uno abre el fichero)"""
+        with open(self._file('store.lock'), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _timestamps(data):
+        """Fechas de barras diarias como enteros (ns), sin zona horaria (fecha local del mercado)"""
+        index = data.index
+        if not isinstance(index, pd.DatetimeIndex):
+            index = pd.DatetimeIndex(index)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        stamps = index.as_unit('ns').asi8
+        return stamps - stamps % DAY_NS
+
+    @staticmethod
+    def _values(data):
+        if list(data.columns) != OHLCV_COLUMNS:
+            data = data.reindex(columns=OHLCV_COLUMNS)
+        return data.to_numpy(dtype='float64')
+
+    def write(self, frames, replace=()):
+        """Guarda las barras diarias de varios símbolos
+
+        Las fechas ya guardadas se sobrescriben y las nuevas se añaden. De los
+        símbolos de ``replace`` (descarga completa, p. ej. tras un split) se
+        borra antes toda la historia guardada.
+        """
+        frames = {s: d for s, d in frames.items() if d is not None and not d.empty}
+        if not frames:
+            return
+        stamps = {symbol: self._timestamps(data) for symbol, data in frames.items()}
+
+        with self._locked():
+            self._state = (None, EMPTY_META, {})
+            _, meta, index = self.refresh()
+            symbols = list(meta['symbols'])
+            published = len(symbols)
+            new_symbols = [s for s in frames if s not in index]
+            n_dates = meta['n_dates']
+            maps = self._open_maps(meta, 'r+') if n_dates else None
+            stored = maps['dates'][:n_dates] if n_dates else np.empty(0, dtype=np.int64)
+            old_tail = meta.get('tail')
+            if maps is not None and old_tail:
+                # Los lectores del meta.json publicado leen esas celdas de la cola
+                self._fold_tail(maps, old_tail)
+            meta = dict(meta, tail=None)
+
+            incoming = np.unique(np.concatenate(list(stamps.values())))
+            last = stored[-1] if n_dates else np.iinfo(np.int64).min
+            appended = incoming[incoming > last]
+            fits = (
+                maps is not None
+                and n_dates + len(appended) <= meta['rows']
+                and published + len(new_symbols) <= meta['capacity']
+                and np.isin(incoming[incoming <= last], stored).all()
+            )
+
+            previous = None
+            if fits:
+                dates = np.concatenate([stored, appended])
+            else:
+                previous = meta['generation'] if n_dates else None
+                meta, maps = self._rebuild(meta, maps, stored, incoming, published + len(new_symbols))
+                dates = maps['dates'][:meta['n_dates']]
+
+            symbols += new_symbols
+            index = {s: j for j, s in enumerate(symbols)}
+            replaced = [index[s] for s in replace if s in index and s in frames]
+
+            # Todas las celdas de todos los símbolos en una sola escritura por columna
+            rows = np.searchsorted(dates, np.concatenate([stamps[s] for s in frames]))
+            columns = np.repeat([index[s] for s in frames], [len(stamps[s]) for s in frames])
+            values = np.concatenate([self._values(data) for data in frames.values()])
+            volume = np.nan_to_num(values[:, -1]).astype('int64')
+
+            # Celdas que los lectores ya ven: no se tocan en su sitio
+            visible = (rows < n_dates) & (columns < published) if fits else np.zeros(len(rows), dtype=bool)
+            tail_start = None
+            if fits:
+                changed, clears = self._published_changes(
+                    maps, n_dates, published, visible, rows, columns, values, volume, replaced
+                )
+                if clears or (len(changed) and changed[0] < n_dates - TAIL_ROWS):
+                    # Cambia historia publicada: se escribe sobre una copia de la generación
+                    previous = meta['generation']
+                    meta, maps = self._copy_generation(meta)
+                    visible[:] = False
+                elif len(changed):
+                    tail_start = int(changed[0])
+
+                # Filas y símbolos que se van a publicar: se limpian por si quedaron
+                # restos de una escritura interrumpida (ningún lector los ve todavía)
+                self._reset(maps, slice(n_dates, n_dates + len(appended)), slice(None))
+                self._reset(maps, slice(0, n_dates), slice(published, len(symbols)))
+                maps['dates'][n_dates:n_dates + len(appended)] = appended
+                meta = dict(meta, n_dates=n_dates + len(appended))
+            if previous is not None:
+                for column in replaced:
+                    self._reset(maps, slice(None), column)
+
+            hidden = ~visible
+            for k, c in enumerate(PRICE_COLUMNS):
+                maps[c][rows[hidden], columns[hidden]] = values[hidden, k]
+            maps['Volume'][rows[hidden], columns[hidden]] = volume[hidden]
+            if tail_start is not None:
+                # Barras publicadas revisadas: se publican en una cola nueva
+                seq = meta.get('tail_seq', 0) + 1
+                meta = dict(meta, tail={'start': tail_start, 'seq': seq}, tail_seq=seq)
+                self._write_tail(maps, meta['tail'], n_dates, published,
+                                 rows[visible], columns[visible], values[visible], volume[visible])
+
+            for array in maps.values():
+                array.flush()
+            # Se publica la nueva versión: los lectores la ven al releer meta.json
+            self._publish(dict(meta, symbols=symbols, updated_at=time.time()))
+            if previous is not None:
+                self._remove_generation(previous)
+            if old_tail:
+                self._remove(f'tail.{old_tail["seq"]}.npz')
+
+    @staticmethod
+    def _published_changes(maps, n_dates, published, visible, rows, columns, values, volume, replaced):
+        """Filas publicadas (ordenadas) que cambia la escritura y si borra historia visible
+
+        Las celdas publicadas que se reescriben con el mismo valor (el solapamiento
+        de una descarga incremental) no cuentan; sustituir la historia de un símbolo
+        la borra, salvo que todo lo que se borraría esté ya vacío.
+        """
+        rows, columns = rows[visible], columns[visible]
+        changed = maps['Volume'][rows, columns] != volume[visible]
+        for k, c in enumerate(PRICE_COLUMNS):
+            old = maps[c][rows, columns]
+            new = values[visible, k].astype(old.dtype)
+            changed |= ~((old == new) | (np.isnan(old) & np.isnan(new)))
+
+        clears = False
+        for column in replaced:
+            if column >= published:
+                continue
+            kept = np.ones(n_dates, dtype=bool)
+            kept[rows[columns == column]] = False
+            if any(not np.isnan(maps[c][:n_dates, column][kept]).all() for c in PRICE_COLUMNS):
+                clears = True
+                break
+        return np.unique(rows[changed]), clears
+
+    def _fold_tail(self, maps, tail):
+        """Vuelca la cola en su sitio (celdas que los lectores de esa cola no leen del fichero)"""
+        start, revised = self._open_tail(tail)
+        stop, width = start + len(revised['Close']), revised['Close'].shape[1]
+        for c in OHLCV_COLUMNS:
+            maps[c][start:stop, :width] = revised[c]
+
+    def _write_tail(self, maps, tail, n_dates, published, rows, columns, values, volume):
+        """Escribe la cola ``tail``: las filas publicadas desde su inicio con las celdas revisadas"""
+        start = tail['start']
+        revised = {c: np.array(maps[c][start:n_dates, :published]) for c in OHLCV_COLUMNS}
+        keep = rows >= start
+        for k, c in enumerate(PRICE_COLUMNS):
+            revised[c][rows[keep] - start, columns[keep]] = values[keep, k]
+        revised['Volume'][rows[keep] - start, columns[keep]] = volume[keep]
+        temporary = self._file(f'tail.{tail["seq"]}.{os.getpid()}.tmp')
+        with open(temporary, 'wb') as f:
+            np.savez(f, **revised)
+        os.replace(temporary, self._file(f'tail.{tail["seq"]}.npz'))
+
+    @staticmethod
+    def _reset(maps, rows, columns):
+        for c in PRICE_COLUMNS:
+            maps[c][rows, columns] = np.nan
+        maps['Volume'][rows, columns] = 0
+
+    def _copy_generation(self, meta):
+        """Copia de los ficheros de la generación publicada, con el mismo tamaño, como generación nueva"""
+        new_meta = dict(meta, generation=meta['generation'] + 1)
+        for name in OHLCV_COLUMNS + ['dates']:
+            shutil.copyfile(self._file(f'{name}.{meta["generation"]}'), self._file(f'{name}.{new_meta["generation"]}'))
+        return new_meta, self._open_maps(new_meta, 'r+')
+
+    def _rebuild(self, meta, maps, stored, incoming, n_symbols):
+        """Nueva generación de ficheros con hueco para ``incoming`` y ``n_symbols`` símbolos"""
+        dates = np.union1d(stored, incoming)
+        new_meta = dict(
+            meta,
+            generation=meta['generation'] + 1,
+            # Crecimiento geométrico: añadir símbolos o fechas poco a poco no reescribe siempre
+            rows=_round_up(max(len(dates) + self.row_slack, meta['rows'] * 3 // 2), self.row_slack),
+            capacity=_round_up(max(n_symbols, meta['capacity'] * 3 // 2), self.symbol_slack),
+            n_dates=len(dates),
+        )
+        new_maps = self._open_maps(new_meta, 'w+')
+        for c in PRICE_COLUMNS:
+            new_maps[c][:] = np.nan
+        new_maps['dates'][:len(dates)] = dates
+
+        if maps is not None:
+            # Las fechas guardadas conservan su orden relativo en la nueva rejilla
+            n_old = len(meta['symbols'])
+            rows = np.searchsorted(dates, stored)
+            for c in OHLCV_COLUMNS:
+                new_maps[c][rows, :n_old] = maps[c][:len(stored), :n_old]
+        return new_meta, new_maps
+
+    def _publish(self, meta):
+        """Sustituye meta.json de forma atómica"""
+        temporary = self._file(f'meta.json.{os.getpid()}.tmp')
+        with open(temporary, 'w') as f:
+            json.dump(meta, f)
+        os.replace(temporary, self._file('meta.json'))
+
+    def _remove_generation(self, generation):
+        # Los procesos que la tengan mapeada siguen leyéndola hasta que la cierren
+        for name in OHLCV_COLUMNS + ['dates']:
+            self._remove(f'{name}.{generation}')
+
+    def _remove(self, name):
+        try:
+            os.remove(self._file(name))
+        except OSError:
+            pass
@@ -0,0 +1,285 @@
+"""Correlación de rentabilidades entre símbolos y agrupación de señales redundantes.
+
+``RollingCorrelation`` guarda, para una ventana de las últimas ``lookback``
+barras, las sumas por pares de símbolos sobre las fechas que ambos tienen
+(recuento, Σx, Σx² y Σxy). La correlación de cada par sale de esas sumas, así
+que los huecos de un símbolo (festivos de otro mercado, salidas a bolsa
+recientes) solo afectan a sus pares. Las sumas se calculan por bloques de
+``block`` símbolos con productos de matrices: los intermedios son de bloque ×
+bloque y no de símbolos × símbolos × fechas.
+
+Cuando llegan barras nuevas la ventana se desplaza sumando las filas nuevas y
+restando las que salen (y las revisadas, como la sesión en curso): un cálculo
+de rango k en lugar de recalcular toda la ventana. Tras ``lookback`` filas
+actualizadas se recalcula desde cero para no acumular error de redondeo.
+
+``cluster`` agrupa los símbolos por enlace medio sobre la distancia 1 - ρ
+(algoritmo de la cadena de vecinos más próximos, O(n²)) y corta el árbol en
+la correlación ``threshold``.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from price_cache import PERIOD_DAYS
+
+DEFAULT_LOOKBACK = 120
+# Correlación media a partir de la cual dos grupos se unen
+CLUSTER_CORRELATION = 0.7
+# Fechas comunes mínimas para estimar la correlación de un par
+MIN_OVERLAP = 20
+BLOCK_SIZE = 512
+
+# Periodos de descarga candidatos (de menor a mayor) para cubrir la ventana
+LOOKBACK_PERIODS = ['6mo', '1y', '2y', '5y']
+
+
+def lookback_period(lookback):
+    """Periodo de descarga más corto con al menos ``lookback`` + 1 barras diarias"""
+    for period in LOOKBACK_PERIODS:
+        if PERIOD_DAYS[period] * 252 / 365 >= lookback + 1:
+            return period
+    return LOOKBACK_PERIODS[-1]
+
+
+def log_returns(close):
+    """Rentabilidad logarítmica de cada barra frente al cierre anterior del mismo símbolo
+
+    ``close`` es fechas × símbolos con NaN donde un símbolo no tiene barra; la
+    primera fila y las fechas sin barra quedan en NaN.
+    """
+    close = np.asarray(close, dtype='float64')
+    valid = ~np.isnan(close)
+    rows = np.arange(len(close))[:, None]
+    last = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+    previous = np.take_along_axis(close, np.maximum(last[:-1], 0), axis=0)
+    previous[last[:-1] < 0] = np.nan
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.log(close[1:] / previous)
+    return np.vstack([np.full((1, close.shape[1]), np.nan), returns])
+
+
+def cluster(corr, threshold=CLUSTER_CORRELATION):
+    """Grupo de cada símbolo (0 el más numeroso) por enlace medio, cortando en la correlación ``threshold``
+
+    Los pares sin correlación (NaN) cuentan como incorrelados.
+    """
+    n = len(corr)
+    distance = 1 - np.nan_to_num(np.array(corr, dtype='float64'), nan=0.0)
+    np.fill_diagonal(distance, np.inf)
+    limit = 1 - threshold
+    size = np.ones(n)
+    owner = np.arange(n)
+    active = np.ones(n, dtype=bool)
+
+    def retire(k):
+        active[k] = False
+        distance[k, :] = distance[:, k] = np.inf
+
+    chain = []
+    while active.any():
+        if not chain:
+            chain.append(int(np.argmax(active)))
+        i = chain[-1]
+        j = int(np.argmin(distance[i]))
+        if not np.isfinite(distance[i, j]):
+            chain.pop()
+            retire(i)
+            continue
+        if len(chain) > 1 and distance[i, chain[-2]] <= distance[i, j]:
+            j = chain[-2]
+        if len(chain) == 1 or j != chain[-2]:
+            chain.append(j)
+            continue
+
+        # Vecinos mutuos: se unen si están por debajo del corte; si no, ninguno
+        # de los dos puede unirse ya a nada (el enlace medio no acerca grupos)
+        del chain[-2:]
+        if distance[i, j] > limit:
+            retire(i)
+            retire(j)
+            continue
+        merged = (size[i] * distance[i] + size[j] * distance[j]) / (size[i] + size[j])
+        distance[i, :] = distance[:, i] = merged
+        distance[i, i] = np.inf
+        size[i] += size[j]
+        owner[owner == j] = i
+        active[j] = False
+        distance[j, :] = distance[:, j] = np.inf
+
+    _, inverse, counts = np.unique(owner, return_inverse=True, return_counts=True)
+    order = np.argsort(-counts, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[inverse]
+
+
+def cluster_summary(symbols, corr, labels, scores, flagged=None):
+    """Un registro por grupo con su representante (el de mayor score) y su correlación media
+
+    ``scores`` es símbolo -> score; con ``flagged`` (símbolos con señal) solo se
+    devuelven los grupos que contienen alguno, y el representante sale de ellos.
+    """
+    symbols = list(symbols)
+    corr = np.asarray(corr)
+    flagged = set(symbols if flagged is None else flagged)
+    rows = []
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        candidates = [symbols[k] for k in members if symbols[k] in flagged]
+        if not candidates:
+            continue
+        ranked = sorted(candidates, key=lambda s: scores.get(s, -1), reverse=True)
+        block = corr[np.ix_(members, members)]
+        pairs = block[~np.eye(len(members), dtype=bool)]
+        rows.append({
+            'cluster': int(label),
+            'representative': ranked[0],
+            'score': scores.get(ranked[0]),
+            'size': len(members),
+            'flagged': len(candidates),
+            'mean_correlation': float(np.nanmean(pairs)) if np.isfinite(pairs).any() else np.nan,
+            'members': ranked + sorted(symbols[k] for k in members if symbols[k] not in flagged),
+        })
+    return pd.DataFrame(rows, columns=['cluster', 'representative', 'score', 'size', 'flagged',
+                                       'mean_correlation', 'members'])
+
+
+class RollingCorrelation:
+    def __init__(self, symbols, lookback=DEFAULT_LOOKBACK, block=BLOCK_SIZE, min_overlap=MIN_OVERLAP):
+        self.symbols = list(dict.fromkeys(symbols))
+        self.position = {symbol: j for j, symbol in enumerate(self.symbols)}
+        self.lookback = int(lookback)
+        self.block = int(block)
+        self.min_overlap = int(min_overlap)
+        self._lock = threading.Lock()
+
+        n = len(self.symbols)
+        # Sumas sobre las fechas comunes de cada par (fila = símbolo x, columna = símbolo y)
+        self.count = np.zeros((n, n))
+        self.sum_x = np.zeros((n, n))
+        self.sum_xx = np.zeros((n, n))
+        self.sum_xy = np.zeros((n, n))
+        # Ventana actual: fechas y rentabilidades (fechas × símbolos)
+        self.dates = pd.DatetimeIndex([])
+        self.returns = np.empty((0, n))
+        # Matriz completa (se calcula al pedirla y se descarta con cada cambio de la ventana)
+        self._matrix = None
+        # Filas actualizadas desde el último cálculo completo y modo del último cambio
+        self.updated_rows = 0
+        self.last_update = None
+
+    def _accumulate(self, returns, sign=None):
+        """Suma a las sumas por pares las filas ``returns``, cada una con su signo (``sign``, +1 o -1)"""
+        if not len(returns):
+            return
+        valid = ~np.isnan(returns)
+        mask = valid.astype('float64')
+        x = np.where(valid, returns, 0.0)
+        xx = x * x
+        # El signo va en el factor izquierdo: restar filas cuesta lo mismo que sumarlas
+        weight = np.ones((len(returns), 1)) if sign is None else np.asarray(sign, dtype='float64')[:, None]
+        signed_mask, signed_x, signed_xx = mask * weight, x * weight, xx * weight
+        n, step = len(self.symbols), self.block
+        for a in range(0, n, step):
+            left = slice(a, a + step)
+            for b in range(a, n, step):
+                right = slice(b, b + step)
+                self.count[left, right] += signed_mask[:, left].T @ mask[:, right]
+                self.sum_x[left, right] += signed_x[:, left].T @ mask[:, right]
+                self.sum_xx[left, right] += signed_xx[:, left].T @ mask[:, right]
+                self.sum_xy[left, right] += signed_x[:, left].T @ x[:, right]
+                if b == a:
+                    continue
+                # Bloque simétrico: el recuento y Σxy se trasponen; Σx y Σx² son del otro símbolo
+                self.count[right, left] = self.count[left, right].T
+                self.sum_xy[right, left] = self.sum_xy[left, right].T
+                self.sum_x[right, left] += signed_x[:, right].T @ mask[:, left]
+                self.sum_xx[right, left] += signed_xx[:, right].T @ mask[:, left]
+
+    def _correlation(self, index):
+        """Correlaciones entre los símbolos ``index`` a partir de las sumas, por franjas de ``block`` filas"""
+        index = np.asarray(index, dtype=np.intp)
+        matrix = np.empty((len(index), len(index)))
+        for a in range(0, len(index), self.block):
+            rows, columns = index[a:a + self.block, None], index[None, :]
+            count, sum_x, sum_xx = self.count[rows, columns], self.sum_x[rows, columns], self.sum_xx[rows, columns]
+            sum_y, sum_yy = self.sum_x[columns.T, rows.T].T, self.sum_xx[columns.T, rows.T].T
+            covariance = count * self.sum_xy[rows, columns] - sum_x * sum_y
+            variance = (count * sum_xx - sum_x ** 2) * (count * sum_yy - sum_y ** 2)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                block = covariance / np.sqrt(variance)
+            block[(count < self.min_overlap) | ~(variance > 0)] = np.nan
+            matrix[a:a + self.block] = np.clip(block, -1.0, 1.0)
+        diagonal = np.flatnonzero(self.count[index, index] >= self.min_overlap)
+        matrix[diagonal, diagonal] = 1.0
+        return matrix
+
+    def _rebuild(self, returns):
+        for total in (self.count, self.sum_x, self.sum_xx, self.sum_xy):
+            total[:] = 0.0
+        self._accumulate(returns)
+        self.updated_rows = 0
+        self.last_update = ('full', len(returns))
+
+    def update(self, panel):
+        """Lleva la ventana a las últimas ``lookback`` barras de ``panel`` (con columna ``Close``)
+
+        Devuelve el número de filas sumadas (0 si no había nada nuevo).
+        """
+        close = np.full((len(panel.dates), len(self.symbols)), np.nan)
+        columns = [(k, self.position[s]) for k, s in enumerate(panel.symbols) if s in self.position]
+        if columns:
+            source, target = map(list, zip(*columns))
+            close[:, target] = panel['Close'][:, source]
+        returns = log_returns(close)[1:][-self.lookback:]
+        dates = pd.DatetimeIndex(panel.dates)[1:][-self.lookback:]
+
+        with self._lock:
+            old_dates, old_returns = self.dates, self.returns
+            # Filas comunes: las de la ventana nueva hasta la última fecha de la anterior
+            shared = int(dates.searchsorted(old_dates[-1], side='right')) if len(old_dates) else 0
+            aligned = 0 < shared <= len(old_dates) and dates[:shared].equals(old_dates[-shared:])
+            if aligned:
+                same = np.isclose(returns[:shared], old_returns[-shared:], rtol=0, atol=1e-12, equal_nan=True)
+                changed = np.flatnonzero(~same.all(axis=1))
+                first = int(changed[0]) if len(changed) else shared
+                kept = len(old_dates) - shared
+                removed = np.vstack([old_returns[:kept], old_returns[kept + first:]])
+                added = returns[first:]
+                if not len(removed) and not len(added):
+                    return 0
+            if not aligned or self.updated_rows + len(added) > self.lookback:
+                self._rebuild(returns)
+                added = returns
+            else:
+                self._accumulate(np.vstack([removed, added]), np.repeat([-1.0, 1.0], [len(removed), len(added)]))
+                self.updated_rows += len(added)
+                self.last_update = ('incremental', len(added))
+            self.dates, self.returns = dates, returns
+            self._matrix = None
+            return len(added)
+
+    @property
+    def matrix(self):
+        """Matriz de correlación de todos los símbolos"""
+        matrix = self._matrix
+        if matrix is None:
+            with self._lock:
+                matrix = self._matrix = self._correlation(np.arange(len(self.symbols)))
+        return matrix
+
+    def frame(self, symbols=None):
+        """Correlaciones de ``symbols`` (por defecto, todos) como DataFrame símbolos × símbolos
+
+        Un subconjunto (las señales detectadas) se calcula solo para sus pares.
+        """
+        symbols = self.symbols if symbols is None else [s for s in dict.fromkeys(symbols) if s in self.position]
+        index = [self.position[s] for s in symbols]
+        if self._matrix is not None or len(index) == len(self.symbols):
+            values = self.matrix[np.ix_(index, index)]
+        else:
+            with self._lock:
+                values = self._correlation(index)
+        return pd.DataFrame(values, index=symbols, columns=symbols)
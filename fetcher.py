@@ -0,0 +1,445 @@
+"""Planificador de descargas asíncrono para el escaneo completo.
+
+Todas las series de un escaneo se piden desde un único planificador:
+
+- un límite global de peticiones en vuelo y un *token bucket* que limita el
+  ritmo de peticiones por segundo,
+- reintentos con espera exponencial y *jitter* ante throttling (429),
+  errores de servidor o de red,
+- un *circuit breaker*: tras varios fallos seguidos deja de llamar a la red
+  durante un tiempo y el llamante recurre a la caché local o a datos demo.
+
+Cada petición la hace un hilo del planificador con el *backend* elegido
+(``backend`` o ``UPTREND_FETCH_BACKEND``):
+
+- ``yfinance`` (por defecto): precios ajustados con ``yf.download`` en lotes de
+  ``batch_size`` símbolos con los mismos parámetros (cada lote es una petición
+  del planificador: ocupa un hueco, gasta un token por símbolo y se reintenta
+  entero); los símbolos que no vienen en el lote se piden después uno a uno
+  con ``Ticker.history``, que distingue "sin datos" de un error transitorio;
+- ``chart``: la API de gráficos de Yahoo (``/v8/finance/chart``) directamente,
+  con una sesión HTTP de conexiones persistentes. Su URL base es configurable
+  (``UPTREND_CHART_URL``) para poder probarlo contra un servidor HTTP local.
+
+Los trabajos se describen con ``fetch_params`` (periodo o fecha de inicio e
+intervalo), independientes del backend.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import metrics
+
+YAHOO_CHART_URL = os.environ.get('UPTREND_CHART_URL', 'https://query1.finance.yahoo.com')
+
+BACKENDS = ('yfinance', 'chart')
+DEFAULT_BACKEND = os.environ.get('UPTREND_FETCH_BACKEND', 'yfinance')
+
+USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/124.0 Safari/537.36'
+)
+
+# Símbolos por descarga conjunta de yfinance
+BATCH_SIZE = 50
+
+# Respuestas que se reintentan: throttling y errores de servidor
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Excepciones de yfinance que significan "sin datos" (símbolo inexistente o periodo vacío)
+YFINANCE_NO_DATA = {'YFPricesMissingError', 'YFTzMissingError', 'YFTickerMissingError', 'YFInvalidPeriodError'}
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Resultado de un símbolo que no se pudo descargar (distinto de "sin datos")
+FAILED = object()
+
+logger = logging.getLogger('uptrend')
+
+
+def _yfinance():
+    """Importa yfinance bajo demanda (solo cuando hay que descargar)"""
+    import yfinance
+    return yfinance
+
+
+class FetchError(Exception):
+    """Fallo transitorio de una petición (se reintenta y cuenta para el circuit breaker)"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Limita el ritmo medio de peticiones permitiendo ráfagas de ``capacity``"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self, tokens=1):
+        """Gasta ``tokens`` (un lote puede dejar el cubo en deuda: lo paga quien venga detrás)"""
+        needed = min(tokens, self.capacity)
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= needed:
+                self.tokens -= tokens
+                return
+            await asyncio.sleep((needed - self.tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """Corta las peticiones tras ``failure_threshold`` fallos seguidos durante ``reset_timeout`` s
+
+    Pasado ese tiempo deja pasar una única petición de prueba (semiabierto): si
+    funciona se cierra de nuevo y si falla vuelve a abrirse.
+    """
+
+    def __init__(self, failure_threshold=10, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def allow(self):
+        if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = 'half_open'
+        if self.state == 'half_open':
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+        return self.state == 'closed'
+
+    def record_success(self):
+        self.state = 'closed'
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            if self.state != 'open':
+                logger.warning("Circuit breaker abierto tras %d fallos", self.failures)
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+
+def fetch_params(period=None, start=None, interval='1d'):
+    """Trabajo de descarga: un periodo (``6mo``...) o desde una fecha (se pasa a UTC)"""
+    if start is None:
+        return {'period': period, 'interval': interval}
+    start = pd.Timestamp(start)
+    if start.tz is None:
+        start = start.tz_localize('UTC')
+    return {'start': start, 'interval': interval}
+
+
+def chart_params(params):
+    """Parámetros de la API de gráficos para un trabajo de ``fetch_params``"""
+    query = {'interval': params['interval'], 'includePrePost': 'false', 'events': 'div,splits'}
+    if params.get('start') is not None:
+        query['period1'] = int(params['start'].timestamp())
+        query['period2'] = int(time.time()) + 86400
+    else:
+        query['range'] = params['period']
+    return query
+
+
+def parse_chart(payload, interval='1d'):
+    """OHLCV ajustado (como ``auto_adjust=True`` de yfinance) de una respuesta de la API; None si vacía"""
+    chart = payload.get('chart') or {}
+    result = (chart.get('result') or [None])[0]
+    if not result or not result.get('timestamp'):
+        return None
+
+    indicators = result.get('indicators') or {}
+    quote_ = (indicators.get('quote') or [{}])[0]
+    timezone = (result.get('meta') or {}).get('exchangeTimezoneName') or 'UTC'
+    index = pd.to_datetime(result['timestamp'], unit='s', utc=True).tz_convert(timezone)
+    if interval in ('1d', '5d', '1wk', '1mo', '3mo'):
+        index = index.normalize()
+
+    def column(name):
+        return np.array([np.nan if v is None else v for v in quote_.get(name, [])], dtype='float64')
+
+    data = pd.DataFrame({
+        'Open': column('open'),
+        'High': column('high'),
+        'Low': column('low'),
+        'Close': column('close'),
+        'Volume': column('volume'),
+    }, index=index)
+
+    adjclose = (indicators.get('adjclose') or [{}])[0].get('adjclose')
+    if adjclose is not None:
+        adjusted = np.array([np.nan if v is None else v for v in adjclose], dtype='float64')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ratio = adjusted / data['Close'].to_numpy()
+        for name in ('Open', 'High', 'Low'):
+            data[name] = data[name].to_numpy() * ratio
+        data['Close'] = adjusted
+
+    # La barra en curso llega a veces duplicada con la hora actual: se queda la última
+    data = data[~data.index.duplicated(keep='last')].dropna(subset=['Close'])
+    if data.empty:
+        return None
+    data['Volume'] = data['Volume'].fillna(0).astype('int64')
+    return data
+
+
+class FetchScheduler:
+    """Descarga concurrente de muchas series con límites globales, reintentos y circuit breaker"""
+
+    def __init__(self, base_url=None, max_in_flight=8, rate=10.0, burst=None, retries=3,
+                 backoff=0.5, max_backoff=8.0, timeout=10.0, breaker=None, session=None, backend=None,
+                 batch_size=BATCH_SIZE):
+        self.backend = backend or DEFAULT_BACKEND
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Backend de descarga desconocido: {self.backend} (disponibles: {', '.join(BACKENDS)})")
+        self.base_url = (base_url or YAHOO_CHART_URL).rstrip('/')
+        self.max_in_flight = max_in_flight
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        # Solo yfinance descarga varios símbolos a la vez; la API de gráficos es por símbolo
+        self.batch_size = batch_size if self.backend == 'yfinance' else 1
+        # yfinance gestiona su propia sesión; la del backend ``chart`` se comparte entre hilos
+        if session is None and self.backend == 'chart':
+            session = self._make_session(max_in_flight)
+        self.session = session
+        self.stats = {'requests': 0, 'retries': 0, 'failed': 0, 'short_circuited': 0}
+
+    @staticmethod
+    def _make_session(pool_size):
+        """Sesión con un pool de conexiones persistentes del tamaño del límite de concurrencia"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({'User-Agent': USER_AGENT, 'Accept': 'application/json'})
+        return session
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+    def _get(self, symbol, params):
+        """Petición bloqueante con el backend configurado (se ejecuta en un hilo del pool)"""
+        if self.backend == 'chart':
+            return self._get_chart(symbol, params)
+        return self._get_yfinance(symbol, params)
+
+    @staticmethod
+    def _span(params):
+        if params.get('start') is not None:
+            return {'start': params['start']}
+        return {'period': params['period']}
+
+    @staticmethod
+    def _ohlcv(data):
+        """Columnas OHLCV sin barras duplicadas ni vacías; None si no queda ninguna"""
+        if data is None or data.empty:
+            return None
+        data = data.reindex(columns=OHLCV_COLUMNS)
+        data = data[~data.index.duplicated(keep='last')].dropna(subset=['Close'])
+        return data if not data.empty else None
+
+    def _get_yfinance(self, symbol, params):
+        """Serie ajustada de ``Ticker.history``; los errores transitorios se reintentan"""
+        try:
+            data = _yfinance().Ticker(symbol).history(
+                interval=params['interval'], auto_adjust=True, **self._span(params)
+            )
+        except Exception as e:
+            if type(e).__name__ in YFINANCE_NO_DATA:
+                logger.info("%s: %s", symbol, e)
+                return None
+            # Throttling (YFRateLimitError), red o respuesta no válida
+            raise FetchError(f"{symbol}: {e}") from e
+        return self._ohlcv(data)
+
+    def _get_batch(self, symbols, params):
+        """Series ajustadas de un lote con ``yf.download``: ``{símbolo: datos}`` de los que vienen con datos
+
+        yfinance no lanza excepciones por símbolo en una descarga conjunta: los que
+        faltan (sin datos o con error) los vuelve a pedir el llamante uno a uno.
+        """
+        try:
+            data = _yfinance().download(
+                list(symbols), interval=params['interval'], auto_adjust=True, group_by='ticker',
+                threads=False, progress=False, **self._span(params)
+            )
+        except Exception as e:
+            raise FetchError(f"{symbols[0]} y {len(symbols) - 1} más: {e}") from e
+
+        if data is None or data.empty or not isinstance(data.columns, pd.MultiIndex):
+            return {}
+        present = set(data.columns.get_level_values(0))
+        frames = {}
+        for symbol in symbols:
+            if symbol in present:
+                frame = self._ohlcv(data[symbol])
+                if frame is not None:
+                    frames[symbol] = frame
+        return frames
+
+    def _get_chart(self, symbol, params):
+        """Petición HTTP a la API de gráficos de Yahoo"""
+        url = f"{self.base_url}/v8/finance/chart/{quote(symbol, safe='')}"
+        try:
+            response = self.session.get(url, params=chart_params(params), timeout=self.timeout)
+        except requests.RequestException as e:
+            raise FetchError(f"{symbol}: {e}") from e
+
+        if response.status_code in RETRY_STATUS:
+            retry_after = response.headers.get('Retry-After')
+            try:
+                retry_after = float(retry_after) if retry_after is not None else None
+            except ValueError:
+                retry_after = None
+            raise FetchError(f"{symbol}: HTTP {response.status_code}", retry_after)
+        if response.status_code != 200:
+            # 404 (símbolo inexistente) u otro error no transitorio: sin datos
+            logger.info("%s: HTTP %d", symbol, response.status_code)
+            return None
+        try:
+            return parse_chart(response.json(), params['interval'])
+        except (ValueError, KeyError, TypeError, IndexError) as e:
+            raise FetchError(f"{symbol}: respuesta no válida ({e})") from e
+
+    def _delay(self, attempt, retry_after=None):
+        """Espera exponencial con jitter completo (o la que pida el servidor)"""
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_backoff))
+        return delay
+
+    async def _request(self, name, call, semaphore, bucket, tokens=1):
+        """Ejecuta ``call()`` en un hilo con los límites, el circuit breaker y los reintentos; FAILED si falla"""
+        for attempt in range(self.retries + 1):
+            async with semaphore:
+                # Se comprueba con el hueco ya concedido: el circuito puede abrirse durante la espera
+                if not self.breaker.allow():
+                    self.stats['short_circuited'] += 1
+                    metrics.count('fetch.short_circuited')
+                    return FAILED
+                await bucket.acquire(tokens)
+                self.stats['requests'] += 1
+                metrics.count('fetch.requests')
+                started = time.perf_counter()
+                try:
+                    data = await asyncio.to_thread(call)
+                except FetchError as e:
+                    self.breaker.record_failure()
+                    metrics.count('fetch.errors')
+                    error = e
+                else:
+                    self.breaker.record_success()
+                    return data
+                finally:
+                    metrics.observe('fetch.request', time.perf_counter() - started, name)
+
+            if attempt < self.retries:
+                self.stats['retries'] += 1
+                metrics.count('fetch.retries')
+                await asyncio.sleep(self._delay(attempt, error.retry_after))
+
+        logger.warning("Descarga fallida tras %d intentos: %s", self.retries + 1, error)
+        self.stats['failed'] += 1
+        metrics.count('fetch.failed')
+        return FAILED
+
+    async def _fetch_one(self, symbol, params, semaphore, bucket):
+        return symbol, await self._request(symbol, lambda: self._get(symbol, params), semaphore, bucket)
+
+    def _batches(self, jobs):
+        """Lotes ``(símbolos, parámetros)`` de hasta ``batch_size`` símbolos con los mismos parámetros"""
+        groups = {}
+        for symbol, params in jobs.items():
+            key = (params['interval'], params.get('period'), params.get('start'))
+            groups.setdefault(key, (params, []))[1].append(symbol)
+        return [
+            (symbols[i:i + self.batch_size], params)
+            for params, symbols in groups.values()
+            for i in range(0, len(symbols), self.batch_size)
+        ]
+
+    async def fetch_many_async(self, jobs, on_result=None):
+        """Versión asíncrona de ``fetch_many``"""
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix='fetch')
+        loop.set_default_executor(executor)
+        self.stats = dict.fromkeys(self.stats, 0)
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        bucket = TokenBucket(self.rate, self.burst)
+        results = {}
+
+        def deliver(symbol, data):
+            results[symbol] = data
+            if on_result is not None:
+                on_result(symbol, data)
+
+        async def fetch(symbol, params):
+            deliver(*await self._fetch_one(symbol, params, semaphore, bucket))
+
+        async def fetch_batch(symbols, params):
+            frames = await self._request(
+                symbols[0], lambda: self._get_batch(symbols, params), semaphore, bucket, len(symbols)
+            )
+            if frames is FAILED:
+                for symbol in symbols:
+                    deliver(symbol, FAILED)
+                return
+            for symbol, data in frames.items():
+                deliver(symbol, data)
+            # Los que faltan en el lote: uno a uno (símbolo inexistente o error transitorio)
+            await asyncio.gather(*(fetch(symbol, params) for symbol in symbols if symbol not in frames))
+
+        try:
+            await asyncio.gather(*(
+                fetch_batch(symbols, params) if len(symbols) > 1 else fetch(symbols[0], params)
+                for symbols, params in self._batches(jobs)
+            ))
+        finally:
+            executor.shutdown(wait=False)
+        return {symbol: results[symbol] for symbol in jobs}
+
+    def fetch_many(self, jobs, on_result=None):
+        """Descarga ``{símbolo: parámetros}`` y devuelve ``{símbolo: DataFrame | None | FAILED}``
+
+        None significa que el símbolo no tiene datos (no existe o periodo vacío);
+        ``FAILED``, que no se pudo descargar (reintentos agotados o circuito abierto).
+        ``on_result(símbolo, datos)`` se llama con cada serie en cuanto termina.
+        """
+        if not jobs:
+            return {}
+        started = time.perf_counter()
+        results = asyncio.run(self.fetch_many_async(jobs, on_result))
+        logger.info(
+            "%d series en %.2fs (%d peticiones, %d reintentos, %d fallidas, %d sin llamar)",
+            len(jobs), time.perf_counter() - started, self.stats['requests'],
+            self.stats['retries'], self.stats['failed'], self.stats['short_circuited']
+        )
+        return results
@@ -0,0 +1,283 @@
+"""Estado incremental de indicadores para refresco en vivo.
+
+``IndicatorState`` mantiene, por símbolo, los acumuladores necesarios para
+obtener los indicadores de ``calculate_indicators`` en tiempo constante por
+barra: sumas móviles (SMA, Bollinger, volumen), estados de las EMA/MACD y los
+suavizados de Wilder del RSI y del ADX.
+
+El estado guarda las barras ya cerradas ("confirmadas") y una barra abierta,
+que puede revisarse tantas veces como haga falta (barra intradía en curso)
+sin recalcular el histórico. El estado es serializable a JSON para
+sobrevivir a reinicios.
+"""
+import json
+import math
+import os
+from collections import deque
+
+import pandas as pd
+
+STATE_VERSION = 1
+
+RSI_WINDOW = 14
+ADX_WINDOW = 14
+
+
+def _nan_to_none(value):
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+
+def _none_to_nan(value):
+    return float('nan') if value is None else value
+
+
+class RollingWindow:
+    """Ventana móvil con suma y suma de cuadrados mantenidas de forma incremental"""
+
+    # Cada cuántas inserciones se recalculan las sumas desde cero (evita la deriva numérica)
+    REFRESH_EVERY = 1000
+
+    def __init__(self, size, values=()):
+        self.size = size
+        self.values = deque(maxlen=size)
+        self._reset(values)
+
+    def _reset(self, values):
+        self.values.clear()
+        self.values.extend(values)
+        present = [v for v in self.values if not math.isnan(v)]
+        self.ref = present[-1] if present else 0.0
+        self.total = sum(v - self.ref for v in present)
+        self.total_sq = sum((v - self.ref) ** 2 for v in present)
+        self.missing = len(self.values) - len(present)
+        self.pushes = 0
+
+    def push(self, value):
+        if len(self.values) == self.size:
+            old = self.values[0]
+            if math.isnan(old):
+                self.missing -= 1
+            else:
+                self.total -= old - self.ref
+                self.total_sq -= (old - self.ref) ** 2
+        self.values.append(value)
+        if math.isnan(value):
+            self.missing += 1
+        else:
+            self.total += value - self.ref
+            self.total_sq += (value - self.ref) ** 2
+
+        self.pushes += 1
+        if self.pushes >= self.REFRESH_EVERY:
+            self._reset(list(self.values))
+
+    def stats_with(self, value):
+        """(n, media, varianza poblacional) de la ventana completada con ``value``; None si incompleta"""
+        n = len(self.values) + 1
+        if n < self.size + 1 or self.missing or math.isnan(value):
+            return None
+        total = self.total + (value - self.ref)
+        total_sq = self.total_sq + (value - self.ref) ** 2
+        mean = total / n
+        return n, self.ref + mean, max(total_sq / n - mean * mean, 0.0)
+
+
+class IndicatorState:
+    """Indicadores de un símbolo actualizables en O(1) por barra nueva o revisada"""
+
+    def __init__(self):
+        self.last_ts = None
+        self.open_bar = None
+        self.state = {
+            'bars': 0,
+            'prev_close': float('nan'),
+            'prev_high': float('nan'),
+            'prev_low': float('nan'),
+            'ema_12': float('nan'),
+            'ema_26': float('nan'),
+            'macd_signal': float('nan'),
+            'macd_count': 0,
+            'rsi_up': float('nan'),
+            'rsi_down': float('nan'),
+            'tr_sum': 0.0,
+            'pos_sum': 0.0,
+            'neg_sum': 0.0,
+            'dx_sum': 0.0,
+            'adx': float('nan'),
+        }
+        # Ventanas de barras confirmadas (tamaño - 1: la barra abierta completa la ventana)
+        self.windows = {
+            'close_20': RollingWindow(19),
+            'close_50': RollingWindow(49),
+            'volume_20': RollingWindow(19),
+        }
+
+    @classmethod
+    def from_frame(cls, data):
+        """Construye el estado reproduciendo un histórico OHLCV (una sola vez)"""
+        state = cls()
+        for ts, row in zip(data.index, data[['Open', 'High', 'Low', 'Close', 'Volume']].itertuples(index=False)):
+            state.update(ts, *row)
+        return state
+
+    def update(self, ts, open_, high, low, close, volume):
+        """Añade una barra nueva o revisa la barra abierta si ``ts`` coincide con ella"""
+        ts = pd.Timestamp(ts)
+        if self.last_ts is not None and ts < self.last_ts:
+            raise ValueError(f"Barra anterior a la última conocida: {ts} < {self.last_ts}")
+
+        if self.last_ts is not None and ts > self.last_ts:
+            self._commit()
+        self.last_ts = ts
+        self.open_bar = (float(open_), float(high), float(low), float(close), float(volume))
+        return self.values()
+
+    def _commit(self):
+        """Confirma la barra abierta en los acumuladores"""
+        self.state, _ = self._step(self.state, self.open_bar)
+        _, high, low, close, volume = self.open_bar
+        self.windows['close_20'].push(close)
+        self.windows['close_50'].push(close)
+        self.windows['volume_20'].push(volume)
+        self.open_bar = None
+
+    def _step(self, s, bar):
+        """Avanza el estado con una barra; devuelve (nuevo estado, indicadores de esa barra)"""
+        _, high, low, close, volume = bar
+        i = s['bars']
+        prev_close, prev_high, prev_low = s['prev_close'], s['prev_high'], s['prev_low']
+        s = dict(s, bars=i + 1, prev_close=close, prev_high=high, prev_low=low)
+        out = {}
+
+        # EMA 12/26 (adjust=False, arrancan en el primer cierre)
+        for span in (12, 26):
+            key = f'ema_{span}'
+            prev = s[key]
+            s[key] = close if math.isnan(prev) else prev + 2.0 / (span + 1.0) * (close - prev)
+            out[f'EMA_{span}'] = s[key] if i + 1 >= span else float('nan')
+
+        # MACD: la señal empieza con la primera línea MACD válida
+        out['MACD'] = out['MACD_Signal'] = float('nan')
+        if i + 1 >= 26:
+            line = s['ema_12'] - s['ema_26']
+            prev = s['macd_signal']
+            s['macd_signal'] = line if math.isnan(prev) else prev + 2.0 / 10.0 * (line - prev)
+            s['macd_count'] += 1
+            if s['macd_count'] >= 9:
+                out['MACD_Signal'] = s['macd_signal']
+                out['MACD'] = line - s['macd_signal']
+
+        # RSI con suavizado de Wilder
+        if i == 0:
+            s['rsi_up'] = s['rsi_down'] = 0.0
+        else:
+            diff = close - prev_close
+            up, down = max(diff, 0.0), max(-diff, 0.0)
+            s['rsi_up'] += (up - s['rsi_up']) / RSI_WINDOW
+            s['rsi_down'] += (down - s['rsi_down']) / RSI_WINDOW
+        out['RSI'] = float('nan')
+        if i + 1 >= RSI_WINDOW:
+            if s['rsi_down'] == 0:
+                out['RSI'] = 100.0
+            else:
+                out['RSI'] = 100.0 - 100.0 / (1.0 + s['rsi_up'] / s['rsi_down'])
+
+        # ADX (mismas convenciones que ta.trend.adx)
+        out['ADX'] = float('nan')
+        if i >= 1:
+            true_range = max(high, prev_close) - min(low, prev_close)
+            diff_up, diff_down = high - prev_high, prev_low - low
+            pos = diff_up if diff_up > diff_down and diff_up > 0 else 0.0
+            neg = diff_down if diff_down > diff_up and diff_down > 0 else 0.0
+            w = ADX_WINDOW
+            if i <= w:
+                s['tr_sum'] += true_range
+                s['pos_sum'] += pos
+                s['neg_sum'] += neg
+            else:
+                s['tr_sum'] += true_range - s['tr_sum'] / w
+                s['pos_sum'] += pos - s['pos_sum'] / w
+                s['neg_sum'] += neg - s['neg_sum'] / w
+            if i >= w:
+                di_pos = 100.0 * s['pos_sum'] / s['tr_sum'] if s['tr_sum'] != 0 else 0.0
+                di_neg = 100.0 * s['neg_sum'] / s['tr_sum'] if s['tr_sum'] != 0 else 0.0
+                di_sum = di_pos + di_neg
+                dx = 100.0 * abs(di_pos - di_neg) / di_sum if di_sum != 0 else 0.0
+                if i <= 2 * w - 1:
+                    s['dx_sum'] += dx
+                    if i == 2 * w - 1:
+                        s['adx'] = s['dx_sum'] / w
+                else:
+                    s['adx'] = (s['adx'] * (w - 1) + dx) / w
+                if i >= 2 * w - 1:
+                    out['ADX'] = s['adx']
+        return s, out
+
+    def values(self):
+        """Indicadores de la última barra (abierta), con los mismos nombres que ``calculate_indicators``"""
+        if self.open_bar is None:
+            return {}
+        _, high, low, close, volume = self.open_bar
+        _, out = self._step(self.state, self.open_bar)
+
+        sma_20 = self.windows['close_20'].stats_with(close)
+        sma_50 = self.windows['close_50'].stats_with(close)
+        volume_20 = self.windows['volume_20'].stats_with(volume)
+        nan = float('nan')
+
+        out['SMA_20'] = sma_20[1] if sma_20 else nan
+        out['SMA_50'] = sma_50[1] if sma_50 else nan
+        out['BB_Mid'] = out['SMA_20']
+        bb_std = math.sqrt(sma_20[2]) if sma_20 else nan
+        out['BB_High'] = out['BB_Mid'] + 2 * bb_std
+        out['BB_Low'] = out['BB_Mid'] - 2 * bb_std
+        out['Volume_SMA'] = volume_20[1] if volume_20 else nan
+
+        out.update({'Open': self.open_bar[0], 'High': high, 'Low': low, 'Close': close, 'Volume': volume})
+        out['bars'] = self.state['bars'] + 1
+        return out
+
+    def to_dict(self):
+        """Representación JSON del estado"""
+        return {
+            'version': STATE_VERSION,
+            'last_ts': self.last_ts.isoformat() if self.last_ts is not None else None,
+            'open_bar': list(self.open_bar) if self.open_bar is not None else None,
+            'state': {k: _nan_to_none(v) for k, v in self.state.items()},
+            'windows': {k: [_nan_to_none(v) for v in w.values] for k, w in self.windows.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, payload):
+        if payload.get('version') != STATE_VERSION:
+            raise ValueError(f"Versión de estado no soportada: {payload.get('version')}")
+        state = cls()
+        state.last_ts = pd.Timestamp(payload['last_ts']) if payload['last_ts'] else None
+        state.open_bar = tuple(payload['open_bar']) if payload['open_bar'] else None
+        state.state.update({k: _none_to_nan(v) for k, v in payload['state'].items()})
+        for name, values in payload['windows'].items():
+            state.windows[name]._reset([_none_to_nan(v) for v in values])
+        return state
+
+
+def save_states(path, states):
+    """Guarda de forma atómica un diccionario símbolo -> IndicatorState"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({symbol: state.to_dict() for symbol, state in states.items()}, f)
+    os.replace(tmp_path, path)
+
+
+def load_states(path):
+    """Carga los estados guardados con ``save_states`` (ignora los de versiones antiguas)"""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        payload = json.load(f)
+    states = {}
+    for symbol, item in payload.items():
+        try:
+            states[symbol] = IndicatorState.from_dict(item)
+        except (KeyError, ValueError):
+            continue
+    return states
@@ -0,0 +1,238 @@
+"""Motor vectorizado de indicadores técnicos sobre paneles fechas × símbolos.
+
+Calcula para todo el universo, en una sola pasada sobre arrays 2-D de NumPy,
+los mismos indicadores que ``UptrendAnalyzer.calculate_indicators`` obtiene con
+``ta`` símbolo a símbolo (mismas columnas, mismas convenciones y mismos
+periodos de calentamiento).
+
+Los históricos de distinta longitud o con fechas desalineadas (p. ej. cripto
+cotiza en fin de semana y las acciones no) se tratan "empaquetando" las barras
+válidas de cada símbolo al principio del array: así cada columna se calcula
+sobre su propia secuencia de barras, exactamente como lo haría ``ta``, y los
+resultados se devuelven a su posición en la rejilla de fechas.
+"""
+import numpy as np
+import pandas as pd
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+INDICATOR_COLUMNS = [
+    'SMA_20', 'SMA_50', 'EMA_12', 'EMA_26', 'MACD', 'MACD_Signal', 'RSI',
+    'BB_High', 'BB_Low', 'BB_Mid', 'ADX', 'Volume_SMA'
+]
+
+
+class Panel:
+    """Panel alineado de series: cada columna es un array (fechas × símbolos)"""
+
+    def __init__(self, dates, symbols, columns):
+        self.dates = pd.DatetimeIndex(dates)
+        self.symbols = list(symbols)
+        self.columns = dict(columns)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    @property
+    def shape(self):
+        return len(self.dates), len(self.symbols)
+
+    @classmethod
+    def from_frames(cls, frames, columns=OHLCV_COLUMNS):
+        """Alinea DataFrames OHLCV por símbolo sobre la unión de sus fechas"""
+        frames = {s: d for s, d in frames.items() if d is not None and not d.empty}
+        symbols = list(frames)
+        if not symbols:
+            return cls(pd.DatetimeIndex([]), [], {c: np.empty((0, 0)) for c in columns})
+
+        dates = pd.DatetimeIndex(sorted(set().union(*(d.index for d in frames.values()))))
+        arrays = {}
+        for column in columns:
+            wide = pd.DataFrame(
+                {s: d[column] for s, d in frames.items() if column in d.columns},
+                index=dates,
+                columns=symbols
+            )
+            arrays[column] = wide.to_numpy(dtype='float64')
+        return cls(dates, symbols, arrays)
+
+    def to_frames(self, columns=None):
+        """Devuelve un DataFrame por símbolo con las barras existentes de ese símbolo"""
+        columns = list(self.columns) if columns is None else columns
+        close = self.columns['Close']
+        frames = {}
+        for j, symbol in enumerate(self.symbols):
+            valid = ~np.isnan(close[:, j])
+            frames[symbol] = pd.DataFrame(
+                {c: self.columns[c][valid, j] for c in columns},
+                index=self.dates[valid]
+            )
+        return frames
+
+
+def pack_rows(valid):
+    """Orden que lleva las filas válidas de cada columna al principio (estable)"""
+    order = np.argsort(~valid, axis=0, kind='stable')
+    return order, valid.sum(axis=0)
+
+
+def unpack_rows(packed, order, valid):
+    """Inversa de ``pack_rows``: devuelve cada valor a su fila original (NaN donde no hay barra)"""
+    out = np.empty_like(packed)
+    np.put_along_axis(out, order, packed, axis=0)
+    out[~valid] = np.nan
+    return out
+
+
+def _shift(x, periods=1):
+    out = np.full_like(x, np.nan)
+    out[periods:] = x[:-periods]
+    return out
+
+
+def rolling_mean(x, window):
+    """Media móvil simple (min_periods = window) por columnas"""
+    out = np.full_like(x, np.nan)
+    if len(x) < window:
+        return out
+    present = ~np.isnan(x)
+    csum = np.cumsum(np.where(present, x, 0.0), axis=0)
+    ccount = np.cumsum(present, axis=0)
+
+    total = csum[window - 1:].copy()
+    total[1:] -= csum[:-window]
+    count = ccount[window - 1:].copy()
+    count[1:] -= ccount[:-window]
+    out[window - 1:] = np.where(count == window, total / window, np.nan)
+    return out
+
+
+def rolling_std(x, window):
+    """Desviación típica móvil poblacional (ddof=0) por columnas"""
+    # Se centra cada columna para evitar la cancelación numérica de E[x²] - E[x]²
+    centered = x - np.nan_to_num(x[:1])
+    mean = rolling_mean(centered, window)
+    mean_sq = rolling_mean(centered * centered, window)
+    return np.sqrt(np.maximum(mean_sq - mean * mean, 0.0))
+
+
+def ewm_mean(x, alpha, min_periods):
+    """Media exponencial (adjust=False) por columnas, arrancando en el primer valor válido"""
+    out = np.full_like(x, np.nan)
+    state = np.full(x.shape[1:], np.nan)
+    count = np.zeros(x.shape[1:], dtype=np.int64)
+    for t in range(len(x)):
+        row = x[t]
+        present = ~np.isnan(row)
+        state = np.where(np.isnan(state), row, state + alpha * (row - state))
+        count += present
+        out[t] = np.where(count >= min_periods, state, np.nan)
+    return out
+
+
+def ema(x, span):
+    return ewm_mean(x, 2.0 / (span + 1.0), span)
+
+
+def rsi(close, window=14):
+    diff = close - _shift(close)
+    up = np.where(diff > 0, diff, 0.0)
+    down = np.where(diff < 0, -diff, 0.0)
+    up = np.where(np.isnan(close), np.nan, up)
+    down = np.where(np.isnan(close), np.nan, down)
+    ema_up = ewm_mean(up, 1.0 / window, window)
+    ema_down = ewm_mean(down, 1.0 / window, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = np.where(ema_down == 0, 100.0, 100.0 - 100.0 / (1.0 + ema_up / ema_down))
+    return np.where(np.isnan(ema_up) | np.isnan(ema_down), np.nan, out)
+
+
+def adx(high, low, close, window=14):
+    """ADX con el mismo suavizado de Wilder (y los ceros iniciales) que ``ta.trend.adx``"""
+    n_rows = len(close)
+    out = np.full_like(close, np.nan)
+    if n_rows < 2 * window:
+        return out
+
+    prev_close = _shift(close)
+    true_range = np.maximum(high, prev_close) - np.minimum(low, prev_close)
+    diff_up = high - _shift(high)
+    diff_down = _shift(low) - low
+    pos = np.where((diff_up > diff_down) & (diff_up > 0), diff_up, 0.0)
+    neg = np.where((diff_down > diff_up) & (diff_down > 0), diff_down, 0.0)
+
+    smooth_tr = true_range[1:window + 1].sum(axis=0)
+    smooth_pos = pos[1:window + 1].sum(axis=0)
+    smooth_neg = neg[1:window + 1].sum(axis=0)
+
+    dx = np.full_like(close, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for t in range(window, n_rows):
+            if t > window:
+                smooth_tr = smooth_tr - smooth_tr / window + true_range[t]
+                smooth_pos = smooth_pos - smooth_pos / window + pos[t]
+                smooth_neg = smooth_neg - smooth_neg / window + neg[t]
+            di_pos = np.where(smooth_tr != 0, 100.0 * smooth_pos / smooth_tr, 0.0)
+            di_neg = np.where(smooth_tr != 0, 100.0 * smooth_neg / smooth_tr, 0.0)
+            di_sum = di_pos + di_neg
+            dx[t] = np.where(di_sum != 0, 100.0 * np.abs(di_pos - di_neg) / di_sum, 0.0)
+
+    first = 2 * window - 1
+    out[:first] = 0.0
+    out[first] = dx[window:first + 1].mean(axis=0)
+    for t in range(first + 1, n_rows):
+        out[t] = (out[t - 1] * (window - 1) + dx[t]) / window
+    return out
+
+
+def _compute_packed(close, high, low, volume):
+    """Indicadores sobre arrays empaquetados (todas las columnas empiezan en la fila 0)"""
+    ema_fast = ema(close, 12)
+    ema_slow = ema(close, 26)
+    macd_line = ema_fast - ema_slow
+    macd_signal = ema(macd_line, 9)
+
+    bb_mid = rolling_mean(close, 20)
+    bb_std = rolling_std(close, 20)
+
+    return {
+        'SMA_20': rolling_mean(close, 20),
+        'SMA_50': rolling_mean(close, 50),
+        'EMA_12': ema_fast,
+        'EMA_26': ema_slow,
+        'MACD': macd_line - macd_signal,
+        'MACD_Signal': macd_signal,
+        'RSI': rsi(close, 14),
+        'BB_High': bb_mid + 2 * bb_std,
+        'BB_Low': bb_mid - 2 * bb_std,
+        'BB_Mid': bb_mid,
+        'ADX': adx(high, low, close, 14),
+        'Volume_SMA': rolling_mean(volume, 20),
+    }
+
+
+def compute_indicators(panel):
+    """Añade al panel las columnas de ``INDICATOR_COLUMNS`` para todos los símbolos a la vez"""
+    close = panel['Close']
+    if close.size == 0:
+        panel.columns.update({c: np.empty_like(close) for c in INDICATOR_COLUMNS})
+        return panel
+
+    valid = ~np.isnan(close)
+    order, lengths = pack_rows(valid)
+    packed = {
+        c: np.take_along_axis(panel[c], order, axis=0)
+        for c in ('Close', 'High', 'Low', 'Volume')
+    }
+    results = _compute_packed(packed['Close'], packed['High'], packed['Low'], packed['Volume'])
+
+    # ADX necesita al menos 2 × ventana barras propias (ta falla con menos)
+    short = lengths < 2 * 14
+    results['ADX'][:, short] = np.nan
+
+    for name, values in results.items():
+        panel.columns[name] = unpack_rows(values, order, valid)
+    return panel
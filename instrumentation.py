@@ -0,0 +1,250 @@
+"""Instrumentación por etapas del escaneo: tiempos, latencias y contadores.
+
+Las etapas (descarga, indicadores, puntuación, pintado...) se miden con
+``metrics.stage(nombre, símbolo)`` o ``metrics.observe``; los eventos (reintentos,
+errores, aciertos de caché) con ``metrics.count``. De cada etapa se guarda el
+total, el número de mediciones, un histograma por tramos de latencia y las
+últimas muestras para calcular p50/p95/p99; de las etapas medidas por símbolo,
+también el tiempo acumulado de cada símbolo.
+
+Está desactivada por defecto (se activa con ``--metrics`` en el escáner o con
+``UPTREND_METRICS=1``; en la aplicación es un ajuste del servidor, porque las
+métricas son comunes a todas las sesiones). Desactivada, ``stage`` devuelve un
+contexto vacío compartido y el resto de llamadas vuelven tras comprobar un
+atributo, así que la instrumentación puede quedarse en el código.
+"""
+import bisect
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from importlib.util import find_spec
+
+import numpy as np
+
+# Límites superiores (segundos) de los tramos del histograma de latencias
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Perfiladores disponibles (pyinstrument es opcional)
+PROFILERS = ['cprofile'] + (['pyinstrument'] if find_spec('pyinstrument') else [])
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'symbol', 'started')
+
+    def __init__(self, metrics, name, symbol):
+        self.metrics = metrics
+        self.name = name
+        self.symbol = symbol
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.started, self.symbol)
+        return False
+
+
+class StageStats:
+    """Mediciones de una etapa: total, histograma por tramos y últimas muestras"""
+
+    def __init__(self, max_samples=2048):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.samples = deque(maxlen=max_samples)
+        self.by_symbol = {}
+
+    def add(self, seconds, symbol=None):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.samples.append(seconds)
+        if symbol is not None:
+            self.by_symbol[symbol] = self.by_symbol.get(symbol, 0.0) + seconds
+
+    def quantiles(self):
+        if not self.samples:
+            return dict.fromkeys(QUANTILES, 0.0)
+        values = np.quantile(np.fromiter(self.samples, dtype='float64'), QUANTILES)
+        return dict(zip(QUANTILES, values.tolist()))
+
+    def summary(self, slowest=5):
+        quantiles = self.quantiles()
+        top = sorted(self.by_symbol.items(), key=lambda item: item[1], reverse=True)[:slowest]
+        return {
+            'count': self.count,
+            'total_seconds': self.total,
+            'mean_seconds': self.total / self.count if self.count else 0.0,
+            'p50_seconds': quantiles[0.5],
+            'p95_seconds': quantiles[0.95],
+            'p99_seconds': quantiles[0.99],
+            'max_seconds': self.max,
+            'histogram': dict(zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'], self.buckets)),
+            'slowest_symbols': [{'symbol': s, 'seconds': t} for s, t in top],
+        }
+
+
+class Metrics:
+    def __init__(self, enabled=False, max_samples=2048):
+        self.enabled = enabled
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+            self.started_at = time.time()
+
+    def stage(self, name, symbol=None):
+        """Contexto que mide el tiempo de una etapa (opcionalmente de un símbolo)"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, symbol)
+
+    def observe(self, name, seconds, symbol=None):
+        """Registra una duración ya medida"""
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats(self.max_samples)
+            stats.add(seconds, symbol)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def hit_rates(self):
+        """Tasa de aciertos de cada par de contadores ``<x>.hits`` / ``<x>.misses``"""
+        rates = {}
+        for name, hits in self.counters.items():
+            if name.endswith('.hits'):
+                base = name[:-len('.hits')]
+                total = hits + self.counters.get(base + '.misses', 0)
+                rates[base] = hits / total if total else 0.0
+        return rates
+
+    def snapshot(self):
+        """Estado actual como diccionario (lo que se exporta en JSON)"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'since': self.started_at,
+                'stages': {name: stats.summary() for name, stats in self.stages.items()},
+                'counters': dict(self.counters),
+                'hit_rates': self.hit_rates(),
+            }
+
+    def to_json(self, indent=2):
+        return json.dumps(self.snapshot(), indent=indent, ensure_ascii=False)
+
+    def to_prometheus(self, prefix='uptrend'):
+        """Formato de texto de Prometheus: histograma por etapa, cuantiles y contadores"""
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_stage_seconds Duración de cada etapa del escaneo",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        for name, stats in snapshot['stages'].items():
+            cumulative = 0
+            for bound, n in stats['histogram'].items():
+                cumulative += n
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {stats["total_seconds"]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {stats["count"]}')
+
+        lines += [
+            f"# HELP {prefix}_stage_quantile_seconds Cuantiles de latencia (últimas muestras)",
+            f"# TYPE {prefix}_stage_quantile_seconds gauge",
+        ]
+        for name, stats in snapshot['stages'].items():
+            for q in QUANTILES:
+                value = stats[f'p{int(q * 100)}_seconds']
+                lines.append(f'{prefix}_stage_quantile_seconds{{stage="{name}",quantile="{q}"}} {value:.6f}')
+
+        lines += [f"# HELP {prefix}_events_total Eventos contados", f"# TYPE {prefix}_events_total counter"]
+        for name, value in snapshot['counters'].items():
+            lines.append(f'{prefix}_events_total{{event="{name}"}} {value}')
+
+        lines += [f"# HELP {prefix}_cache_hit_ratio Tasa de aciertos de caché", f"# TYPE {prefix}_cache_hit_ratio gauge"]
+        for name, value in snapshot['hit_rates'].items():
+            lines.append(f'{prefix}_cache_hit_ratio{{cache="{name}"}} {value:.6f}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Exporta a ``path`` en Prometheus (.prom, .txt) o JSON (cualquier otra extensión)"""
+        text = self.to_prometheus() if os.path.splitext(path)[1] in ('.prom', '.txt') else self.to_json()
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+class ProfileReport:
+    def __init__(self, kind):
+        self.kind = kind
+        self.text = ''
+
+
+@contextmanager
+def profile(kind='cprofile', limit=40):
+    """Perfila el bloque (un escaneo) con cProfile o pyinstrument; el informe queda en ``report.text``
+
+    Los dos perfiladores ven solo el hilo que ejecuta el bloque (cálculo y
+    pintado), no la descarga en segundo plano: esa se mide con las etapas.
+    pyinstrument (opcional) muestrea en lugar de trazar y pesa mucho menos.
+    """
+    report = ProfileReport(kind)
+    if kind == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise RuntimeError("pyinstrument no está instalado (pip install pyinstrument)") from None
+        profiler = Profiler(async_mode='disabled')
+        profiler.start()
+        try:
+            yield report
+        finally:
+            profiler.stop()
+            report.text = profiler.output_text(unicode=True, color=False)
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield report
+        finally:
+            profiler.disable()
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(limit)
+            report.text = output.getvalue()
+
+
+# Métricas del proceso (compartidas por el núcleo, el planificador, el pipeline y la interfaz)
+metrics = Metrics(enabled=os.environ.get('UPTREND_METRICS') == '1')
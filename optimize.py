@@ -0,0 +1,347 @@
+"""Barrido de parámetros del algoritmo: ventanas de indicadores, pesos y umbrales.
+
+Cada configuración candidata fija las ventanas (SMA rápida y lenta, EMA del
+MACD, RSI, ADX), los umbrales de las condiciones (banda del RSI, nivel del ADX),
+el peso de cada señal y el umbral de la señal Uptrend. Se puntúa cada barra
+del histórico del universo con cada configuración y se ordenan por los retornos
+futuros de las barras con señal frente a los de todas las barras (exceso de
+retorno, tasa de acierto, estadístico t).
+
+El coste está en los indicadores, no en el número de configuraciones:
+
+- Las medias simples de cualquier ventana salen de una única suma acumulada
+  (prefix sum) del cierre; EMA, RSI y ADX se calculan una vez por ventana
+  distinta y cada condición booleana una vez por combinación de sus parámetros.
+- Pesos y umbral solo dependen de qué condiciones se cumplen, así que cada
+  barra se reduce a un código de 7 bits y los retornos futuros se agregan por
+  código (128 casillas). Evaluar cualquier combinación de pesos y umbral es
+  entonces un producto de matrices sobre esas 128 casillas, sin volver a tocar
+  las barras.
+
+Como en ``backtest``, el universo se divide en bloques de símbolos que se
+procesan en un pool de procesos (y, si hay más procesos que bloques, también se
+reparten las configuraciones); cada tarea devuelve tablas sumables que se
+combinan al final.
+"""
+import itertools
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from column_store import StoreSlice
+from indicators import Panel, adx, ema, pack_rows, rolling_mean, rolling_std, rsi
+from pipeline import process_pool
+from scoring import MIN_BARS, SIGNAL_NAMES, SIGNAL_WEIGHTS, UPTREND_THRESHOLD
+
+# Parámetros que cambian los indicadores o las condiciones (caros) y los que solo cambian la puntuación
+INDICATOR_PARAMETERS = [
+    'sma_fast', 'sma_slow', 'ema_fast', 'ema_slow', 'rsi_window', 'adx_window',
+    'rsi_low', 'rsi_high', 'adx_level',
+]
+WEIGHT_PARAMETERS = [f'weight_{name}' for name in SIGNAL_NAMES]
+SCORE_PARAMETERS = WEIGHT_PARAMETERS + ['threshold']
+PARAMETERS = INDICATOR_PARAMETERS + SCORE_PARAMETERS
+
+# Los valores de ``calculate_indicators`` y ``detect_uptrend_signal``
+DEFAULT_PARAMETERS = {
+    'sma_fast': 20, 'sma_slow': 50, 'ema_fast': 12, 'ema_slow': 26, 'rsi_window': 14, 'adx_window': 14,
+    'rsi_low': 30, 'rsi_high': 70, 'adx_level': 25,
+    **{f'weight_{name}': weight for name, weight in SIGNAL_WEIGHTS.items()},
+    'threshold': UPTREND_THRESHOLD,
+}
+
+# Valores de cada parámetro en la búsqueda aleatoria
+PARAMETER_SPACE = {
+    'sma_fast': (10, 15, 20, 30),
+    'sma_slow': (40, 50, 100, 150),
+    'ema_fast': (8, 12, 16),
+    'ema_slow': (21, 26, 34),
+    'rsi_window': (9, 14, 21),
+    'adx_window': (10, 14, 20),
+    'rsi_low': (30, 40, 50),
+    'rsi_high': (70, 80, 90),
+    'adx_level': (20, 25, 30),
+    **{name: (0, 5, 10, 15, 20, 25, 30) for name in WEIGHT_PARAMETERS},
+    'threshold': (40, 50, 60, 70, 80),
+}
+
+# Fijos (como en ``indicators``): señal del MACD, Bollinger y media de volumen
+MACD_SIGNAL = 9
+BB_WINDOW = 20
+VOLUME_WINDOW = 20
+
+METRICS = ('excess_return', 'mean_return', 'hit_rate', 't_stat')
+DEFAULT_HORIZONS = (5, 10, 20)
+MAX_GRID = 1_000_000
+
+# Estadísticos por código: barras, suma, suma de cuadrados y aciertos de los retornos futuros
+_STATS = 4
+_CODES = 1 << len(SIGNAL_NAMES)
+# Bits de cada código (128 × 7)
+_CODE_BITS = (np.arange(_CODES)[:, None] >> np.arange(len(SIGNAL_NAMES))) & 1
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def is_valid(config):
+    """Descarta combinaciones sin sentido (media rápida no más corta que la lenta, banda RSI vacía)"""
+    return (config['sma_fast'] < config['sma_slow'] and config['ema_fast'] < config['ema_slow']
+            and config['rsi_low'] < config['rsi_high'])
+
+
+def grid_candidates(space):
+    """Producto cartesiano de ``space`` (nombre -> valores); los parámetros omitidos valen lo de siempre"""
+    values = [tuple(space.get(name, (DEFAULT_PARAMETERS[name],))) for name in PARAMETERS]
+    size = math.prod(len(v) for v in values)
+    if size > MAX_GRID:
+        raise ValueError(f"La rejilla tiene {size} configuraciones (máximo {MAX_GRID}): usa la búsqueda aleatoria")
+    candidates = (dict(zip(PARAMETERS, combination)) for combination in itertools.product(*values))
+    return [config for config in candidates if is_valid(config)]
+
+
+def random_candidates(space, samples, seed=0):
+    """``samples`` configuraciones distintas tomadas al azar de ``space`` (completado con ``PARAMETER_SPACE``)"""
+    space = {name: tuple(space.get(name, PARAMETER_SPACE[name])) for name in PARAMETERS}
+    rng = np.random.default_rng(seed)
+    seen, candidates = set(), []
+    for _ in range(samples * 20):
+        if len(candidates) >= samples:
+            break
+        config = {name: values[rng.integers(len(values))] for name, values in space.items()}
+        key = tuple(config.values())
+        if key not in seen and is_valid(config):
+            seen.add(key)
+            candidates.append(config)
+    return candidates
+
+
+def warmup_bars(indicator_configs):
+    """Barras iniciales sin puntuar, comunes a todas las configuraciones (misma base de comparación)"""
+    longest = [
+        max(c['sma_slow'], c['ema_slow'] + MACD_SIGNAL, 2 * c['adx_window'], c['rsi_window'] + 1, BB_WINDOW)
+        for c in indicator_configs
+    ]
+    return max([MIN_BARS] + longest)
+
+
+class _Precomputed:
+    """Indicadores de un bloque (filas empaquetadas) memorizados por ventana y condición"""
+
+    def __init__(self, close, high, low, volume, lengths):
+        self.close, self.high, self.low, self.volume = close, high, low, volume
+        self.lengths = lengths
+        self.rows = np.arange(len(close))[:, None]
+        # Una sola suma acumulada para las medias simples de cualquier ventana
+        self._csum = np.vstack([np.zeros((1, close.shape[1])), np.cumsum(np.nan_to_num(close), axis=0)])
+        self._cache = {}
+        with np.errstate(invalid='ignore'):
+            bb_high = rolling_mean(close, BB_WINDOW) + 2 * rolling_std(close, BB_WINDOW)
+            self.bb_breakout = close > bb_high
+            self.volume_confirmation = volume > rolling_mean(volume, VOLUME_WINDOW)
+
+    def _memo(self, key, compute):
+        value = self._cache.get(key)
+        if value is None:
+            value = self._cache[key] = compute()
+        return value
+
+    def sma(self, window):
+        def compute():
+            out = np.full_like(self.close, np.nan)
+            out[window - 1:] = (self._csum[window:] - self._csum[:-window]) / window
+            out[(self.rows < window - 1) | (self.rows >= self.lengths)] = np.nan
+            return out
+        return self._memo(('sma', window), compute)
+
+    def ema(self, span):
+        return self._memo(('ema', span), lambda: ema(self.close, span))
+
+    def macd(self, fast, slow):
+        """(MACD, señal) con las columnas de ``indicators``: histograma y señal"""
+        def compute():
+            line = self.ema(fast) - self.ema(slow)
+            signal = ema(line, MACD_SIGNAL)
+            return line - signal, signal
+        return self._memo(('macd', fast, slow), compute)
+
+    def condition(self, name, config):
+        """Condición booleana ``name`` (de ``scoring.signal_arrays``) con los parámetros de ``config``"""
+        c = config
+        with np.errstate(invalid='ignore'):
+            if name == 'ma_bullish_order':
+                return self._memo((name, c['sma_fast'], c['sma_slow']),
+                                  lambda: self.sma(c['sma_fast']) > self.sma(c['sma_slow']))
+            if name == 'price_above_ma':
+                return self._memo((name, c['sma_fast'], c['sma_slow']), lambda: (
+                    (self.close > self.sma(c['sma_fast'])) & self.condition('ma_bullish_order', c)
+                ))
+            if name == 'macd_bullish':
+                def compute():
+                    macd, signal = self.macd(c['ema_fast'], c['ema_slow'])
+                    return (macd > signal) & (macd > 0)
+                return self._memo((name, c['ema_fast'], c['ema_slow']), compute)
+            if name == 'rsi_favorable':
+                def compute():
+                    values = self._memo(('rsi', c['rsi_window']), lambda: rsi(self.close, c['rsi_window']))
+                    return (values > c['rsi_low']) & (values < c['rsi_high'])
+                return self._memo((name, c['rsi_window'], c['rsi_low'], c['rsi_high']), compute)
+            if name == 'strong_trend':
+                def compute():
+                    def adx_values():
+                        values = adx(self.high, self.low, self.close, c['adx_window'])
+                        # Como en ``compute_indicators``: sin ADX con menos de 2 × ventana barras
+                        values[:, self.lengths < 2 * c['adx_window']] = np.nan
+                        return values
+                    return self._memo(('adx', c['adx_window']), adx_values) > c['adx_level']
+                return self._memo((name, c['adx_window'], c['adx_level']), compute)
+        return getattr(self, name)
+
+    def codes(self, config):
+        """Código de 7 bits (bit i: condición ``SIGNAL_NAMES[i]``) de cada barra"""
+        code = np.zeros(self.close.shape, dtype=np.int64)
+        for bit, name in enumerate(SIGNAL_NAMES):
+            code |= self.condition(name, config).astype(np.int64) << bit
+        return code
+
+
+def sweep_chunk(chunk, indicator_configs, horizons=DEFAULT_HORIZONS, warmup=MIN_BARS):
+    """Tablas parciales (sumables) de un bloque de símbolos: (configuración, horizonte, estadístico, código)
+
+    ``chunk`` es un diccionario símbolo -> DataFrame o un ``StoreSlice``.
+    """
+    panel = chunk.panel() if isinstance(chunk, StoreSlice) else Panel.from_frames(chunk)
+    tables = np.zeros((len(indicator_configs), len(horizons), _STATS, _CODES))
+    close = panel['Close']
+    if close.size == 0:
+        return tables
+
+    valid = ~np.isnan(close)
+    order, lengths = pack_rows(valid)
+    packed = {c: np.take_along_axis(panel[c], order, axis=0) for c in ('Close', 'High', 'Low', 'Volume')}
+    pre = _Precomputed(packed['Close'], packed['High'], packed['Low'], packed['Volume'], lengths)
+
+    # Barras puntuables con retorno futuro conocido, por horizonte (las mismas para todas las configuraciones)
+    c = packed['Close']
+    rows = pre.rows
+    targets = []
+    for h in horizons:
+        forward = np.full_like(c, np.nan)
+        if h < len(c):
+            forward[:-h] = c[h:] / c[:-h] - 1
+        eligible = (rows >= warmup - 1) & (rows + h < lengths) & ~np.isnan(forward)
+        index = np.flatnonzero(eligible)
+        values = forward.ravel()[index]
+        targets.append((index, values, values * values, (values > 0).astype('float64')))
+
+    for k, config in enumerate(indicator_configs):
+        code = pre.codes(config).ravel()
+        for i, (index, values, squares, hits) in enumerate(targets):
+            codes = code[index]
+            tables[k, i, 0] = np.bincount(codes, minlength=_CODES)
+            tables[k, i, 1] = np.bincount(codes, weights=values, minlength=_CODES)
+            tables[k, i, 2] = np.bincount(codes, weights=squares, minlength=_CODES)
+            tables[k, i, 3] = np.bincount(codes, weights=hits, minlength=_CODES)
+    return tables
+
+
+def _sweep_chunk_args(args):
+    return sweep_chunk(*args)
+
+
+def evaluate(tables, indicator_configs, candidates, horizons=DEFAULT_HORIZONS):
+    """Métricas de cada candidata a partir de las tablas combinadas (una fila por candidata)"""
+    position = {tuple(c[name] for name in INDICATOR_PARAMETERS): k for k, c in enumerate(indicator_configs)}
+    groups = {}
+    for i, config in enumerate(candidates):
+        groups.setdefault(position[tuple(config[name] for name in INDICATOR_PARAMETERS)], []).append(i)
+
+    columns = {name: np.empty(len(candidates)) for name in ('signals', 'sum', 'sumsq', 'hits')}
+    metrics = {h: {name: np.empty(len(candidates)) for name in columns} for h in horizons}
+    for k, members in groups.items():
+        weights = np.array([[candidates[i][name] for name in WEIGHT_PARAMETERS] for i in members], dtype='float64')
+        threshold = np.array([candidates[i]['threshold'] for i in members], dtype='float64')
+        # Códigos que superan el umbral con los pesos de cada candidata (candidatas × 128)
+        passes = ((weights @ _CODE_BITS.T) >= threshold[:, None]).astype('float64')
+        for j, h in enumerate(horizons):
+            stats = passes @ tables[k, j].T
+            for s, name in enumerate(columns):
+                metrics[h][name][members] = stats[:, s]
+
+    frame = pd.DataFrame(candidates, columns=PARAMETERS)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for j, h in enumerate(horizons):
+            base = tables[0, j].sum(axis=1)
+            base_mean = base[1] / base[0] if base[0] else np.nan
+            m = metrics[h]
+            mean = m['sum'] / m['signals']
+            std = np.sqrt(np.maximum(m['sumsq'] / m['signals'] - mean * mean, 0.0))
+            frame[f'signals_{h}'] = m['signals'].astype(np.int64)
+            frame[f'hit_rate_{h}'] = m['hits'] / m['signals']
+            frame[f'mean_return_{h}'] = mean
+            frame[f'excess_return_{h}'] = mean - base_mean
+            frame[f't_stat_{h}'] = (mean - base_mean) / (std / np.sqrt(m['signals']))
+    return frame
+
+
+def run_sweep(frames, candidates, horizons=DEFAULT_HORIZONS, metric='excess_return', horizon=None,
+              min_signals=100, chunk_size=50, workers=None, store=None, start=None):
+    """Evalúa ``candidates`` sobre el universo y las devuelve ordenadas (la mejor primero)
+
+    Las configuraciones actuales (``DEFAULT_PARAMETERS``) se evalúan siempre y
+    se marcan en la columna ``default``. Con ``store`` (``ColumnStore``) los
+    símbolos guardados en él se leen desde ``start`` en cada proceso.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Métrica desconocida: {metric} (usa {', '.join(METRICS)})")
+    horizons = tuple(horizons)
+    horizon = horizon or horizons[-1]
+    if horizon not in horizons:
+        horizons += (horizon,)
+    candidates = list(candidates)
+    if DEFAULT_PARAMETERS not in candidates:
+        candidates.append(dict(DEFAULT_PARAMETERS))
+
+    indicator_configs = list({
+        tuple(c[name] for name in INDICATOR_PARAMETERS): {name: c[name] for name in INDICATOR_PARAMETERS}
+        for c in candidates
+    }.values())
+    # Configuraciones con ventanas parecidas juntas: comparten más indicadores memorizados
+    indicator_configs.sort(key=lambda c: tuple(c[name] for name in INDICATOR_PARAMETERS))
+    warmup = warmup_bars(indicator_configs)
+
+    frames = {s: d for s, d in frames.items() if d is not None and not d.empty}
+    stored = set(store.symbols) if store is not None else set()
+    chunks = [StoreSlice(store.path, chunk, start) for chunk in _chunks([s for s in frames if s in stored], chunk_size)]
+    chunks += [{s: frames[s] for s in chunk} for chunk in _chunks([s for s in frames if s not in stored], chunk_size)]
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    # Si hay menos bloques que procesos, las configuraciones también se reparten
+    groups = max(1, min(-(-workers // max(len(chunks), 1)), len(indicator_configs)))
+    bounds = np.linspace(0, len(indicator_configs), groups + 1).astype(int)
+    tasks = [
+        (chunk, indicator_configs[lo:hi], horizons, warmup)
+        for chunk in chunks for lo, hi in zip(bounds[:-1], bounds[1:])
+    ]
+
+    if workers <= 1 or len(tasks) <= 1:
+        partials = [sweep_chunk(*task) for task in tasks]
+    else:
+        with process_pool(min(workers, len(tasks))) as executor:
+            partials = list(executor.map(_sweep_chunk_args, tasks))
+
+    tables = np.zeros((len(indicator_configs), len(horizons), _STATS, _CODES))
+    for n, partial in enumerate(partials):
+        lo, hi = bounds[n % groups], bounds[n % groups + 1]
+        tables[lo:hi] += partial
+
+    ranking = evaluate(tables, indicator_configs, candidates, horizons)
+    ranking['default'] = [c == DEFAULT_PARAMETERS for c in candidates]
+    key = f'{metric}_{horizon}'
+    ranking = ranking[(ranking[f'signals_{horizon}'] >= min_signals) | ranking['default']]
+    return ranking.sort_values(key, ascending=False, kind='stable', na_position='last').reset_index(drop=True)
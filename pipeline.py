@@ -0,0 +1,294 @@
+"""Pipeline de escaneo en dos etapas: descarga (E/S) y cálculo (procesos).
+
+La etapa de E/S es un hilo con el planificador de descargas que deja cada
+serie en una cola acotada en cuanto está lista. La etapa de cálculo agrupa
+las series en bloques y calcula sus indicadores en un pool de procesos, así
+que la descarga y el cálculo se solapan y el cálculo escala con los núcleos.
+
+Los precios viajan a los procesos por memoria compartida (un array
+columnas × fechas × símbolos por bloque) en lugar de como DataFrames
+serializados, y los indicadores vuelven por el mismo camino; por el pool solo
+pasan los nombres de los bloques y las fechas.
+
+Contrapresión: la cola tiene tamaño máximo y el número de bloques en cálculo
+está limitado, así que si el cálculo va por detrás la descarga se detiene y
+la memoria no crece con el tamaño del universo.
+"""
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from indicators import INDICATOR_COLUMNS, OHLCV_COLUMNS, Panel, compute_indicators
+from instrumentation import metrics
+
+_END = object()
+
+# Pools reutilizados entre escaneos (arrancar procesos cuesta más que un bloque)
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+class PipelineCancelled(Exception):
+    """El consumidor dejó de leer resultados: se interrumpe la descarga"""
+
+
+class SharedArray:
+    """Array float64 sobre un bloque de memoria compartida (nuevo o adjuntado por nombre)"""
+
+    def __init__(self, shape, name=None):
+        self.shape = tuple(shape)
+        size = max(int(np.prod(self.shape)) * 8, 8)
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+        self.array = np.ndarray(self.shape, dtype='float64', buffer=self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        self.array = None
+        self.shm.close()
+
+    def unlink(self):
+        self.close()
+        self.shm.unlink()
+
+
+def compute_shared(input_name, output_name, dates, n_symbols):
+    """Tarea del pool: indicadores de un bloque OHLCV en memoria compartida, escritos en otro bloque
+
+    Devuelve los segundos de cálculo (para la instrumentación del proceso principal).
+    """
+    started = time.perf_counter()
+    source = SharedArray((len(OHLCV_COLUMNS), len(dates), n_symbols), input_name)
+    target = SharedArray((len(INDICATOR_COLUMNS), len(dates), n_symbols), output_name)
+    try:
+        columns = {c: source.array[i] for i, c in enumerate(OHLCV_COLUMNS)}
+        panel = compute_indicators(Panel(dates, range(n_symbols), columns))
+        for i, column in enumerate(INDICATOR_COLUMNS):
+            target.array[i] = panel[column]
+    finally:
+        source.close()
+        target.close()
+    return time.perf_counter() - started
+
+
+def process_pool(workers):
+    """Pool de ``workers`` procesos creados con ``forkserver`` (escaneo, backtest, barrido)
+
+    El proceso que lo pide tiene hilos (descarga, Streamlit, servicio de
+    snapshots), conexiones SQLite y ficheros mapeados: hacer ``fork`` de un
+    proceso con hilos puede bloquear a los hijos. Los procesos nacen de un
+    servidor limpio (uno por programa) que ya tiene importados NumPy e ``indicators``.
+    """
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['indicators'])
+    return ProcessPoolExecutor(workers, mp_context=context)
+
+
+def _executor(workers):
+    """Pool de procesos compartido para ``workers`` procesos"""
+    with _executors_lock:
+        executor = _executors.get(workers)
+        if executor is None:
+            executor = _executors[workers] = process_pool(workers)
+        return executor
+
+
+def _discard_executor(workers):
+    with _executors_lock:
+        executor = _executors.pop(workers, None)
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ScanPipeline:
+    """Descarga y análisis solapados de un universo de símbolos, por bloques"""
+
+    def __init__(self, analyzer, workers=None, chunk_size=32, queue_size=64,
+                 max_pending=None, flush_after=0.05, max_wait=0.25, reuse=None):
+        self.analyzer = analyzer
+        # ``reuse(símbolo, datos)``: resultado anterior todavía válido para esos datos, o None
+        self.reuse = reuse
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
+        self.max_pending = max_pending or 2 * self.workers
+        # Un bloque incompleto se calcula si la descarga lleva ``flush_after`` s sin
+        # entregar nada o si su primer símbolo lleva ``max_wait`` s esperando
+        self.flush_after = flush_after
+        self.max_wait = max_wait
+
+    def run(self, symbols, period='6mo'):
+        """Genera diccionarios símbolo -> resultado a medida que se completan los bloques"""
+        frames = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        errors = []
+
+        def put(symbol, data):
+            # Bloquea la descarga mientras la cola esté llena (contrapresión)
+            while not stop.is_set():
+                try:
+                    frames.put((symbol, data), timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+            raise PipelineCancelled()
+
+        def produce():
+            try:
+                self.analyzer.get_data_bulk(symbols, period=period, on_frame=put, notify=forward)
+            except PipelineCancelled:
+                pass
+            except Exception as e:
+                errors.append(e)
+            finally:
+                frames.put(_END)
+
+        # Los avisos de la descarga se emiten desde este hilo (la interfaz solo
+        # puede pintar desde el hilo que ejecuta el script); se pasan a la descarga
+        # en lugar de sustituir ``analyzer.notify``, que puede compartirse entre escaneos
+        messages = queue.SimpleQueue()
+        notify = self.analyzer.notify
+
+        def forward(level, message):
+            messages.put((level, message))
+
+        def flush_messages():
+            while not messages.empty():
+                notify(*messages.get())
+
+        producer = threading.Thread(target=produce, name='scan-io', daemon=True)
+        producer.start()
+
+        executor = _executor(self.workers) if self.workers > 1 else None
+        pending = {}
+        chunk = {}
+        chunk_started = None
+        finished = False
+        try:
+            while not finished:
+                try:
+                    item = frames.get(timeout=self.flush_after)
+                except queue.Empty:
+                    item = None
+
+                flush_messages()
+                ready = {}
+                if item is _END:
+                    finished = True
+                elif item is not None:
+                    symbol, data = item
+                    if data is not None and len(data) >= 2:
+                        cached = self.reuse(symbol, data) if self.reuse is not None else None
+                        if cached is None:
+                            cached = self.analyzer.cached_analysis(symbol, period, data)
+                        if cached is None:
+                            chunk[symbol] = data
+                            chunk_started = chunk_started or time.monotonic()
+                        else:
+                            ready[symbol] = cached
+
+                # Bloque completo, final de la descarga, descarga parada o bloque esperando: a calcular
+                if chunk and (len(chunk) >= self.chunk_size or item is None or finished
+                              or time.monotonic() - chunk_started >= self.max_wait):
+                    if executor is None:
+                        ready.update(self._analyze(chunk, period))
+                    else:
+                        if len(pending) >= self.max_pending:
+                            ready.update(self._collect(pending, period, block=True))
+                        try:
+                            future, blocks = self._submit(executor, chunk)
+                            pending[future] = (chunk, blocks)
+                        except (BrokenProcessPool, RuntimeError):
+                            # Un proceso del pool murió (o el pool se cerró): el resto del escaneo se calcula aquí
+                            _discard_executor(self.workers)
+                            executor = None
+                            ready.update(self._analyze(chunk, period))
+                    chunk = {}
+                    chunk_started = None
+
+                if pending:
+                    ready.update(self._collect(pending, period, block=finished))
+                if ready:
+                    yield ready
+
+            while pending:
+                yield self._collect(pending, period, block=True)
+        finally:
+            stop.set()
+            for future in list(pending):
+                future.cancel()
+                self._finish(future, *pending.pop(future)[1])
+            # Se vacía la cola para que la descarga no quede bloqueada y termine
+            while producer.is_alive():
+                try:
+                    frames.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            flush_messages()
+
+        if errors:
+            raise errors[0]
+
+    def _submit(self, executor, chunk):
+        """Copia el bloque a memoria compartida y lo envía al pool
+
+        Si el envío falla (pool roto o cerrado) los bloques se liberan antes de
+        propagar el error: nadie más los conoce y quedarían en ``/dev/shm``.
+        """
+        panel = Panel.from_frames(chunk)
+        n_dates, n_symbols = panel.shape
+        blocks = []
+        try:
+            source = SharedArray((len(OHLCV_COLUMNS), n_dates, n_symbols))
+            blocks.append(source)
+            target = SharedArray((len(INDICATOR_COLUMNS), n_dates, n_symbols))
+            blocks.append(target)
+            for i, column in enumerate(OHLCV_COLUMNS):
+                source.array[i] = panel[column]
+            future = executor.submit(compute_shared, source.name, target.name, panel.dates, n_symbols)
+        except BaseException:
+            for block in blocks:
+                block.unlink()
+            raise
+        return future, (panel, source, target)
+
+    def _finish(self, future, panel, source, target):
+        """Libera la memoria compartida del bloque y devuelve su panel con indicadores (o None)"""
+        try:
+            if future.cancelled() or future.exception() is not None:
+                return None
+            panel.columns.update({c: target.array[i].copy() for i, c in enumerate(INDICATOR_COLUMNS)})
+            return panel
+        finally:
+            source.unlink()
+            target.unlink()
+
+    def _collect(self, pending, period, block=False):
+        """Resultados de los bloques ya terminados (o espera al primero si ``block``)"""
+        done, _ = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        ready = {}
+        for future in done:
+            chunk, blocks = pending.pop(future)
+            panel = self._finish(future, *blocks)
+            if panel is None:
+                # Fallo en el proceso: se recalcula el bloque en este proceso
+                ready.update(self._analyze(chunk, period))
+            else:
+                metrics.observe('indicators', future.result())
+                with metrics.stage('scoring'):
+                    results = self.analyzer.analyze_panel(panel)
+                ready.update(self.analyzer.store_analysis(period, chunk, results))
+        return ready
+
+    def _analyze(self, chunk, period):
+        results = self.analyzer.analyze_frames(chunk)
+        return self.analyzer.store_analysis(period, chunk, results)
@@ -0,0 +1,237 @@
+"""Caché persistente de precios OHLCV con descarga incremental.
+
+Las barras se guardan en un fichero SQLite indexado por (símbolo, intervalo).
+Tras la primera descarga completa solo se piden las barras posteriores a la
+última guardada, más una pequeña ventana de solapamiento que sirve para
+detectar splits y ajustes retroactivos: si los precios solapados no coinciden,
+la serie se descarta y se vuelve a descargar completa.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'UPTREND_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.uptrend_cache')
+)
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Días naturales cubiertos por cada periodo de yfinance (60d y 730d: máximos de 15m y 1h)
+PERIOD_DAYS = {
+    '1d': 1, '5d': 5, '1mo': 31, '60d': 60, '3mo': 92, '6mo': 183,
+    '1y': 366, '730d': 730, '2y': 731, '5y': 1827, '10y': 3653
+}
+
+INTRADAY_INTERVALS = {'1m', '2m', '5m', '15m', '30m', '60m', '90m', '1h', '4h'}
+
+
+def period_start(period):
+    """Fecha (naive, UTC) desde la que un periodo de yfinance cubre datos; None si no se conoce"""
+    days = PERIOD_DAYS.get(period)
+    if days is None:
+        return None
+    return pd.Timestamp.now(tz='UTC').tz_localize(None).normalize() - pd.Timedelta(days=days)
+
+
+class PriceCache:
+    def __init__(self, path=None, overlap_bars=5, tolerance=1e-4):
+        if path is None:
+            path = os.path.join(DEFAULT_CACHE_DIR, 'prices.sqlite')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.overlap_bars = overlap_bars
+        self.tolerance = tolerance
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+        with self._write_lock:
+            conn = self._connection()
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS bars (
+                    symbol TEXT NOT NULL,
+                    interval TEXT NOT NULL,
+                    ts INTEGER NOT NULL,
+                    open REAL, high REAL, low REAL, close REAL, volume REAL,
+                    PRIMARY KEY (symbol, interval, ts)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS series (
+                    symbol TEXT NOT NULL,
+                    interval TEXT NOT NULL,
+                    tz TEXT,
+                    covered_from INTEGER,
+                    updated_at REAL,
+                    PRIMARY KEY (symbol, interval)
+                )
+            """)
+            conn.commit()
+
+    def _connection(self):
+        """Conexión SQLite propia de cada hilo"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def _normalize(self, data, interval):
+        """Convierte el índice a enteros (ns) y devuelve también la zona horaria original"""
+        index = pd.DatetimeIndex(data.index)
+        tz = None
+        if interval in INTRADAY_INTERVALS:
+            if index.tz is None:
+                index = index.tz_localize('UTC')
+            tz = str(index.tz)
+            index = index.tz_convert('UTC').tz_localize(None)
+        else:
+            # Barras diarias o mayores: se guarda la fecha local del mercado
+            if index.tz is not None:
+                index = index.tz_localize(None)
+            index = index.normalize()
+        return index.as_unit('ns').asi8, tz
+
+    def fetch_start(self, symbol, period='6mo', interval='1d'):
+        """Inicio de la descarga incremental, o None si hace falta una descarga completa"""
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT covered_from FROM series WHERE symbol = ? AND interval = ?",
+            (symbol, interval)
+        ).fetchone()
+        if row is None:
+            return None
+
+        start = period_start(period)
+        if start is None or row[0] is None or row[0] > start.value:
+            return None
+
+        rows = conn.execute(
+            "SELECT ts FROM bars WHERE symbol = ? AND interval = ? ORDER BY ts DESC LIMIT ?",
+            (symbol, interval, self.overlap_bars)
+        ).fetchall()
+        if not rows:
+            return None
+        start = pd.Timestamp(rows[-1][0])
+        return start.tz_localize('UTC') if interval in INTRADAY_INTERVALS else start
+
+    def load(self, symbol, interval='1d', start=None):
+        """Lee la serie guardada (opcionalmente desde una fecha) como DataFrame OHLCV"""
+        conn = self._connection()
+        meta = conn.execute(
+            "SELECT tz FROM series WHERE symbol = ? AND interval = ?",
+            (symbol, interval)
+        ).fetchone()
+        if meta is None:
+            return None
+
+        start_ns = pd.Timestamp(start).value if start is not None else np.iinfo(np.int64).min
+        rows = conn.execute(
+            "SELECT ts, open, high, low, close, volume FROM bars "
+            "WHERE symbol = ? AND interval = ? AND ts >= ? ORDER BY ts",
+            (symbol, interval, start_ns)
+        ).fetchall()
+        if not rows:
+            return None
+
+        values = np.array(rows, dtype='float64')
+        index = pd.DatetimeIndex(np.array([r[0] for r in rows], dtype='datetime64[ns]'))
+        if meta[0]:
+            index = index.tz_localize('UTC').tz_convert(meta[0])
+
+        data = pd.DataFrame(values[:, 1:], index=index, columns=OHLCV_COLUMNS)
+        if not data['Volume'].isna().any():
+            data['Volume'] = data['Volume'].astype('int64')
+        return data
+
+    def merge(self, symbol, data, interval='1d'):
+        """Incorpora barras nuevas; devuelve False si el solapamiento revela un ajuste de precios"""
+        if data is None or data.empty:
+            return False
+
+        ts, tz = self._normalize(data, interval)
+        conn = self._connection()
+        cached = dict(conn.execute(
+            "SELECT ts, close FROM bars WHERE symbol = ? AND interval = ? AND ts >= ? ORDER BY ts",
+            (symbol, interval, int(ts.min()))
+        ).fetchall())
+        if not cached:
+            return False
+
+        # La última barra guardada puede estar incompleta (sesión en curso): no se valida
+        comparable = set(cached) - {max(cached)}
+        closes = data['Close'].to_numpy(dtype='float64')
+        overlap = [i for i, t in enumerate(ts) if int(t) in comparable]
+        if not overlap:
+            return False
+
+        old = np.array([cached[int(ts[i])] for i in overlap])
+        new = closes[overlap]
+        if not np.allclose(new, old, rtol=self.tolerance, atol=0):
+            return False
+
+        self._write(symbol, interval, ts, tz, data)
+        return True
+
+    def replace(self, symbol, data, interval='1d', period=None):
+        """Sustituye toda la serie guardada por una descarga completa"""
+        if data is None or data.empty:
+            return
+
+        ts, tz = self._normalize(data, interval)
+        start = period_start(period) if period else None
+        covered_from = start.value if start is not None else int(ts.min())
+
+        self._write(symbol, interval, ts, tz, data, covered_from=covered_from, replace=True)
+
+    def _write(self, symbol, interval, ts, tz, data, covered_from=None, replace=False):
+        frame = data.reindex(columns=OHLCV_COLUMNS)
+        values = frame.to_numpy(dtype='float64')
+        rows = [
+            (symbol, interval, int(t), *[None if np.isnan(v) else float(v) for v in row])
+            for t, row in zip(ts, values)
+        ]
+
+        with self._write_lock:
+            conn = self._connection()
+            # Borrado (si se sustituye), barras y metadatos en una sola transacción:
+            # ningún lector ve la serie vacía o a medias, y un fallo deshace todo
+            with conn:
+                if replace:
+                    conn.execute("DELETE FROM bars WHERE symbol = ? AND interval = ?", (symbol, interval))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                if covered_from is None:
+                    conn.execute(
+                        "UPDATE series SET tz = ?, updated_at = ? WHERE symbol = ? AND interval = ?",
+                        (tz, time.time(), symbol, interval)
+                    )
+                else:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?, ?)",
+                        (symbol, interval, tz, covered_from, time.time())
+                    )
+
+    def clear(self, symbol=None, interval=None):
+        """Elimina de la caché un símbolo (o todo si no se indica)"""
+        where, params = [], []
+        if symbol is not None:
+            where.append("symbol = ?")
+            params.append(symbol)
+        if interval is not None:
+            where.append("interval = ?")
+            params.append(interval)
+        clause = (" WHERE " + " AND ".join(where)) if where else ""
+
+        with self._write_lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM bars" + clause, params)
+            conn.execute("DELETE FROM series" + clause, params)
+            conn.commit()
@@ -0,0 +1,110 @@
+"""El escáner en cualquier fecha pasada, a partir de un panel de puntuaciones precalculado.
+
+Indicadores y puntuación son causales (cada barra depende solo de las
+anteriores), así que un único cálculo vectorizado del histórico contiene lo que
+``detect_uptrend_signal`` habría devuelto en cada fecha con los datos
+disponibles hasta ese día (desde el inicio del periodo descargado).
+``ReplayPanel`` guarda ese panel junto con la última barra de cada símbolo
+hasta cada fecha: consultar una fecha es indexar arrays, sin descargar ni
+recalcular nada.
+
+``at(fecha)`` coincide exactamente con un escaneo en vivo de los mismos datos
+cortados en esa fecha. No coincide exactamente con el escaneo en vivo que se
+habría hecho ese día: ese descarga solo los últimos ``6mo``, mientras que aquí
+los indicadores arrancan al inicio del periodo del replay. Las medias simples,
+Bollinger y la media de volumen son iguales (solo miran las últimas barras),
+pero los indicadores recursivos (EMA y MACD, RSI, ADX) parten de otra barra y
+difieren ligeramente hasta que el efecto del arranque se diluye, así que una
+puntuación en el límite de una señal puede cambiar.
+
+La amplitud del mercado (fracción de cada categoría en uptrend en cada fecha,
+contando solo los símbolos que ya cotizaban) se calcula al construir el panel,
+como una serie por categoría.
+"""
+import numpy as np
+import pandas as pd
+
+from scan_result import FEATURE_COLUMNS, ScanResult
+from scoring import score_panel, signal_mask
+
+# Nombre de la serie de amplitud de todo el universo (símbolos únicos)
+BREADTH_TOTAL = 'Universo'
+
+
+class ReplayPanel:
+    def __init__(self, panel, category_symbols):
+        """``panel`` con indicadores (``compute_indicators``); ``category_symbols``: categoría -> símbolos"""
+        scores = score_panel(panel)
+        close = panel['Close']
+        valid = ~np.isnan(close)
+        self.dates = panel.dates
+        self.symbols = list(panel.symbols)
+        self.position = {symbol: j for j, symbol in enumerate(self.symbols)}
+        self.category_symbols = {name: list(symbols) for name, symbols in category_symbols.items()}
+
+        # Última barra de cada símbolo hasta cada fecha y la anterior a ella (-1 si no hay)
+        rows = np.arange(len(close))[:, None]
+        self.last_row = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+        before = np.vstack([np.full((1, len(self.symbols)), -1), self.last_row[:-1]])
+        self.previous_row = np.take_along_axis(before, np.maximum(self.last_row, 0), axis=0)
+        self.previous_row[self.last_row < 0] = -1
+
+        self.close = close
+        self.score = scores['score']
+        self.signal_mask = signal_mask(scores['signals'])
+        self.uptrend_age = scores['uptrend_age']
+        self.features = {
+            name: scores['bars'] if name == 'bars' else panel[name] for name in FEATURE_COLUMNS
+        }
+        # Con historia de sobra el ADX empieza con los ceros de ``ta``; un escaneo en vivo
+        # con menos de 2 × 14 barras no tiene ADX (NaN), como el símbolo en esas fechas
+        self.features['ADX'] = np.where(scores['bars'] >= 2 * 14, panel['ADX'], np.nan)
+
+        # Estado visible en cada fecha: el de la última barra de cada símbolo
+        listed = self.last_row >= 0
+        uptrend = np.take_along_axis(scores['is_uptrend'], np.maximum(self.last_row, 0), axis=0) & listed
+        self.breadth = self._breadth(uptrend, listed)
+
+    def _breadth(self, uptrend, listed):
+        names = list(self.category_symbols) + [BREADTH_TOTAL]
+        membership = np.zeros((len(self.symbols), len(names)))
+        for k, name in enumerate(self.category_symbols):
+            members = [self.position[s] for s in dict.fromkeys(self.category_symbols[name]) if s in self.position]
+            membership[members, k] = 1
+        membership[:, -1] = 1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            share = (uptrend @ membership) / (listed @ membership)
+        return pd.DataFrame(share, index=self.dates, columns=names)
+
+    def date_index(self, date):
+        """Fila de la última fecha del panel no posterior a ``date`` (-1 si es anterior a todas)"""
+        return int(self.dates.searchsorted(pd.Timestamp(date), side='right')) - 1
+
+    def at(self, date, category_symbols=None):
+        """Resultados (``ScanResult`` con categoría, como ``UptrendAnalyzer.scan``) en la fecha ``date``"""
+        t = self.date_index(date)
+        if t < 0:
+            return []
+
+        # Símbolos con al menos dos barras hasta la fecha (como ``analyze_panel``)
+        columns = np.flatnonzero(self.previous_row[t] >= 0)
+        rows, previous = self.last_row[t, columns], self.previous_row[t, columns]
+        price = self.close[rows, columns]
+        change = (price - self.close[previous, columns]) / self.close[previous, columns] * 100
+        score = self.score[rows, columns]
+        masks = self.signal_mask[rows, columns]
+        age = self.uptrend_age[rows, columns]
+        features = np.stack([self.features[name][rows, columns] for name in FEATURE_COLUMNS], axis=1)
+
+        by_symbol = {
+            self.symbols[j]: ScanResult(
+                self.symbols[j], price[i], change[i], score[i], masks[i], age[i], features=features[i]
+            )
+            for i, j in enumerate(columns)
+        }
+        return [
+            by_symbol[symbol].in_category(name)
+            for name, symbols in (category_symbols or self.category_symbols).items()
+            for symbol in symbols
+            if symbol in by_symbol
+        ]
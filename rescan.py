@@ -0,0 +1,285 @@
+"""Reescaneo incremental con detección de cambios y eventos de transición de señal.
+
+``Rescanner`` guarda, por periodo, la huella de la serie de cada símbolo
+(instante de la última barra, número de barras y hash de todas sus fechas y
+valores OHLCV) junto con su resultado. En el siguiente escaneo la descarga
+sigue siendo incremental (``PriceCache``), pero solo se recalculan los símbolos
+cuya serie ha cambiado (barra nueva, sesión en curso actualizada o precios
+revisados en cualquier barra, p. ej. por un ajuste); el resto reutiliza su
+resultado anterior. Con el mercado cerrado un reescaneo no calcula ningún
+indicador.
+
+Con ``live=True`` se usa el estado incremental de indicadores
+(``UptrendAnalyzer.analyze_live``): ni siquiera se leen las series, solo se
+descargan las barras nuevas y se pasan a cada estado en O(1) por barra. La
+huella es entonces la del estado completo (que resume toda la historia), que
+nunca coincide con la de la serie: cada modo guarda su estado en su propio
+fichero, así que alternar entre ellos no invalida la referencia del otro.
+
+Al comparar cada resultado nuevo con el anterior se generan eventos: entrada en
+uptrend, salida de uptrend y cruce del score por los niveles configurados
+(``levels``). Los símbolos sin estado anterior solo fijan la referencia. Los
+eventos se añaden a un registro local JSONL (solo se añade, nunca se reescribe)
+y, si hay ``webhook``, se envían en un POST JSON.
+
+El estado guarda los resultados con la puntuación integrada; con reglas propias
+(``rules.RuleSet``) se vuelven a puntuar ambos lados antes de comparar, así que
+cambiar las reglas entre escaneos no genera eventos falsos.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from indicators import OHLCV_COLUMNS
+from instrumentation import metrics
+from price_cache import DEFAULT_CACHE_DIR
+from scan_result import ScanResult
+from snapshot_service import RECORD_FIELDS, result_record
+
+EVENTS_PATH = os.environ.get('UPTREND_EVENTS', os.path.join(DEFAULT_CACHE_DIR, 'events.jsonl'))
+WEBHOOK_URL = os.environ.get('UPTREND_WEBHOOK_URL')
+
+# Niveles de score cuyo cruce (en cualquier sentido) genera un evento
+SCORE_LEVELS = (40, 80)
+
+logger = logging.getLogger('uptrend')
+
+
+def series_fingerprint(data):
+    """Huella de una serie: [instante de la última barra (ns, UTC), barras, crc32 de fechas y OHLCV]"""
+    stamps = pd.DatetimeIndex(data.index).as_unit('ns').asi8
+    values = np.ascontiguousarray(data.reindex(columns=OHLCV_COLUMNS).to_numpy(dtype='float64'))
+    checksum = zlib.crc32(values.tobytes(), zlib.crc32(stamps.tobytes()))
+    return [int(pd.Timestamp(data.index[-1]).value), len(data), checksum]
+
+
+def state_fingerprint(state):
+    """Huella de un estado incremental (``IndicatorState``), con el mismo formato que ``series_fingerprint``
+
+    El estado (medias, ventanas, última barra) depende de toda la historia que
+    ha recibido, así que su hash cambia si cambia cualquier barra.
+    """
+    payload = json.dumps(state.to_dict(), sort_keys=True).encode()
+    bars = state.state['bars'] + (state.open_bar is not None)
+    return [int(pd.Timestamp(state.last_ts).value), bars, zlib.crc32(payload)]
+
+
+def transitions(previous, current, levels=SCORE_LEVELS):
+    """Eventos (tipo, nivel) entre dos resultados del mismo símbolo"""
+    events = []
+    if current.is_uptrend and not previous.is_uptrend:
+        events.append(('uptrend_started', None))
+    elif previous.is_uptrend and not current.is_uptrend:
+        events.append(('uptrend_ended', None))
+    for level in levels:
+        if previous.score < level <= current.score:
+            events.append(('score_crossed_up', level))
+        elif current.score < level <= previous.score:
+            events.append(('score_crossed_down', level))
+    return events
+
+
+class RescanState:
+    """Huella y resultado de cada símbolo en el último escaneo de un periodo (JSON en disco)"""
+
+    def __init__(self, path, entries=None):
+        self.path = path
+        # símbolo -> (huella, resultado)
+        self.entries = dict(entries or {})
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path) as f:
+                payload = json.load(f)
+            fields = payload['fields']
+            entries = {
+                symbol: (fingerprint, ScanResult(**dict(zip(fields, record))))
+                for symbol, (fingerprint, record) in payload['symbols'].items()
+            }
+        except FileNotFoundError:
+            entries = {}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Estado de reescaneo ilegible (%s): se analiza todo de nuevo", e)
+            entries = {}
+        return cls(path, entries)
+
+    def save(self):
+        """Escribe el estado de forma atómica (fichero temporal y ``os.replace``)"""
+        payload = {
+            'updated_at': time.time(),
+            'fields': RECORD_FIELDS,
+            'symbols': {
+                symbol: [fingerprint, result_record(result)]
+                for symbol, (fingerprint, result) in self.entries.items()
+            },
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temporary = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(payload, f)
+        os.replace(temporary, self.path)
+
+
+class EventLog:
+    """Registro local de eventos, una línea JSON por evento, solo por adición"""
+
+    def __init__(self, path=None):
+        self.path = path or EVENTS_PATH
+
+    def append(self, events):
+        if not events:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        text = ''.join(json.dumps(event, ensure_ascii=False) + '\n' for event in events)
+        # Una sola escritura en modo 'a': los eventos de un escaneo no se intercalan con los de otro proceso
+        with open(self.path, 'a') as f:
+            f.write(text)
+
+    def read(self, limit=None):
+        """Últimos ``limit`` eventos (todos si no se indica)"""
+        try:
+            with open(self.path) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        return [json.loads(line) for line in lines[-limit if limit else 0:] if line.strip()]
+
+
+def post_webhook(url, payload, timeout=10.0):
+    """Envía ``payload`` como JSON por POST; devuelve False (y avisa en el log) si falla"""
+    import requests
+    try:
+        response = requests.post(url, json=payload, timeout=timeout)
+        response.raise_for_status()
+        return True
+    except requests.RequestException as e:
+        logger.warning("No se pudo enviar los eventos al webhook %s: %s", url, e)
+        return False
+
+
+class Rescanner:
+    def __init__(self, analyzer, state_dir=None, events=None, webhook=None, levels=SCORE_LEVELS,
+                 rules=None, workers=None, live=False):
+        self.analyzer = analyzer
+        self.state_dir = state_dir or DEFAULT_CACHE_DIR
+        self.events = events if isinstance(events, EventLog) else EventLog(events)
+        self.webhook = webhook if webhook is not None else WEBHOOK_URL
+        self.levels = tuple(sorted(levels))
+        # Reglas de puntuación (``RuleSet``); None o las integradas: el resultado tal cual
+        self.rules = None if rules is None or rules.is_builtin() else rules
+        self.workers = workers
+        # En vivo: estado incremental de indicadores (``analyze_live``) en lugar del análisis completo
+        self.live = live
+
+    def state_path(self, period):
+        """Fichero de estado del periodo (uno por modo: las huellas de cada modo no son comparables)"""
+        suffix = '_live' if self.live else ''
+        return os.path.join(self.state_dir, f'rescan_state_{period}{suffix}.json')
+
+    def run(self, category_symbols, period='6mo'):
+        """Reescanea las categorías; devuelve resultados (con categoría), eventos y recuento
+
+        ``category_symbols`` es un diccionario categoría -> símbolos, como en
+        ``UptrendAnalyzer.scan``.
+        """
+        started = time.perf_counter()
+        state = RescanState.load(self.state_path(period))
+        categories_of = {}
+        for category, symbols in category_symbols.items():
+            for symbol in symbols:
+                categories_of.setdefault(symbol, []).append(category)
+
+        fingerprints = {}
+        reused = set()
+
+        def reuse(symbol, data):
+            if self.live:
+                fingerprint = state_fingerprint(self.analyzer.indicator_states[symbol])
+            else:
+                fingerprint = series_fingerprint(data)
+            fingerprints[symbol] = fingerprint
+            entry = state.entries.get(symbol)
+            if entry is not None and entry[0] == fingerprint:
+                reused.add(symbol)
+                return entry[1]
+            return None
+
+        current = {}
+        with metrics.stage('rescan'):
+            if self.live:
+                current = self.analyzer.analyze_live(list(categories_of), period=period)
+                for symbol in current:
+                    reuse(symbol, None)
+            else:
+                for batch in self.analyzer.analyze_symbols_iter(
+                    list(categories_of), period=period, workers=self.workers, reuse=reuse
+                ):
+                    current.update(batch)
+        metrics.count('rescan.reused', len(reused))
+        metrics.count('rescan.analyzed', len(current) - len(reused))
+
+        # Los símbolos sin datos conservan su estado anterior
+        changed = [symbol for symbol in current if symbol not in reused and symbol in fingerprints]
+        previous = {symbol: state.entries[symbol][1] for symbol in changed if symbol in state.entries}
+        for symbol in changed:
+            state.entries[symbol] = (fingerprints[symbol], current[symbol])
+
+        scored = self._rescore(current)
+        events = self._events(self._rescore(previous), scored, fingerprints, categories_of, period)
+        state.save()
+        self.events.append(events)
+        if events and self.webhook:
+            post_webhook(self.webhook, {
+                'generated_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'period': period,
+                'events': events,
+            })
+
+        results = [
+            scored[symbol].in_category(category)
+            for category, symbols in category_symbols.items()
+            for symbol in symbols
+            if symbol in scored
+        ]
+        return {
+            'results': results,
+            'events': events,
+            'analyzed': len(changed),
+            'reused': len(reused),
+            'elapsed': time.perf_counter() - started,
+        }
+
+    def _rescore(self, results):
+        if self.rules is None or not results:
+            return dict(results)
+        return dict(zip(results, self.rules.rescore(results.values())))
+
+    def _events(self, previous, current, fingerprints, categories_of, period):
+        now = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        events = []
+        for symbol, before in previous.items():
+            after = current[symbol]
+            bar = pd.Timestamp(fingerprints[symbol][0], tz='UTC').isoformat()
+            for kind, level in transitions(before, after, self.levels):
+                events.append({
+                    'time': now,
+                    'symbol': symbol,
+                    'categories': categories_of.get(symbol, []),
+                    'event': kind,
+                    'level': level,
+                    'score': after.score,
+                    'previous_score': before.score,
+                    'price': after.price,
+                    'change_pct': after.change_pct,
+                    'period': period,
+                    'bar': bar,
+                })
+        return events
@@ -0,0 +1,67 @@
+"""Caché en memoria con caducidad (TTL) y expulsión LRU.
+
+Se comparte entre reruns (y sesiones) de Streamlit para que cambiar un filtro
+o el orden de la tabla no vuelva a descargar ni a analizar cada símbolo. Por
+eso la vigencia es un ajuste del servidor (``UPTREND_CACHE_TTL``, en segundos)
+y no de cada sesión.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+DEFAULT_TTL = float(os.environ.get('UPTREND_CACHE_TTL', 300))
+
+
+class TTLCache:
+    def __init__(self, maxsize=4096, ttl=DEFAULT_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=MISSING):
+        """Valor vigente de ``key`` (y lo marca como usado recientemente) o ``default``"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and time.monotonic() - item[0] <= self.ttl:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = (time.monotonic(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Vacía la caché (p. ej. al pulsar 'Actualizar Análisis')"""
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': len(self._items),
+            'maxsize': self.maxsize,
+            'evictions': self.evictions,
+            'ttl': self.ttl,
+        }
@@ -0,0 +1,267 @@
+"""Reglas de puntuación declarativas, compiladas a operaciones vectorizadas.
+
+Un conjunto de reglas define, para cada señal, los puntos que suma y una o
+varias condiciones ``expresión operador umbral`` sobre las columnas de
+indicadores (todas deben cumplirse), además del umbral de la señal Uptrend y de
+las barras mínimas. Se lee de un JSON (``rules.json`` junto al código, o
+``UPTREND_RULES``); sin fichero se usan las reglas integradas, que reproducen
+exactamente la puntuación de ``scoring``.
+
+Cada expresión (aritmética sobre nombres de columna y números, validada con
+``ast``) se compila una sola vez a una función sobre arrays. Como cada resultado
+guarda los valores de su última barra (``ScanResult.features``), cambiar pesos
+o umbrales vuelve a puntuar miles de símbolos en milisegundos, sin descargar ni
+recalcular ningún indicador.
+
+La puntuación va siempre de 0 a 100: si los pesos suman más, se escala. Cada
+conjunto de reglas numera sus señales en su propio orden (bit i de la máscara:
+regla i) y los resultados re-puntuados llevan esos nombres consigo.
+"""
+import ast
+import json
+import operator
+import os
+
+import numpy as np
+
+from scan_result import FEATURE_COLUMNS, ScanResult
+from scoring import MIN_BARS, SIGNAL_NAMES, UPTREND_THRESHOLD
+
+RULES_PATH = os.environ.get(
+    'UPTREND_RULES',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules.json')
+)
+
+OPERATORS = {'>': np.greater, '>=': np.greater_equal, '<': np.less, '<=': np.less_equal}
+
+# Señales como máximo en un conjunto de reglas (bits de la máscara de un entero de 64 bits)
+MAX_SIGNALS = 63
+
+_ARITHMETIC = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+
+# Las siete condiciones de ``scoring.signal_arrays`` con sus pesos
+BUILTIN_RULES = {
+    'threshold': UPTREND_THRESHOLD,
+    'min_bars': MIN_BARS,
+    'rules': [
+        {'name': 'price_above_ma', 'label': 'Precio sobre medias', 'weight': 25, 'conditions': [
+            {'expression': 'Close - SMA_20', 'op': '>', 'threshold': 0},
+            {'expression': 'SMA_20 - SMA_50', 'op': '>', 'threshold': 0},
+        ]},
+        {'name': 'ma_bullish_order', 'label': 'Medias alcistas', 'weight': 20, 'conditions': [
+            {'expression': 'SMA_20 - SMA_50', 'op': '>', 'threshold': 0},
+        ]},
+        {'name': 'macd_bullish', 'label': 'MACD alcista', 'weight': 15, 'conditions': [
+            {'expression': 'MACD - MACD_Signal', 'op': '>', 'threshold': 0},
+            {'expression': 'MACD', 'op': '>', 'threshold': 0},
+        ]},
+        {'name': 'rsi_favorable', 'label': 'RSI favorable', 'weight': 10, 'conditions': [
+            {'expression': 'RSI', 'op': '>', 'threshold': 30},
+            {'expression': 'RSI', 'op': '<', 'threshold': 70},
+        ]},
+        {'name': 'bb_breakout', 'label': 'Ruptura de Bollinger', 'weight': 15, 'conditions': [
+            {'expression': 'Close - BB_High', 'op': '>', 'threshold': 0},
+        ]},
+        {'name': 'strong_trend', 'label': 'Tendencia fuerte (ADX)', 'weight': 10, 'conditions': [
+            {'expression': 'ADX', 'op': '>', 'threshold': 25},
+        ]},
+        {'name': 'volume_confirmation', 'label': 'Confirmación de volumen', 'weight': 5, 'conditions': [
+            {'expression': 'Volume - Volume_SMA', 'op': '>', 'threshold': 0},
+        ]},
+    ],
+}
+
+
+def compile_expression(text):
+    """Función sobre columnas para una expresión como ``Close - SMA_20`` o ``Volume / Volume_SMA``"""
+    try:
+        tree = ast.parse(text, mode='eval').body
+    except SyntaxError as e:
+        raise ValueError(f"Expresión no válida: {text!r}") from e
+
+    def build(node):
+        if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+            left, right, op = build(node.left), build(node.right), _ARITHMETIC[type(node.op)]
+            return lambda columns: op(left(columns), right(columns))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            operand = build(node.operand)
+            return lambda columns: -operand(columns)
+        if isinstance(node, ast.Name):
+            if node.id not in FEATURE_COLUMNS:
+                raise ValueError(f"Columna desconocida en {text!r}: {node.id}")
+            name = node.id
+            return lambda columns: columns[name]
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            value = float(node.value)
+            return lambda columns: value
+        raise ValueError(f"Elemento no permitido en {text!r}: {ast.unparse(node)}")
+
+    return build(tree)
+
+
+class Condition:
+    __slots__ = ('expression', 'op', 'threshold', '_compiled')
+
+    def __init__(self, expression, op, threshold):
+        if op not in OPERATORS:
+            raise ValueError(f"Operador no soportado: {op!r} (usa {', '.join(OPERATORS)})")
+        self.expression = expression
+        self.op = op
+        self.threshold = float(threshold)
+        self._compiled = compile_expression(expression)
+
+    def to_dict(self):
+        return {'expression': self.expression, 'op': self.op, 'threshold': self.threshold}
+
+    def __str__(self):
+        return f"{self.expression} {self.op} {self.threshold:g}"
+
+
+class Rule:
+    def __init__(self, name, weight, conditions, label=None):
+        if not conditions:
+            raise ValueError(f"La regla {name} no tiene condiciones")
+        if int(weight) < 0:
+            raise ValueError(f"La regla {name} tiene un peso negativo")
+        self.name = name
+        self.weight = int(weight)
+        self.conditions = list(conditions)
+        self.label = label or name
+
+    @classmethod
+    def from_dict(cls, data):
+        conditions = [Condition(c['expression'], c['op'], c['threshold']) for c in data['conditions']]
+        return cls(data['name'], data['weight'], conditions, data.get('label'))
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'label': self.label,
+            'weight': self.weight,
+            'conditions': [c.to_dict() for c in self.conditions],
+        }
+
+
+class RuleSet:
+    def __init__(self, rules, threshold=UPTREND_THRESHOLD, min_bars=MIN_BARS):
+        names = tuple(rule.name for rule in rules)
+        if len(set(names)) != len(names):
+            raise ValueError("Hay reglas con el mismo nombre")
+        if len(names) > MAX_SIGNALS:
+            raise ValueError(f"Demasiadas reglas para la máscara de señales (máximo {MAX_SIGNALS})")
+        self.rules = list(rules)
+        self.threshold = int(threshold)
+        self.min_bars = int(min_bars)
+        # Nombres de los bits de la máscara de señales (None: los de ``scoring``)
+        self.signal_names = None if names == tuple(SIGNAL_NAMES) else names
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            [Rule.from_dict(rule) for rule in data['rules']],
+            data.get('threshold', UPTREND_THRESHOLD),
+            data.get('min_bars', MIN_BARS),
+        )
+
+    @classmethod
+    def builtin(cls):
+        """Reglas equivalentes a la puntuación integrada"""
+        return cls.from_dict(BUILTIN_RULES)
+
+    @classmethod
+    def load(cls, path=None):
+        """Reglas del fichero ``path`` (por defecto ``RULES_PATH``); las integradas si no existe"""
+        path = path or RULES_PATH
+        if not os.path.exists(path):
+            return cls.builtin()
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def to_dict(self):
+        return {
+            'threshold': self.threshold,
+            'min_bars': self.min_bars,
+            'rules': [rule.to_dict() for rule in self.rules],
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2, ensure_ascii=False)
+
+    def copy(self):
+        return RuleSet.from_dict(self.to_dict())
+
+    def __eq__(self, other):
+        if not isinstance(other, RuleSet):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    @property
+    def total_weight(self):
+        return sum(rule.weight for rule in self.rules)
+
+    def is_builtin(self):
+        """True si puntúa igual que ``scoring`` (los resultados del escaneo ya valen tal cual)"""
+        return self == RuleSet.builtin()
+
+    def evaluate(self, columns, bars=None):
+        """Devuelve (señales, score) para arrays de columnas de cualquier forma
+
+        Cada expresión distinta se calcula una sola vez; con ``bars`` no se
+        puntúa antes de ``min_bars`` barras, como ``scoring.score_arrays``. Si
+        los pesos suman más de 100 la puntuación se escala a 0-100.
+        """
+        values = {}
+        signals = {}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for rule in self.rules:
+                active = None
+                for condition in rule.conditions:
+                    if condition.expression not in values:
+                        values[condition.expression] = np.asarray(
+                            condition._compiled(columns), dtype='float64'
+                        )
+                    hit = OPERATORS[condition.op](values[condition.expression], condition.threshold)
+                    active = hit if active is None else active & hit
+                signals[rule.name] = active
+
+        score = np.zeros(np.shape(next(iter(values.values()), 0)), dtype=np.int64)
+        for rule in self.rules:
+            score += signals[rule.name] * rule.weight
+        total = self.total_weight
+        if total > 100:
+            score = np.rint(score * (100 / total)).astype(np.int64)
+        if bars is not None:
+            enough = np.asarray(bars) >= self.min_bars
+            signals = {name: active & enough for name, active in signals.items()}
+            score = np.where(enough, score, 0)
+        return signals, score
+
+    def rescore(self, results):
+        """Resultados puntuados con estas reglas a partir de sus ``features`` (mismo orden)
+
+        Los resultados sin ``features`` se devuelven sin cambios. La racha de
+        días en uptrend necesita el histórico, así que solo se conserva si las
+        reglas son las integradas.
+        """
+        results = list(results)
+        scorable = [i for i, r in enumerate(results) if r.features is not None]
+        if not scorable:
+            return results
+
+        matrix = np.stack([results[i].features for i in scorable])
+        columns = {name: matrix[:, k] for k, name in enumerate(FEATURE_COLUMNS)}
+        signals, score = self.evaluate(columns, columns['bars'])
+        masks = np.zeros(len(scorable), dtype=np.int64)
+        for bit, rule in enumerate(self.rules):
+            masks |= signals[rule.name].astype(np.int64) << bit
+        keep_days = self.is_builtin()
+
+        rescored = list(results)
+        for i, position in enumerate(scorable):
+            r = results[position]
+            rescored[position] = ScanResult(
+                r.symbol, r.price, r.change_pct, score[i], masks[i],
+                r.uptrend_days if keep_days else None, r.category, r.features, self.threshold,
+                self.signal_names
+            )
+        return rescored
@@ -0,0 +1,86 @@
+"""Resultado compacto del análisis de un símbolo.
+
+``ScanResult`` guarda solo lo que usan la tabla, los filtros y la exportación:
+símbolo, precio, cambio, score, señales activas (como máscara de bits), días
+en uptrend y categoría. Las series de precios e indicadores no se guardan en
+los resultados; la aplicación las rematerializa desde la caché solo para el
+símbolo que grafica (``UptrendAnalyzer.chart_data``).
+
+Sí se guardan los valores de la última barra (``features``, en el orden de
+``FEATURE_COLUMNS``): con ellos ``rules.RuleSet`` vuelve a puntuar resultados
+con otros pesos o umbrales sin recalcular indicadores. Los resultados
+re-puntuados llevan los nombres de las señales de sus reglas
+(``signal_names``, bit i: ``signal_names[i]``); sin ellos la máscara sigue los
+bits de ``scoring.SIGNAL_BITS``.
+"""
+import numpy as np
+
+from indicators import INDICATOR_COLUMNS, OHLCV_COLUMNS
+from scoring import UPTREND_THRESHOLD, signal_mask, signals_from_mask
+
+# Valores de la última barra que guarda cada resultado ('bars': barras del símbolo)
+FEATURE_COLUMNS = OHLCV_COLUMNS + INDICATOR_COLUMNS + ['bars']
+
+
+class ScanResult:
+    __slots__ = ('symbol', 'price', 'change_pct', 'score', 'signal_mask', 'uptrend_days', 'category',
+                 'features', 'threshold', 'signal_names')
+
+    def __init__(self, symbol, price, change_pct, score, signal_mask=0, uptrend_days=None, category=None,
+                 features=None, threshold=UPTREND_THRESHOLD, signal_names=None):
+        self.symbol = symbol
+        self.price = float(price)
+        self.change_pct = float(change_pct)
+        self.score = int(score)
+        self.signal_mask = int(signal_mask)
+        self.uptrend_days = None if uptrend_days is None else int(uptrend_days)
+        self.category = category
+        self.features = None if features is None else np.asarray(features, dtype='float64')
+        # Umbral de señal y nombres de los bits de la máscara de las reglas con que se puntuó
+        self.threshold = int(threshold)
+        self.signal_names = signal_names
+
+    @classmethod
+    def from_signals(cls, symbol, price, change_pct, score, signals, uptrend_days=None, features=None):
+        """Resultado a partir de un diccionario de señales activas (como ``signals_at``)"""
+        return cls(symbol, price, change_pct, score, signal_mask(signals), uptrend_days, features=features)
+
+    @property
+    def is_uptrend(self):
+        return self.score >= self.threshold
+
+    @property
+    def signals(self):
+        """Señales activas como diccionario nombre -> True"""
+        return signals_from_mask(self.signal_mask, self.signal_names)
+
+    def in_category(self, category):
+        """Copia del resultado asignada a una categoría"""
+        return ScanResult(self.symbol, self.price, self.change_pct, self.score,
+                          self.signal_mask, self.uptrend_days, category, self.features, self.threshold,
+                          self.signal_names)
+
+    def to_dict(self):
+        return {
+            'symbol': self.symbol,
+            'category': self.category,
+            'price': self.price,
+            'change_pct': self.change_pct,
+            'score': self.score,
+            'is_uptrend': self.is_uptrend,
+            'uptrend_days': self.uptrend_days,
+            'signals': self.signals,
+        }
+
+    def __eq__(self, other):
+        if not isinstance(other, ScanResult):
+            return NotImplemented
+        if (self.features is None) != (other.features is None):
+            return False
+        if self.features is not None and not np.array_equal(self.features, other.features, equal_nan=True):
+            return False
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__ if name != 'features')
+
+    def __repr__(self):
+        return (f"ScanResult({self.symbol!r}, score={self.score}, price={self.price:.2f}, "
+                f"change_pct={self.change_pct:.2f}, category={self.category!r})")
@@ -0,0 +1,140 @@
+"""Puntuación Uptrend vectorizada sobre todo el histórico.
+
+Evalúa las siete condiciones de ``detect_uptrend_signal`` y la puntuación de
+0 a 100 para cada barra de cada símbolo a la vez, como arrays. La señal de la
+última barra es simplemente la última fila de este resultado, y el histórico
+de puntuaciones permite consultar tendencias del score o la antigüedad de la
+señal sin recalcular nada.
+"""
+import numpy as np
+import pandas as pd
+
+# Condiciones en el orden en que se evalúan, con sus puntos
+SIGNAL_WEIGHTS = {
+    'price_above_ma': 25,
+    'ma_bullish_order': 20,
+    'macd_bullish': 15,
+    'rsi_favorable': 10,
+    'bb_breakout': 15,
+    'strong_trend': 10,
+    'volume_confirmation': 5,
+}
+SIGNAL_NAMES = list(SIGNAL_WEIGHTS)
+# Bit de cada condición en la máscara compacta de señales activas (las reglas propias
+# numeran sus señales en su propio orden: ``rules.RuleSet.signal_names``)
+SIGNAL_BITS = {name: 1 << i for i, name in enumerate(SIGNAL_NAMES)}
+
+UPTREND_THRESHOLD = 60
+MIN_BARS = 50
+
+
+def signal_arrays(columns):
+    """Condiciones booleanas para cada celda de los arrays de indicadores"""
+    c = {name: np.asarray(columns[name], dtype='float64') for name in (
+        'Close', 'SMA_20', 'SMA_50', 'MACD', 'MACD_Signal', 'RSI', 'BB_High', 'ADX',
+        'Volume', 'Volume_SMA'
+    )}
+    with np.errstate(invalid='ignore'):
+        ma_order = c['SMA_20'] > c['SMA_50']
+        return {
+            'price_above_ma': (c['Close'] > c['SMA_20']) & ma_order,
+            'ma_bullish_order': ma_order,
+            'macd_bullish': (c['MACD'] > c['MACD_Signal']) & (c['MACD'] > 0),
+            'rsi_favorable': (c['RSI'] > 30) & (c['RSI'] < 70),
+            'bb_breakout': c['Close'] > c['BB_High'],
+            'strong_trend': c['ADX'] > 25,
+            'volume_confirmation': c['Volume'] > c['Volume_SMA'],
+        }
+
+
+def score_arrays(columns, bar_number=None):
+    """Devuelve (señales, score) para cada celda; sin puntuación antes de ``MIN_BARS`` barras"""
+    signals = signal_arrays(columns)
+    score = np.zeros(np.shape(signals['price_above_ma']), dtype=np.int64)
+    for name, weight in SIGNAL_WEIGHTS.items():
+        score += signals[name] * weight
+
+    if bar_number is not None:
+        enough = np.asarray(bar_number) >= MIN_BARS
+        signals = {name: values & enough for name, values in signals.items()}
+        score = np.where(enough, score, 0)
+    return signals, score
+
+
+def bar_numbers(close):
+    """Número de barra (1, 2, ...) de cada celda dentro de su propio símbolo; 0 si no hay barra"""
+    valid = ~np.isnan(close)
+    return np.where(valid, np.cumsum(valid, axis=0), 0)
+
+
+def signal_age(is_uptrend, valid=None):
+    """Barras consecutivas en uptrend que terminan en cada barra (0 si no está en uptrend)
+
+    Con ``valid`` las filas sin barra del símbolo (fechas de otros mercados) ni
+    cuentan ni interrumpen la racha.
+    """
+    is_uptrend = np.asarray(is_uptrend, dtype=bool)
+    if valid is None:
+        steps = np.arange(1, len(is_uptrend) + 1).reshape((-1,) + (1,) * (is_uptrend.ndim - 1))
+        breaks = ~is_uptrend
+    else:
+        steps = np.cumsum(valid, axis=0)
+        breaks = valid & ~is_uptrend
+    last_break = np.maximum.accumulate(np.where(breaks, steps, 0), axis=0)
+    return np.where(is_uptrend, steps - last_break, 0)
+
+
+def score_panel(panel):
+    """Señales, score, uptrend y antigüedad de la señal para todo el panel (fechas × símbolos)"""
+    close = panel['Close']
+    bars = bar_numbers(close)
+    signals, score = score_arrays(panel.columns, bars)
+    is_uptrend = score >= UPTREND_THRESHOLD
+    return {
+        'signals': signals,
+        'score': score,
+        'is_uptrend': is_uptrend,
+        'uptrend_age': signal_age(is_uptrend, ~np.isnan(close)),
+        'bars': bars,
+    }
+
+
+def latest_rows(panel):
+    """Índice de la última barra existente de cada símbolo del panel (-1 si no tiene barras)"""
+    valid = ~np.isnan(panel['Close'])
+    last = len(valid) - 1 - np.argmax(valid[::-1], axis=0)
+    return np.where(valid.any(axis=0), last, -1)
+
+
+def signals_at(signals, index):
+    """Diccionario de señales activas (como ``detect_uptrend_signal``) en una posición"""
+    return {name: True for name in SIGNAL_NAMES if signals[name][index]}
+
+
+def signal_mask(signals):
+    """Señales activas como máscara de bits (entero, o array de enteros si las señales son arrays)"""
+    mask = np.int64(0)
+    for name, bit in SIGNAL_BITS.items():
+        mask = mask + np.asarray(signals.get(name, False), dtype=np.int64) * bit
+    return mask
+
+
+def signals_from_mask(mask, names=None):
+    """Diccionario de señales activas (como ``signals_at``) a partir de una máscara de bits
+
+    ``names`` da el nombre de cada bit (bit i: ``names[i]``); por defecto, ``SIGNAL_BITS``.
+    """
+    mask = int(mask)
+    if names is None:
+        return {name: True for name, bit in SIGNAL_BITS.items() if mask & bit}
+    return {name: True for i, name in enumerate(names) if mask >> i & 1}
+
+
+def score_frame(data):
+    """Histórico de señales y puntuación de un DataFrame con indicadores, fila a fila"""
+    signals, score = score_arrays(data, np.arange(1, len(data) + 1))
+    history = pd.DataFrame(signals, index=data.index)
+    history['Score'] = score
+    history['Uptrend'] = score >= UPTREND_THRESHOLD
+    history['Uptrend_Days'] = signal_age(history['Uptrend'].to_numpy())
+    return history
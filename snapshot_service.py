@@ -0,0 +1,264 @@
+"""Escaneo periódico en segundo plano con snapshots compartidos.
+
+Un único escaneo de todas las categorías (``SnapshotService``) se repite cada
+``interval`` segundos y publica sus resultados como un snapshot versionado
+(``SnapshotStore``). La interfaz solo carga y filtra el último snapshot, así que
+ni las peticiones a Yahoo ni el cálculo de indicadores dependen del número de
+visitantes.
+
+Cada versión se escribe en un fichero temporal que se renombra (``os.replace``)
+y después se actualiza del mismo modo el puntero ``LATEST``: un lector nunca ve
+un snapshot a medio escribir. Varios procesos (servidores de Streamlit, el
+escáner en modo servicio) pueden compartir el directorio: un bloqueo de fichero
+impide escaneos simultáneos, no se escanea mientras el último snapshot siga
+vigente y otro bloqueo serializa las publicaciones (cada una numera su versión
+a partir de ``LATEST``).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from price_cache import DEFAULT_CACHE_DIR
+from scan_result import ScanResult
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+# Cadencia por defecto del escaneo (segundos) y si la aplicación lo arranca en su proceso
+DEFAULT_INTERVAL = int(os.environ.get('UPTREND_SNAPSHOT_INTERVAL', 900))
+SERVICE_ENABLED = os.environ.get('UPTREND_SNAPSHOT_SERVICE', '1') != '0'
+
+# Campos de cada resultado en el fichero (una lista por resultado)
+RECORD_FIELDS = ['symbol', 'category', 'price', 'change_pct', 'score', 'signal_mask', 'uptrend_days', 'features']
+
+logger = logging.getLogger('uptrend')
+
+
+def _field_value(result, field):
+    value = getattr(result, field)
+    # Los valores de la última barra se guardan como lista (NaN incluido, que ``json`` admite)
+    return value.tolist() if field == 'features' and value is not None else value
+
+
+def result_record(result):
+    """Resultado como lista de valores en el orden de ``RECORD_FIELDS``"""
+    return [_field_value(result, field) for field in RECORD_FIELDS]
+
+
+class Snapshot:
+    """Resultados de un escaneo completo publicado"""
+
+    def __init__(self, version, created_at, results, period='6mo', elapsed=None):
+        self.version = version
+        self.created_at = created_at
+        self.results = results
+        self.period = period
+        self.elapsed = elapsed
+        # (categoría, símbolo) -> resultado, para filtrar sin recorrer la lista
+        self._index = {(r.category, r.symbol): r for r in results}
+
+    @property
+    def age(self):
+        """Segundos desde la publicación"""
+        return time.time() - self.created_at
+
+    def get(self, category, symbol):
+        return self._index.get((category, symbol))
+
+    def to_payload(self):
+        return {
+            'version': self.version,
+            'created_at': self.created_at,
+            'period': self.period,
+            'elapsed_seconds': self.elapsed,
+            'fields': RECORD_FIELDS,
+            'results': [result_record(r) for r in self.results],
+        }
+
+    @classmethod
+    def from_payload(cls, payload):
+        fields = payload['fields']
+        results = [ScanResult(**dict(zip(fields, record))) for record in payload['results']]
+        return cls(payload['version'], payload['created_at'], results,
+                   payload.get('period', '6mo'), payload.get('elapsed_seconds'))
+
+
+class SnapshotStore:
+    def __init__(self, path=None, keep=5):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, 'snapshots')
+        os.makedirs(self.path, exist_ok=True)
+        # Versiones que se conservan (un lector que acaba de leer LATEST aún encuentra la suya)
+        self.keep = keep
+        self._cached = None
+        self._lock = threading.Lock()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _write_atomic(self, name, text):
+        temporary = self._file(f'.{name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(temporary, 'w') as f:
+            f.write(text)
+        os.replace(temporary, self._file(name))
+
+    def latest_name(self):
+        try:
+            with open(self._file('LATEST')) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def latest(self):
+        """Último snapshot publicado (se relee del disco solo si ha cambiado) o None"""
+        name = self.latest_name()
+        if name is None:
+            return None
+        with self._lock:
+            if self._cached is not None and self._cached[0] == name:
+                return self._cached[1]
+        try:
+            with open(self._file(name)) as f:
+                snapshot = Snapshot.from_payload(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Snapshot %s ilegible: %s", name, e)
+            return None
+        with self._lock:
+            self._cached = (name, snapshot)
+        return snapshot
+
+    def publish(self, results, period='6mo', elapsed=None):
+        """Publica una versión nueva con ``results`` (``ScanResult`` con categoría)
+
+        La versión se calcula y se escribe con el bloqueo de publicación, así que
+        dos llamadas simultáneas (de este o de otro proceso) no escriben el mismo
+        ``snapshot-N.json``.
+        """
+        results = list(results)
+        with self._publish_lock():
+            latest = self.latest_name()
+            version = int(latest.split('-')[1].split('.')[0]) + 1 if latest else 1
+            snapshot = Snapshot(version, time.time(), results, period, elapsed)
+            name = f'snapshot-{version:06d}.json'
+            self._write_atomic(name, json.dumps(snapshot.to_payload()))
+            self._write_atomic('LATEST', name)
+            self._prune(version)
+        return snapshot
+
+    def _prune(self, version):
+        for name in os.listdir(self.path):
+            if name.startswith('snapshot-') and name.endswith('.json'):
+                if int(name[len('snapshot-'):-len('.json')]) <= version - self.keep:
+                    try:
+                        os.remove(self._file(name))
+                    except OSError:
+                        pass
+
+    @contextmanager
+    def _publish_lock(self):
+        """Bloqueo exclusivo de la publicación entre procesos (y entre hilos: cada uno abre el fichero)"""
+        with open(self._file('publish.lock'), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    @contextmanager
+    def scan_lock(self):
+        """Bloqueo no bloqueante del escaneo: produce False si otro proceso ya está escaneando"""
+        with open(self._file('scan.lock'), 'a') as f:
+            if fcntl is None:
+                yield True
+                return
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class SnapshotService:
+    """Escanea todas las categorías cada ``interval`` segundos y publica un snapshot"""
+
+    def __init__(self, analyzer, store=None, interval=DEFAULT_INTERVAL, period='6mo',
+                 category_symbols=None, workers=None):
+        self.analyzer = analyzer
+        self.store = store or SnapshotStore()
+        self.interval = interval
+        self.period = period
+        # Por defecto, todas las categorías del analizador (con su clave como nombre)
+        self.category_symbols = category_symbols
+        self.workers = workers
+        self.scanning = False
+        self.last_error = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def due(self):
+        latest = self.store.latest()
+        return latest is None or latest.age >= self.interval
+
+    def run_once(self, force=False):
+        """Escanea y publica si toca (o si ``force``); devuelve el snapshot publicado o None"""
+        with self.store.scan_lock() as acquired:
+            if not acquired or not (force or self.due()):
+                return None
+            self.scanning = True
+            try:
+                started = time.perf_counter()
+                results = self.analyzer.scan(
+                    self.category_symbols or self.analyzer.symbols, period=self.period, workers=self.workers
+                )
+                if not results:
+                    logger.warning("Escaneo sin resultados: no se publica snapshot")
+                    return None
+                snapshot = self.store.publish(results, self.period, time.perf_counter() - started)
+                logger.info("Snapshot v%d: %d resultados en %.1fs",
+                            snapshot.version, len(results), snapshot.elapsed)
+                return snapshot
+            finally:
+                self.scanning = False
+
+    def run_forever(self):
+        """Bucle del servicio (bloquea hasta ``stop()``)"""
+        while not self._stop.is_set():
+            force = self._wake.is_set()
+            self._wake.clear()
+            try:
+                self.run_once(force=force)
+                self.last_error = None
+            except Exception as e:
+                # Un escaneo fallido no detiene el servicio: se reintenta en la siguiente vuelta
+                logger.exception("Error en el escaneo periódico")
+                self.last_error = e
+            latest = self.store.latest()
+            remaining = self.interval - latest.age if latest is not None else self.interval
+            self._wake.wait(min(max(remaining, 5.0), self.interval))
+
+    def start(self):
+        """Arranca el servicio en un hilo (una vez por proceso)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, name='snapshot-service', daemon=True)
+            self._thread.start()
+        return self
+
+    def trigger(self):
+        """Pide un escaneo inmediato (se ignora si otro ya está en curso)"""
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
@@ -0,0 +1,188 @@
+"""Mercado sintético vectorizado y determinista (modo demo y benchmarks).
+
+Todos los números aleatorios salen de un hash con contador (splitmix64) de la
+semilla, el símbolo (``crc32``) y la fecha de cada barra. No hay estado del
+generador que recorrer: una matriz fechas × símbolos completa se calcula de una
+vez con operaciones enteras de NumPy. Además, la serie de un símbolo es la
+misma tanto si se genera sola como si se genera dentro de un universo de
+10.000, con cualquier periodo y en cualquier proceso (``hash()`` de Python
+cambia de un proceso a otro; ``crc32`` no).
+
+Cada símbolo alterna regímenes de tendencia y volatilidad (``REGIMES``), en
+tramos de ``regime_days`` días elegidos por el mismo hash, sobre un factor de
+mercado común (``correlation``). Apertura, máximo, mínimo y volumen guardan las
+relaciones de un mercado real: huecos de apertura pequeños, mechas
+proporcionales a la volatilidad y más volumen en los movimientos grandes. El
+precio se ancla a la última barra: dos periodos que terminan el mismo día
+coinciden en el tramo común.
+"""
+import zlib
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+from indicators import OHLCV_COLUMNS, Panel
+from price_cache import PERIOD_DAYS
+
+DEFAULT_SEED = 0
+
+# Regímenes: deriva y volatilidad anuales y probabilidad de cada uno
+REGIMES = {
+    'alcista': {'drift': 0.35, 'volatility': 0.20, 'weight': 0.40},
+    'lateral': {'drift': 0.00, 'volatility': 0.15, 'weight': 0.30},
+    'bajista': {'drift': -0.30, 'volatility': 0.30, 'weight': 0.20},
+    'volátil': {'drift': 0.05, 'volatility': 0.55, 'weight': 0.10},
+}
+REGIME_DAYS = 60
+MARKET_CORRELATION = 0.35
+
+# Frecuencia de las barras intradía (el mercado sintético cotiza 24/7) y barras por año
+INTERVAL_FREQUENCIES = {'15m': '15min', '1h': 'h'}
+BARS_PER_YEAR = {'1d': 252, '1h': 24 * 365, '15m': 4 * 24 * 365}
+
+# Símbolos por bloque en ``iter_panels`` (acota la memoria de las matrices intermedias)
+SYMBOL_CHUNK = 1000
+
+DAY_NS = 86_400 * 10**9
+
+# Flujos de números aleatorios por barra (ruido propio y hueco, mechas, volumen)
+_STREAMS = 6
+_MARKET, _REGIME, _PROFILE = 1, 2, 3
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+def _mix(x):
+    """splitmix64 elemento a elemento (aritmética módulo 2^64)"""
+    with np.errstate(over='ignore'):
+        z = np.asarray(x, dtype=np.uint64) + _GOLDEN
+        z = (z ^ (z >> np.uint64(30))) * _MIX_1
+        z = (z ^ (z >> np.uint64(27))) * _MIX_2
+    return z ^ (z >> np.uint64(31))
+
+
+def _uniform(keys):
+    """Uniformes en (0, 1) a partir de claves de 64 bits"""
+    return ((_mix(keys) >> np.uint64(11)).astype('float64') + 0.5) * 2.0**-53
+
+
+def _normal_pair(keys):
+    """Dos normales estándar (Box-Muller) por clave"""
+    u1, u2 = _uniform(keys), _uniform(keys ^ _GOLDEN)
+    radius = np.sqrt(-2.0 * np.log(u1))
+    return radius * np.cos(2 * np.pi * u2), radius * np.sin(2 * np.pi * u2)
+
+
+def _frequency_ns(interval):
+    return to_offset(INTERVAL_FREQUENCIES[interval]).nanos
+
+
+def symbol_keys(symbols, seed=DEFAULT_SEED):
+    """Clave de 64 bits de cada símbolo para una semilla (estable entre procesos)"""
+    crc = np.array([zlib.crc32(str(symbol).encode()) for symbol in symbols], dtype=np.uint64)
+    return _mix(crc ^ _mix(np.uint64(seed) << np.uint64(32)))
+
+
+class SyntheticMarket:
+    def __init__(self, seed=DEFAULT_SEED, regimes=None, regime_days=REGIME_DAYS,
+                 correlation=MARKET_CORRELATION):
+        self.seed = int(seed)
+        self.regimes = dict(regimes or REGIMES)
+        self.regime_days = int(regime_days)
+        self.correlation = float(correlation)
+
+        weights = np.array([r['weight'] for r in self.regimes.values()], dtype='float64')
+        self._cumulative = np.cumsum(weights / weights.sum())
+        self._drift = np.array([r['drift'] for r in self.regimes.values()], dtype='float64')
+        self._volatility = np.array([r['volatility'] for r in self.regimes.values()], dtype='float64')
+
+    def dates(self, period='6mo', interval='1d', end=None):
+        """Fechas de las barras de un periodo que termina en ``end`` (por defecto, hoy)
+
+        Las diarias son días hábiles sin zona horaria; las intradía, instantes UTC.
+        """
+        days = PERIOD_DAYS.get(period, 183)
+        if interval in INTERVAL_FREQUENCIES:
+            freq = INTERVAL_FREQUENCIES[interval]
+            end = pd.Timestamp(end or pd.Timestamp.now(tz='UTC')).floor(freq)
+            bars = days * DAY_NS // _frequency_ns(interval)
+            return pd.date_range(end=end, periods=bars, freq=freq)
+        end = pd.Timestamp(end or pd.Timestamp.now()).normalize()
+        return pd.bdate_range(start=end - pd.Timedelta(days=days), end=end)
+
+    def panel(self, symbols, dates, interval='1d'):
+        """Panel OHLCV (fechas × símbolos) de los ``symbols`` en las ``dates``"""
+        symbols = list(symbols)
+        dates = pd.DatetimeIndex(dates)
+        stamps = (dates.tz_convert('UTC').tz_localize(None) if dates.tz is not None else dates).as_unit('ns').asi8
+        n_dates = len(stamps)
+        keys = symbol_keys(symbols, self.seed)[None, :]
+
+        # Contador de cada barra: su posición desde 1970 en barras del intervalo
+        bar_ns = DAY_NS if interval not in INTERVAL_FREQUENCIES else _frequency_ns(interval)
+        counters = _mix((stamps // bar_ns).astype(np.uint64) * np.uint64(_STREAMS + 4))[:, None]
+        day = (stamps // DAY_NS).astype(np.int64)[:, None]
+
+        # Perfil de cada símbolo: precio final, volumen medio, multiplicador de volatilidad y desfase de régimen
+        profile = _uniform(keys[0] ^ _mix(np.arange(4, dtype=np.uint64) + np.uint64(_PROFILE << 8))[:, None])
+        final_price = np.exp(np.log(5) + profile[0] * np.log(400))
+        base_volume = np.exp(np.log(2e5) + profile[1] * np.log(250))
+        vol_scale = 0.6 + 1.2 * profile[2]
+        phase = (profile[3] * self.regime_days).astype(np.int64)
+
+        # Régimen: tramos fijos de regime_days días por símbolo, elegidos por el hash del tramo
+        segment = ((day + phase) // self.regime_days).astype(np.uint64)
+        regime = np.searchsorted(
+            self._cumulative, _uniform(keys ^ _mix(segment * np.uint64(8) + np.uint64(_REGIME))), side='right'
+        )
+        regime = np.minimum(regime, len(self._cumulative) - 1)
+
+        dt = 1.0 / BARS_PER_YEAR.get(interval, 252)
+        sigma = self._volatility[regime] * vol_scale * np.sqrt(dt)
+        drift = (self._drift[regime] - 0.5 * (self._volatility[regime] * vol_scale) ** 2) * dt
+
+        # Ruido: factor de mercado común (mismo para todos los símbolos en cada fecha) y propio
+        market, _ = _normal_pair(counters ^ _mix(np.uint64(self.seed) * np.uint64(16) + np.uint64(_MARKET)))
+        own, gap = _normal_pair(keys ^ counters)
+        # Mechas exponenciales y ruido de volumen uniforme (más baratos que otro par de normales)
+        wick_high = -np.log(_uniform(keys ^ (counters + np.uint64(1))))
+        wick_low = -np.log(_uniform(keys ^ (counters + np.uint64(2))))
+        volume_noise = _uniform(keys ^ (counters + np.uint64(3))) - 0.5
+        shock = self.correlation * market + np.sqrt(1 - self.correlation ** 2) * own
+        returns = drift + sigma * shock
+
+        # Cierre anclado a la última barra: log C_t = log C_final - (rentabilidades posteriores a t)
+        after = np.cumsum(returns[::-1], axis=0)[::-1] - returns
+        close = final_price * np.exp(-after)
+        previous = close * np.exp(-returns)
+        open_ = previous * np.exp(0.25 * sigma * gap)
+        high = np.maximum(open_, close) * np.exp(0.4 * sigma * wick_high)
+        low = np.minimum(open_, close) * np.exp(-0.4 * sigma * wick_low)
+        volume = np.round(base_volume * np.exp(0.8 * volume_noise) * (1 + 0.8 * np.abs(shock)))
+
+        columns = dict(zip(OHLCV_COLUMNS, (open_, high, low, close, volume)))
+        if n_dates == 0:
+            columns = {c: np.empty((0, len(symbols))) for c in OHLCV_COLUMNS}
+        return Panel(dates, symbols, columns)
+
+    def iter_panels(self, symbols, dates, interval='1d', chunk=SYMBOL_CHUNK):
+        """Paneles por bloques de ``chunk`` símbolos (universos grandes con memoria acotada)"""
+        symbols = list(symbols)
+        for start in range(0, len(symbols), chunk):
+            yield self.panel(symbols[start:start + chunk], dates, interval)
+
+    def frame(self, symbol, dates, interval='1d'):
+        """DataFrame OHLCV de un símbolo (con el formato de yfinance)"""
+        panel = self.panel([symbol], dates, interval)
+        return pd.DataFrame({c: panel[c][:, 0] for c in OHLCV_COLUMNS}, index=panel.dates)
+
+    def frames(self, symbols, dates, interval='1d', chunk=SYMBOL_CHUNK):
+        """Diccionario símbolo -> DataFrame OHLCV"""
+        frames = {}
+        for panel in self.iter_panels(symbols, dates, interval, chunk):
+            for j, symbol in enumerate(panel.symbols):
+                frames[symbol] = pd.DataFrame({c: panel[c][:, j] for c in OHLCV_COLUMNS}, index=panel.dates)
+        return frames
@@ -0,0 +1,23 @@
+"""Configuración común de los tests: módulos del repositorio y caché en un directorio temporal."""
+import os
+import sys
+import tempfile
+
+# Antes de importar nada del repositorio: las rutas por defecto se leen al importar
+os.environ.setdefault('UPTREND_CACHE_DIR', tempfile.mkdtemp(prefix='uptrend-tests-'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from synthetic import SyntheticMarket
+
+
+@pytest.fixture
+def market():
+    return SyntheticMarket(seed=7)
+
+
+@pytest.fixture
+def daily(market):
+    """Serie diaria sintética de un año (formato de yfinance)"""
+    return market.frame('TEST', market.dates('1y', end='2024-06-28'))
@@ -0,0 +1,26 @@
+import pytest
+
+from backtest import run_backtest
+
+
+@pytest.fixture(scope='module')
+def frames():
+    from synthetic import SyntheticMarket
+    market = SyntheticMarket(seed=3)
+    return market.frames([f'S{i}' for i in range(24)], market.dates('2y', end='2024-06-28'))
+
+
+def test_parallel_backtest_matches_serial(frames):
+    serial = run_backtest(frames, workers=1, chunk_size=8)
+    parallel = run_backtest(frames, workers=2, chunk_size=8)
+    assert parallel['summary'] == serial['summary']
+    assert parallel['horizons'].equals(serial['horizons'])
+
+
+def test_summary_counts_symbols_and_trades(frames):
+    result = run_backtest(frames, workers=1)
+    summary = result['summary']
+    assert summary['symbols'] == len(frames)
+    assert summary['trades'] == len(result['trades'])
+    assert summary['open_trades'] == result['trades']['open'].sum()
+    assert 0 <= summary['win_rate'] <= 1
@@ -0,0 +1,33 @@
+import json
+
+import benchmark
+
+
+TIMINGS = {100: {'scan': 2.0, 'get_data': 0.03}}
+
+
+def test_baselines_are_kept_per_core_count(tmp_path, monkeypatch):
+    path = str(tmp_path / 'baselines.json')
+    monkeypatch.setattr(benchmark.os, 'cpu_count', lambda: 1)
+    benchmark.save_baselines(TIMINGS, path)
+    monkeypatch.setattr(benchmark.os, 'cpu_count', lambda: 8)
+    benchmark.save_baselines({100: {'scan': 0.5}}, path)
+
+    with open(path) as f:
+        assert set(json.load(f)['machines']) == {'1', '8'}
+    assert benchmark.load_baselines(path)['sizes']['100']['scan'] == 0.5
+    assert benchmark.load_baselines(path, cpus=1)['sizes']['100'] == TIMINGS[100]
+
+
+def test_regressions_are_only_checked_against_the_same_core_count(tmp_path, monkeypatch):
+    path = str(tmp_path / 'baselines.json')
+    monkeypatch.setattr(benchmark.os, 'cpu_count', lambda: 8)
+    benchmark.save_baselines({100: {'scan': 0.5}}, path)
+
+    slower = {100: {'scan': 2.0}}
+    rows = benchmark.compare(slower, benchmark.load_baselines(path))
+    assert rows[0][-1]
+
+    monkeypatch.setattr(benchmark.os, 'cpu_count', lambda: 2)
+    rows = benchmark.compare(slower, benchmark.load_baselines(path))
+    assert rows[0][3] is None and not rows[0][-1]
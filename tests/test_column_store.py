@@ -0,0 +1,139 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from column_store import ColumnStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ColumnStore(str(tmp_path / 'columns'), row_slack=64, symbol_slack=8)
+
+
+def generation(store):
+    return store.refresh()[1]['generation']
+
+
+def assert_frame_close(stored, data):
+    assert list(stored.index) == list(data.index)
+    np.testing.assert_allclose(stored['Close'].to_numpy(), data['Close'].to_numpy(), rtol=1e-6)
+    np.testing.assert_array_equal(stored['Volume'].to_numpy(), data['Volume'].to_numpy())
+
+
+def test_write_and_read_back(store, daily, market):
+    other = market.frame('OTHER', daily.index)
+    store.write({'TEST': daily, 'OTHER': other})
+
+    assert store.symbols == ['TEST', 'OTHER']
+    assert_frame_close(store.frame('TEST'), daily)
+    assert_frame_close(store.frame('OTHER', start=daily.index[-20]), other.iloc[-20:])
+    panel = store.panel(['OTHER', 'TEST'])
+    assert panel.symbols == ['OTHER', 'TEST'] and panel['Close'].dtype == np.float64
+
+
+def test_appending_bars_and_symbols_writes_in_place(store, daily, market):
+    store.write({'TEST': daily.iloc[:-5]})
+    first = generation(store)
+
+    # El solapamiento llega con los mismos valores: solo se añaden celdas que nadie veía
+    store.write({'TEST': daily.iloc[-10:], 'NEW': market.frame('NEW', daily.index[-10:])})
+
+    assert generation(store) == first
+    assert_frame_close(store.frame('TEST'), daily)
+    assert len(store.frame('NEW')) == 10
+
+
+def test_revising_the_last_bar_goes_through_the_tail_without_a_new_generation(store, daily):
+    store.write({'TEST': daily})
+    reader = ColumnStore(store.path)
+    before = reader.view(['TEST'])
+    close = np.array(before['Close'][-1])
+    first = generation(store)
+
+    revised = daily.iloc[-1:].copy()
+    revised[['Open', 'High', 'Low', 'Close']] *= 1.01
+    store.write({'TEST': revised})
+
+    # Ni se copia la generación ni cambia lo que ya estaba abierto
+    assert generation(store) == first
+    assert sorted(os.listdir(store.path)) == sorted(
+        [f'{c}.{first}' for c in ['Open', 'High', 'Low', 'Close', 'Volume', 'dates']]
+        + ['meta.json', 'store.lock', 'tail.1.npz']
+    )
+    np.testing.assert_array_equal(before['Close'][-1], close)
+    assert reader.frame('TEST')['Close'].iloc[-1] == pytest.approx(revised['Close'].iloc[-1], rel=1e-6)
+
+
+def test_tail_is_folded_in_place_by_the_next_write(store, daily, market):
+    store.write({'TEST': daily.iloc[:-3]})
+    first = generation(store)
+    expected = daily.copy()
+    for end in range(len(daily) - 2, len(daily) + 1):
+        # Cada escritura revisa la última barra publicada y añade la siguiente
+        expected.iloc[end - 2, :4] *= 1.02
+        store.write({'TEST': expected.iloc[end - 3:end]})
+        assert store.refresh()[1]['tail']['start'] == end - 2
+        assert_frame_close(ColumnStore(store.path).frame('TEST'), expected.iloc[:end])
+
+    store.write({'NEW': market.frame('NEW', daily.index[-5:])})
+    assert store.refresh()[1]['tail'] is None
+    assert not [name for name in os.listdir(store.path) if name.startswith('tail.')]
+    assert generation(store) == first
+    assert_frame_close(store.frame('TEST'), expected)
+
+
+def test_revising_older_history_writes_a_new_generation(store, daily):
+    store.write({'TEST': daily})
+    reader = ColumnStore(store.path)
+    before = reader.view(['TEST'])
+    close = np.array(before['Close'])
+    first = generation(store)
+
+    adjusted = daily.iloc[-30:].copy()
+    adjusted[['Open', 'High', 'Low', 'Close']] *= 0.5
+    store.write({'TEST': adjusted})
+
+    # El panel ya abierto sigue viendo la generación anterior completa
+    assert generation(store) == first + 1
+    np.testing.assert_array_equal(before['Close'], close)
+    np.testing.assert_allclose(reader.frame('TEST')['Close'].iloc[-30:].to_numpy(),
+                               adjusted['Close'].to_numpy(), rtol=1e-6)
+
+
+def test_replace_publishes_the_new_history_at_once(store, daily):
+    store.write({'TEST': daily})
+    reader = ColumnStore(store.path)
+    before = reader.view(['TEST'])
+
+    store.write({'TEST': daily.iloc[-30:] * 2}, replace=['TEST'])
+
+    assert not np.isnan(before['Close'][:, 0]).any()
+    stored = reader.frame('TEST')
+    assert len(stored) == 30
+    np.testing.assert_allclose(stored['Close'].to_numpy(), daily['Close'].iloc[-30:].to_numpy() * 2, rtol=1e-6)
+
+
+def test_leftovers_of_an_interrupted_write_are_never_published(store, daily, market):
+    store.write({'TEST': daily.iloc[:-1], 'OTHER': market.frame('OTHER', daily.index[:-1])})
+    meta = store.refresh()[1]
+    maps = store._open_maps(meta, 'r+')
+    # Una escritura interrumpida dejó una barra de OTHER en la fila siguiente, sin publicar
+    maps['Close'][meta['n_dates'], 1] = 123.0
+    maps['Close'].flush()
+
+    store.write({'TEST': daily.iloc[-1:]})
+
+    assert store.frame('OTHER').index[-1] == daily.index[-2]
+    assert len(store.dates()) == len(daily)
+
+
+def test_growing_past_capacity_rebuilds(store, market):
+    dates = pd.bdate_range('2020-01-01', periods=40)
+    store.write({f'S{i}': market.frame(f'S{i}', dates) for i in range(8)})
+    first = generation(store)
+    store.write({f'S{i}': market.frame(f'S{i}', dates) for i in range(8, 12)})
+
+    assert generation(store) == first + 1
+    assert len(store) == 12 and len(store.frame('S3')) == 40
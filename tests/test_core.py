@@ -0,0 +1,38 @@
+import pytest
+
+from uptrend_core import UptrendAnalyzer
+
+
+class OfflineScheduler:
+    """Planificador sin datos remotos: el analizador recurre a los datos demo"""
+
+    def fetch_many(self, jobs, on_result=None):
+        results = dict.fromkeys(jobs)
+        for symbol in jobs:
+            if on_result is not None:
+                on_result(symbol, None)
+        return results
+
+
+@pytest.fixture
+def analyzer():
+    return UptrendAnalyzer(demo_mode=True, fetcher=OfflineScheduler())
+
+
+def test_scan_matches_symbol_by_symbol_analysis(analyzer):
+    category_symbols = {'a': ['AAA', 'BBB', 'CCC'], 'b': ['BBB', 'DDD']}
+    results = analyzer.scan(category_symbols, workers=1)
+    assert [(r.category, r.symbol) for r in results] == [
+        (category, symbol) for category, symbols in category_symbols.items() for symbol in symbols
+    ]
+    for result in results:
+        expected = analyzer.analyze_data(result.symbol, analyzer.generate_demo_data(result.symbol))
+        assert (result.score, result.is_uptrend, result.signals) == (
+            expected.score, expected.is_uptrend, expected.signals
+        )
+        assert result.price == pytest.approx(expected.price)
+
+
+def test_symbols_without_data_are_skipped(analyzer):
+    analyzer.demo_mode = False
+    assert analyzer.scan({'a': ['AAA']}, workers=1) == []
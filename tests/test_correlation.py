@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation import RollingCorrelation, cluster, cluster_summary, log_returns, lookback_period
+from indicators import Panel
+
+SYMBOLS = [f'S{i}' for i in range(7)]
+
+
+@pytest.fixture
+def close(market):
+    """Cierres diarios con huecos: un festivo de otro mercado y una salida a bolsa reciente"""
+    panel = market.panel(SYMBOLS, market.dates('1y', end='2024-06-28'))
+    close = panel['Close'].copy()
+    close[100, 2] = np.nan
+    close[:200, 5] = np.nan
+    return pd.DataFrame(close, index=panel.dates, columns=SYMBOLS)
+
+
+def as_panel(close):
+    return Panel(close.index, list(close.columns), {'Close': close.to_numpy()})
+
+
+def expected_corr(close, lookback, min_overlap=20):
+    """Correlación por pares de pandas sobre las fechas comunes de la ventana"""
+    returns = pd.DataFrame(log_returns(close.to_numpy()), columns=close.columns).iloc[1:].iloc[-lookback:]
+    corr = returns.corr(min_periods=min_overlap)
+    return corr.rename_axis(None).rename_axis(None, axis=1)
+
+
+def test_log_returns_skip_missing_bars():
+    close = np.array([[100.0], [np.nan], [110.0], [121.0]])
+    returns = log_returns(close)[:, 0]
+    assert np.isnan(returns[:2]).all()
+    np.testing.assert_allclose(returns[2:], np.log([1.1, 1.1]))
+
+
+@pytest.mark.parametrize('block', [2, 512])
+def test_matrix_matches_pairwise_pandas_correlation(close, block):
+    correlation = RollingCorrelation(SYMBOLS, lookback=120, block=block)
+    correlation.update(as_panel(close))
+
+    pd.testing.assert_frame_equal(correlation.frame(), expected_corr(close, 120), atol=1e-9)
+    # Un subconjunto se calcula solo para sus pares y coincide con la matriz completa
+    subset = RollingCorrelation(SYMBOLS, lookback=120, block=block)
+    subset.update(as_panel(close))
+    pd.testing.assert_frame_equal(subset.frame(['S5', 'S1']), correlation.frame().loc[['S5', 'S1'], ['S5', 'S1']])
+
+
+def test_short_overlap_is_nan(close):
+    correlation = RollingCorrelation(SYMBOLS, lookback=60, min_overlap=20)
+    late = close.copy()
+    late.iloc[:-15, 6] = np.nan
+    correlation.update(as_panel(late))
+
+    frame = correlation.frame()
+    assert frame.loc['S6'].isna().all()
+    assert frame.loc['S0', 'S1'] == pytest.approx(expected_corr(late, 60).loc['S0', 'S1'])
+
+
+def test_new_and_revised_bars_update_the_window_incrementally(close):
+    correlation = RollingCorrelation(SYMBOLS, lookback=120)
+    assert correlation.update(as_panel(close.iloc[:-5])) == 120
+    assert correlation.last_update == ('full', 120)
+    assert correlation.update(as_panel(close.iloc[:-5])) == 0
+
+    # Cuatro barras nuevas y la última que ya tenía revisada (sesión en curso)
+    revised = close.iloc[:-1].copy()
+    revised.iloc[-5] *= 1.01
+    assert correlation.update(as_panel(revised)) == 5
+    assert correlation.last_update == ('incremental', 5)
+    pd.testing.assert_frame_equal(correlation.frame(), expected_corr(revised, 120), atol=1e-9)
+
+    correlation.update(as_panel(close))
+    pd.testing.assert_frame_equal(correlation.frame(), expected_corr(close, 120), atol=1e-9)
+
+
+def test_rebuilds_after_lookback_updated_rows(close):
+    correlation = RollingCorrelation(SYMBOLS, lookback=30)
+    correlation.update(as_panel(close.iloc[:-40]))
+    modes = []
+    for end in range(-35, 0, 5):
+        correlation.update(as_panel(close.iloc[:end]))
+        modes.append(correlation.last_update[0])
+
+    # Seis actualizaciones de 5 filas caben en la ventana de 30; la séptima recalcula
+    assert modes == ['incremental'] * 6 + ['full']
+    pd.testing.assert_frame_equal(correlation.frame(), expected_corr(close.iloc[:-5], 30), atol=1e-9)
+
+
+def test_cluster_groups_correlated_symbols_by_average_linkage():
+    corr = np.array([
+        [1.0, 0.9, 0.8, 0.1, 0.0],
+        [0.9, 1.0, 0.85, 0.2, 0.1],
+        [0.8, 0.85, 1.0, 0.0, np.nan],
+        [0.1, 0.2, 0.0, 1.0, 0.75],
+        [0.0, 0.1, np.nan, 0.75, 1.0],
+    ])
+    assert cluster(corr, 0.7).tolist() == [0, 0, 0, 1, 1]
+    assert cluster(corr, 0.95).tolist() == [0, 1, 2, 3, 4]
+    assert len(set(cluster(corr, 0.0))) == 1
+
+    summary = cluster_summary(list('ABCDE'), corr, cluster(corr, 0.7), {'A': 40, 'B': 80, 'C': 65, 'E': 70},
+                              flagged=['A', 'C', 'E'])
+    first, second = summary.to_dict('records')
+    assert first['representative'] == 'C' and first['members'] == ['C', 'A', 'B']
+    assert first['flagged'] == 2 and first['mean_correlation'] == pytest.approx(0.85)
+    assert second['representative'] == 'E' and second['size'] == 2
+
+
+def test_lookback_period_covers_the_window():
+    assert lookback_period(60) == '6mo'
+    assert lookback_period(200) == '1y'
+    assert lookback_period(10_000) == '5y'
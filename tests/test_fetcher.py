@@ -0,0 +1,320 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import fetcher
+from fetcher import FAILED, CircuitBreaker, FetchScheduler, TokenBucket, fetch_params
+
+
+def chart_body(data):
+    """Respuesta de la API de gráficos con las barras de ``data``"""
+    stamps = pd.DatetimeIndex(data.index) + pd.Timedelta(hours=14)
+    quote_ = {name.lower(): data[name].tolist() for name in ['Open', 'High', 'Low', 'Close', 'Volume']}
+    result = {
+        'meta': {'exchangeTimezoneName': 'America/New_York'},
+        'timestamp': stamps.as_unit('s').asi8.tolist(),
+        'indicators': {'quote': [quote_], 'adjclose': [{'adjclose': quote_['close']}]},
+    }
+    return json.dumps({'chart': {'result': [result], 'error': None}}).encode()
+
+
+class StubServer:
+    """Servidor local de la API de gráficos; ``respond(símbolo, intento)`` decide cada respuesta
+
+    ``respond`` devuelve ``(estado, cabeceras)``; con 200 se sirve ``body``.
+    Registra la hora de cada petición y el máximo de peticiones simultáneas.
+    """
+
+    def __init__(self, body, respond=None, delay=0.0):
+        self.body = body
+        self.respond = respond or (lambda symbol, attempt: (200, {}))
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                symbol = unquote(urlparse(self.path).path.rsplit('/', 1)[-1])
+                with server.lock:
+                    attempt = sum(1 for s, _ in server.requests if s == symbol)
+                    server.requests.append((symbol, time.monotonic()))
+                    server.in_flight += 1
+                    server.peak = max(server.peak, server.in_flight)
+                try:
+                    time.sleep(server.delay)
+                    status, headers = server.respond(symbol, attempt)
+                    body = server.body if status == 200 else b'{}'
+                    self.send_response(status)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with server.lock:
+                        server.in_flight -= 1
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def times(self, symbol):
+        return [t for s, t in self.requests if s == symbol]
+
+
+@pytest.fixture
+def body(daily):
+    return chart_body(daily.iloc[-60:])
+
+
+def scheduler(server, **kwargs):
+    options = {'backend': 'chart', 'max_in_flight': 4, 'rate': 1000.0, 'backoff': 0.01, 'retries': 2}
+    options.update(kwargs)
+    return FetchScheduler(base_url=server.url, **options)
+
+
+def jobs(count):
+    return {f'S{i:02d}': fetch_params(period='6mo') for i in range(count)}
+
+
+def test_chart_backend_returns_adjusted_frames(body, daily):
+    with StubServer(body) as server:
+        results = scheduler(server).fetch_many(jobs(3))
+
+    assert set(results) == {'S00', 'S01', 'S02'}
+    data = results['S00']
+    assert list(data.columns) == ['Open', 'High', 'Low', 'Close', 'Volume']
+    np.testing.assert_allclose(data['Close'].to_numpy(), daily['Close'].iloc[-60:].to_numpy())
+
+
+def test_token_bucket_limits_the_request_rate(body):
+    with StubServer(body) as server:
+        started = time.monotonic()
+        scheduler(server, rate=20.0, burst=1, max_in_flight=8).fetch_many(jobs(11))
+        elapsed = time.monotonic() - started
+
+    # Un token inicial y 10 más a 20 por segundo: al menos medio segundo
+    assert len(server.requests) == 11
+    assert elapsed >= 0.45
+
+
+def test_max_in_flight_caps_concurrent_requests(body):
+    with StubServer(body, delay=0.05) as server:
+        scheduler(server, max_in_flight=3).fetch_many(jobs(12))
+
+    assert len(server.requests) == 12
+    assert server.peak <= 3
+
+
+def test_retry_honours_retry_after(body):
+    def respond(symbol, attempt):
+        return (429, {'Retry-After': '0.3'}) if attempt == 0 else (200, {})
+
+    with StubServer(body, respond) as server:
+        fetch = scheduler(server)
+        results = fetch.fetch_many(jobs(1))
+
+    first, second = server.times('S00')
+    assert second - first >= 0.3
+    assert results['S00'] is not None and results['S00'] is not FAILED
+    assert fetch.stats['retries'] == 1
+
+
+def test_backoff_delay_is_capped():
+    fetch = FetchScheduler(backend='chart', backoff=1.0, max_backoff=2.0)
+    assert all(fetch._delay(10) <= 2.0 for _ in range(50))
+    assert fetch._delay(0, retry_after=60) == 2.0
+
+
+def test_missing_symbol_is_none_and_exhausted_retries_are_failed(body):
+    def respond(symbol, attempt):
+        return {'S00': (404, {}), 'S01': (500, {})}.get(symbol, (200, {}))
+
+    received = {}
+    with StubServer(body, respond) as server:
+        results = scheduler(server, retries=2).fetch_many(jobs(3), on_result=received.__setitem__)
+
+    assert results['S00'] is None
+    assert results['S01'] is FAILED
+    assert results['S02'] is not None and results['S02'] is not FAILED
+    assert len(server.times('S01')) == 3
+    assert received.keys() == results.keys()
+
+
+def test_circuit_breaker_opens_and_short_circuits(body):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    with StubServer(body, lambda symbol, attempt: (503, {})) as server:
+        fetch = scheduler(server, max_in_flight=1, retries=0, breaker=breaker)
+        results = fetch.fetch_many(jobs(10))
+
+    assert breaker.state == 'open'
+    assert len(server.requests) == 3
+    assert fetch.stats['short_circuited'] == 7
+    assert all(data is FAILED for data in results.values())
+
+
+def test_circuit_breaker_half_open_lets_one_probe_through(body):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+
+    time.sleep(0.25)
+    assert breaker.allow()
+    assert breaker.state == 'half_open'
+    assert not breaker.allow()
+
+    # La prueba falla: vuelve a abrirse sin esperar a otro umbral de fallos
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+
+    time.sleep(0.25)
+    with StubServer(body) as server:
+        results = scheduler(server, max_in_flight=1, breaker=breaker).fetch_many(jobs(3))
+
+    assert breaker.state == 'closed'
+    assert len(server.requests) == 3
+    assert all(data is not FAILED for data in results.values())
+
+
+def test_chart_params_for_period_and_start():
+    assert fetcher.chart_params(fetch_params(period='1y'))['range'] == '1y'
+    query = fetcher.chart_params(fetch_params(start='2024-01-02', interval='1h'))
+    assert query['period1'] == int(pd.Timestamp('2024-01-02', tz='UTC').timestamp())
+    assert query['interval'] == '1h' and 'range' not in query
+
+
+class FakeTicker:
+    calls = []
+    errors = []
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    def history(self, **kwargs):
+        FakeTicker.calls.append((self.symbol, kwargs))
+        if FakeTicker.errors:
+            raise FakeTicker.errors.pop(0)
+        return FakeTicker.data
+
+
+def test_yfinance_backend_is_the_default_and_retries_rate_limits(monkeypatch, daily):
+    class YFRateLimitError(Exception):
+        pass
+
+    class YFPricesMissingError(Exception):
+        pass
+
+    FakeTicker.calls = []
+    FakeTicker.errors = [YFRateLimitError("Too Many Requests")]
+    FakeTicker.data = daily.assign(Dividends=0.0)
+    monkeypatch.setattr(fetcher, '_yfinance', lambda: type('yf', (), {'Ticker': FakeTicker}))
+
+    fetch = FetchScheduler(backoff=0.01)
+    assert fetch.backend == 'yfinance' and fetch.session is None
+    results = fetch.fetch_many({'AAA': fetch_params(start='2024-06-01')})
+
+    assert fetch.stats['retries'] == 1
+    assert list(results['AAA'].columns) == ['Open', 'High', 'Low', 'Close', 'Volume']
+    assert FakeTicker.calls[-1][1] == {
+        'interval': '1d', 'auto_adjust': True, 'start': pd.Timestamp('2024-06-01', tz='UTC')
+    }
+
+    FakeTicker.errors = [YFPricesMissingError("possibly delisted")]
+    assert fetch.fetch_many({'ZZZ': fetch_params(period='6mo')})['ZZZ'] is None
+    assert FakeTicker.calls[-1][1]['period'] == '6mo'
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        FetchScheduler(backend='csv')
+
+
+class FakeYFinance:
+    """yfinance falso: ``download`` devuelve las series de ``data`` agrupadas por símbolo"""
+
+    def __init__(self, data, errors=()):
+        self.data = data
+        self.errors = list(errors)
+        self.downloads = []
+        self.Ticker = FakeTicker
+
+    def download(self, symbols, **kwargs):
+        self.downloads.append((list(symbols), kwargs))
+        if self.errors:
+            raise self.errors.pop(0)
+        frames = {symbol: self.data.assign(Dividends=0.0) for symbol in symbols if not symbol.startswith('X')}
+        return pd.concat(frames, axis=1) if frames else pd.DataFrame()
+
+
+def test_yfinance_backend_downloads_batches_with_the_same_params(monkeypatch, daily):
+    class YFPricesMissingError(Exception):
+        pass
+
+    class DelistedTicker(FakeTicker):
+        def history(self, **kwargs):
+            if self.symbol.startswith('X'):
+                FakeTicker.calls.append((self.symbol, kwargs))
+                raise YFPricesMissingError("possibly delisted")
+            return super().history(**kwargs)
+
+    fake = FakeYFinance(daily, errors=[RuntimeError("Too Many Requests")])
+    fake.Ticker = DelistedTicker
+    FakeTicker.calls = []
+    FakeTicker.errors = []
+    FakeTicker.data = daily
+    monkeypatch.setattr(fetcher, '_yfinance', lambda: fake)
+
+    jobs = {f'S{i:02d}': fetch_params(period='6mo') for i in range(5)}
+    jobs['XNONE'] = fetch_params(period='6mo')
+    jobs['NEW'] = fetch_params(start='2024-06-01')
+    received = []
+    fetch = FetchScheduler(backoff=0.01, batch_size=4)
+    results = fetch.fetch_many(jobs, on_result=lambda symbol, data: received.append(symbol))
+
+    # Un lote falla y se reintenta entero; el símbolo que no viene se pide solo
+    batches = sorted(tuple(symbols) for symbols, _ in fake.downloads)
+    assert batches == [('S00', 'S01', 'S02', 'S03')] * 2 + [('S04', 'XNONE')]
+    assert fake.downloads[0][1]['group_by'] == 'ticker' and fake.downloads[0][1]['period'] == '6mo'
+    assert sorted(call[0] for call in FakeTicker.calls) == ['NEW', 'XNONE']
+    assert fetch.stats['retries'] == 1
+    assert results['XNONE'] is None
+    assert list(results['S03'].columns) == ['Open', 'High', 'Low', 'Close', 'Volume']
+    assert sorted(received) == sorted(jobs) and list(results) == list(jobs)
+
+
+def test_a_batch_spends_one_token_per_symbol():
+    async def spend():
+        bucket = TokenBucket(rate=100.0, capacity=1)
+        await bucket.acquire(10)
+        started = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started
+
+    # La deuda del lote (9 tokens) más el token siguiente: 0,1 s a 100 por segundo
+    assert asyncio.run(spend()) >= 0.09
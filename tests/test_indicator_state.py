@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from indicator_state import IndicatorState, load_states, save_states
+from indicators import INDICATOR_COLUMNS, Panel, compute_indicators
+from price_cache import PriceCache, period_start
+from uptrend_core import UptrendAnalyzer
+
+
+def last_row(data):
+    panel = compute_indicators(Panel.from_frames({'TEST': data}))
+    return {name: panel[name][-1, 0] for name in INDICATOR_COLUMNS}
+
+
+def assert_matches(values, expected):
+    for name in INDICATOR_COLUMNS:
+        np.testing.assert_allclose(values[name], expected[name], rtol=1e-7, err_msg=name)
+
+
+def test_state_matches_vectorized_indicators(daily):
+    assert_matches(IndicatorState.from_frame(daily).values(), last_row(daily))
+
+
+def test_open_bar_can_be_revised(daily):
+    state = IndicatorState.from_frame(daily.iloc[:-1])
+    revised = daily.iloc[-1].copy()
+    state.update(daily.index[-1], *(revised * 1.05))
+    state.update(daily.index[-1], *daily.iloc[-1])
+    assert_matches(state.values(), last_row(daily))
+    with pytest.raises(ValueError):
+        state.update(daily.index[-2], *daily.iloc[-2])
+
+
+def test_states_survive_a_restart(daily, tmp_path):
+    path = str(tmp_path / 'states.json')
+    save_states(path, {'TEST': IndicatorState.from_frame(daily.iloc[:-5])})
+    state = load_states(path)['TEST']
+    for ts, row in daily.iloc[-5:].iterrows():
+        state.update(ts, *row)
+    assert_matches(state.values(), last_row(daily))
+
+
+class FakeScheduler:
+    """Planificador de descargas que sirve desde ``remote`` las barras pedidas"""
+
+    def __init__(self, remote):
+        self.remote = remote
+        self.requests = []
+
+    def fetch_many(self, jobs, on_result=None):
+        results = {}
+        for symbol, params in jobs.items():
+            self.requests.append((symbol, params))
+            data = self.remote[symbol]
+            data = data[data.index >= params['start'].tz_localize(None)] if 'start' in params else data
+            results[symbol] = data
+            if on_result is not None:
+                on_result(symbol, data)
+        return results
+
+
+def test_analyze_live_feeds_only_new_bars(market, tmp_path, monkeypatch):
+    daily = market.frame('TEST', market.dates('1y'))
+    remote = {'TEST': daily.iloc[:-3]}
+    scheduler = FakeScheduler(remote)
+    analyzer = UptrendAnalyzer(fetcher=scheduler)
+    analyzer.price_cache = PriceCache(str(tmp_path / 'prices.sqlite'))
+    analyzer.indicator_states_path = str(tmp_path / 'states.json')
+    analyzer.price_cache.replace('TEST', remote['TEST'], period='1y')
+
+    first = analyzer.analyze_live(['TEST'], period='6mo')['TEST']
+    remote['TEST'] = daily
+
+    # La segunda vez no se lee la serie completa: solo las barras posteriores al estado
+    loaded = []
+    load = analyzer.price_cache.load
+
+    def counted(*args, **kwargs):
+        data = load(*args, **kwargs)
+        loaded.append(len(data))
+        return data
+
+    monkeypatch.setattr(analyzer.price_cache, 'load', counted)
+    second = analyzer.analyze_live(['TEST'], period='6mo')['TEST']
+
+    assert loaded and max(loaded) < 15
+    assert second.price == pytest.approx(daily['Close'].iloc[-1])
+    assert first.price == pytest.approx(daily['Close'].iloc[-4])
+    state = analyzer.indicator_states['TEST']
+    assert state.last_ts == daily.index[-1]
+    # Igual que reconstruirlo con la ventana de la primera vez más las barras nuevas
+    rebuilt = IndicatorState.from_frame(daily[daily.index >= period_start('6mo')])
+    assert state.values()['bars'] == rebuilt.values()['bars']
+    assert_matches(state.values(), rebuilt.values())
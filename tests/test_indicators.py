@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import INDICATOR_COLUMNS, Panel, compute_indicators
+
+ta = pytest.importorskip('ta')
+
+
+def ta_indicators(data):
+    """Los mismos indicadores calculados con ``ta`` (como ``calculate_indicators``)"""
+    close = data['Close']
+    bollinger = ta.volatility.BollingerBands(close)
+    return pd.DataFrame({
+        'SMA_20': ta.trend.sma_indicator(close, window=20),
+        'SMA_50': ta.trend.sma_indicator(close, window=50),
+        'EMA_12': ta.trend.ema_indicator(close, window=12),
+        'EMA_26': ta.trend.ema_indicator(close, window=26),
+        'MACD': ta.trend.macd_diff(close),
+        'MACD_Signal': ta.trend.macd_signal(close),
+        'RSI': ta.momentum.rsi(close, window=14),
+        'BB_High': bollinger.bollinger_hband(),
+        'BB_Low': bollinger.bollinger_lband(),
+        'BB_Mid': bollinger.bollinger_mavg(),
+        'ADX': ta.trend.adx(data['High'], data['Low'], close),
+        'Volume_SMA': data['Volume'].rolling(window=20).mean(),
+    }, index=data.index)
+
+
+def assert_matches_ta(frame, data):
+    expected = ta_indicators(data)
+    for column in INDICATOR_COLUMNS:
+        np.testing.assert_allclose(
+            frame[column].to_numpy(dtype='float64'), expected[column].to_numpy(dtype='float64'),
+            rtol=1e-7, atol=1e-7, equal_nan=True, err_msg=column
+        )
+
+
+def test_panel_matches_ta(daily):
+    panel = compute_indicators(Panel.from_frames({'TEST': daily}))
+    assert_matches_ta(panel.to_frames()['TEST'], daily)
+
+
+def test_misaligned_histories_are_computed_on_their_own_bars(market):
+    stock = market.frame('STOCK', market.dates('1y', end='2024-06-28'))
+    crypto_dates = pd.date_range(end='2024-06-28', periods=300, freq='D')
+    crypto = market.frame('CRYPTO', crypto_dates)
+    short = market.frame('NEW', stock.index[-20:])
+
+    frames = compute_indicators(Panel.from_frames({'STOCK': stock, 'CRYPTO': crypto, 'NEW': short})).to_frames()
+
+    assert_matches_ta(frames['STOCK'].loc[stock.index], stock)
+    assert_matches_ta(frames['CRYPTO'].loc[crypto.index], crypto)
+    # Con menos de 2 × 14 barras propias no hay ADX (``ta`` falla), pero sí el resto
+    new = frames['NEW'].loc[short.index]
+    assert new['ADX'].isna().all()
+    expected = ta.trend.sma_indicator(short['Close'], window=20)
+    np.testing.assert_allclose(new['SMA_20'].to_numpy(), expected.to_numpy(), equal_nan=True)
+    assert not np.isnan(new['SMA_20'].iloc[-1])
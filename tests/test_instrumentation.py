@@ -0,0 +1,30 @@
+from instrumentation import Metrics
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics(enabled=False)
+    with metrics.stage('fetch', 'AAA'):
+        pass
+    metrics.count('cache.hits')
+    assert metrics.snapshot()['stages'] == {} and metrics.snapshot()['counters'] == {}
+
+
+def test_stages_counters_and_hit_rates():
+    metrics = Metrics(enabled=True)
+    for seconds in (0.002, 0.004, 0.2):
+        metrics.observe('indicators', seconds, 'AAA')
+    metrics.observe('indicators', 0.01, 'BBB')
+    metrics.count('cache.hits', 3)
+    metrics.count('cache.misses')
+
+    snapshot = metrics.snapshot()
+    stats = snapshot['stages']['indicators']
+    assert stats['count'] == 4
+    assert stats['max_seconds'] == 0.2
+    assert stats['slowest_symbols'][0]['symbol'] == 'AAA'
+    assert sum(stats['histogram'].values()) == 4
+    assert snapshot['hit_rates'] == {'cache': 0.75}
+
+    text = metrics.to_prometheus()
+    assert 'uptrend_stage_seconds_count{stage="indicators"} 4' in text
+    assert 'uptrend_stage_seconds_bucket{stage="indicators",le="+Inf"} 4' in text
@@ -0,0 +1,28 @@
+import pandas as pd
+import pytest
+
+from optimize import DEFAULT_PARAMETERS, grid_candidates, run_sweep
+
+
+@pytest.fixture(scope='module')
+def frames():
+    from synthetic import SyntheticMarket
+    market = SyntheticMarket(seed=5)
+    return market.frames([f'S{i}' for i in range(12)], market.dates('2y', end='2024-06-28'))
+
+
+def test_grid_skips_invalid_combinations():
+    candidates = grid_candidates({'sma_fast': (20, 60), 'threshold': (50, 60)})
+    assert len(candidates) == 2
+    assert all(c['sma_fast'] == 20 for c in candidates)
+
+
+def test_parallel_sweep_matches_serial(frames):
+    candidates = grid_candidates({'sma_fast': (10, 20), 'threshold': (50, 70)})
+    serial = run_sweep(frames, candidates, horizons=(5,), min_signals=0, chunk_size=4, workers=1)
+    parallel = run_sweep(frames, candidates, horizons=(5,), min_signals=0, chunk_size=4, workers=2)
+
+    pd.testing.assert_frame_equal(parallel, serial)
+    assert serial['default'].sum() == 1
+    default = serial[serial['default']].iloc[0]
+    assert all(default[name] == value for name, value in DEFAULT_PARAMETERS.items())
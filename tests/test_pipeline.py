@@ -0,0 +1,88 @@
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import pytest
+
+import pipeline
+from fetcher import FAILED
+from pipeline import ScanPipeline
+from uptrend_core import UptrendAnalyzer
+
+
+class UnreachableScheduler:
+    """Planificador sin conexión: todas las descargas fallan"""
+
+    def fetch_many(self, jobs, on_result=None):
+        for symbol in jobs:
+            if on_result is not None:
+                on_result(symbol, FAILED)
+        return dict.fromkeys(jobs, FAILED)
+
+
+def test_download_warnings_reach_notify_on_the_consumer_thread():
+    received = []
+
+    def notify(level, message):
+        received.append((level, threading.current_thread()))
+
+    analyzer = UptrendAnalyzer(demo_mode=True, notify=notify, fetcher=UnreachableScheduler())
+    results = {}
+    for ready in ScanPipeline(analyzer, workers=1).run(['AAA', 'BBB']):
+        results.update(ready)
+
+    assert set(results) == {'AAA', 'BBB'}
+    assert received == [('warning', threading.current_thread())]
+    # El analizador no se modifica: puede compartirse entre escaneos simultáneos
+    assert analyzer.notify is notify
+
+
+def test_concurrent_pipelines_share_an_analyzer():
+    analyzer = UptrendAnalyzer(demo_mode=True, notify=lambda level, message: None,
+                               fetcher=UnreachableScheduler())
+    notify = analyzer.notify
+    first = ScanPipeline(analyzer, workers=1).run(['AAA', 'BBB'])
+    second = ScanPipeline(analyzer, workers=1).run(['CCC'])
+
+    # Los dos generadores se intercalan; el que termina antes no restaura un notify ajeno
+    results = dict(next(first))
+    for ready in second:
+        results.update(ready)
+    assert analyzer.notify is notify
+    for ready in first:
+        results.update(ready)
+
+    assert set(results) == {'AAA', 'BBB', 'CCC'}
+    assert analyzer.notify is notify
+
+
+class BrokenPool:
+    """Pool cuyos procesos han muerto: ``submit`` falla siempre"""
+
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool("un proceso del pool terminó de forma abrupta")
+
+
+def test_broken_pool_falls_back_without_leaking_shared_memory(monkeypatch):
+    created = []
+
+    class RecordingArray(pipeline.SharedArray):
+        def __init__(self, shape, name=None):
+            super().__init__(shape, name)
+            created.append(self.name)
+
+    monkeypatch.setattr(pipeline, 'SharedArray', RecordingArray)
+    monkeypatch.setattr(pipeline, '_executor', lambda workers: BrokenPool())
+    analyzer = UptrendAnalyzer(demo_mode=True, notify=lambda level, message: None,
+                               fetcher=UnreachableScheduler())
+
+    results = {}
+    for ready in ScanPipeline(analyzer, workers=2, chunk_size=2).run(['AAA', 'BBB', 'CCC']):
+        results.update(ready)
+
+    # Se calcula en este proceso y los bloques creados para el pool ya no existen
+    assert set(results) == {'AAA', 'BBB', 'CCC'}
+    assert created
+    for name in created:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
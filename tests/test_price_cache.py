@@ -0,0 +1,61 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from price_cache import PriceCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PriceCache(str(tmp_path / 'prices.sqlite'))
+
+
+def test_replace_and_load_roundtrip(cache, daily):
+    cache.replace('TEST', daily, period='1y')
+    loaded = cache.load('TEST')
+    assert list(loaded.index) == list(daily.index)
+    np.testing.assert_allclose(loaded['Close'], daily['Close'])
+    np.testing.assert_array_equal(loaded['Volume'], daily['Volume'])
+
+
+def test_replace_drops_previous_history(cache, daily):
+    cache.replace('TEST', daily, period='1y')
+    cache.replace('TEST', daily.iloc[-30:], period='1mo')
+    assert list(cache.load('TEST').index) == list(daily.index[-30:])
+
+
+def test_replace_is_atomic(cache, daily):
+    cache.replace('TEST', daily, period='1y')
+    # Un fallo a mitad de las inserciones deshace también el borrado: la serie no queda vacía
+    conn = sqlite3.connect(cache.path)
+    conn.execute("CREATE TRIGGER fail BEFORE INSERT ON bars WHEN NEW.close < 0 "
+                 "BEGIN SELECT RAISE(ABORT, 'fallo'); END")
+    conn.commit()
+    broken = daily.iloc[-30:].copy()
+    broken.iloc[-1, broken.columns.get_loc('Close')] = -1.0
+    with pytest.raises(sqlite3.DatabaseError):
+        cache.replace('TEST', broken, period='1mo')
+    assert len(cache.load('TEST')) == len(daily)
+
+
+def test_merge_appends_new_bars(cache, daily):
+    cache.replace('TEST', daily.iloc[:-10], period='1y')
+    assert cache.merge('TEST', daily.iloc[-15:])
+    loaded = cache.load('TEST')
+    assert list(loaded.index) == list(daily.index)
+    np.testing.assert_allclose(loaded['Close'], daily['Close'])
+
+
+def test_merge_rejects_adjusted_overlap(cache, daily):
+    cache.replace('TEST', daily.iloc[:-10], period='1y')
+    adjusted = daily.iloc[-15:].copy()
+    adjusted[['Open', 'High', 'Low', 'Close']] *= 0.5
+    assert not cache.merge('TEST', adjusted)
+    assert len(cache.load('TEST')) == len(daily) - 10
+
+
+def test_fetch_start_overlaps_last_bars(cache, daily):
+    assert cache.fetch_start('TEST', '6mo') is None
+    cache.replace('TEST', daily, period='1y')
+    assert cache.fetch_start('TEST', '6mo') == daily.index[-cache.overlap_bars]
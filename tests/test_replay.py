@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import Panel, compute_indicators
+from replay import BREADTH_TOTAL, ReplayPanel
+from scan_result import FEATURE_COLUMNS
+from uptrend_core import UptrendAnalyzer
+
+CATEGORIES = {'a': ['AAA', 'BBB', 'NEW'], 'b': ['BBB', 'CCC']}
+
+
+@pytest.fixture
+def frames(market):
+    dates = market.dates('1y', end='2024-06-28')
+    frames = {symbol: market.frame(symbol, dates) for symbol in ['AAA', 'BBB', 'CCC']}
+    # Salida a bolsa a mitad del periodo
+    frames['NEW'] = market.frame('NEW', dates[150:])
+    return frames
+
+
+@pytest.fixture
+def replay(frames):
+    return ReplayPanel(compute_indicators(Panel.from_frames(frames)), CATEGORIES)
+
+
+@pytest.mark.parametrize('date', ['2023-09-29', '2024-01-12', '2024-02-07', '2024-06-28'])
+def test_replay_matches_a_live_scan_of_the_data_up_to_that_date(replay, frames, date):
+    analyzer = UptrendAnalyzer()
+    live = analyzer.analyze_frames({symbol: data.loc[:date] for symbol, data in frames.items()
+                                    if len(data.loc[:date]) >= 2})
+    replayed = replay.at(date)
+
+    assert [(r.category, r.symbol) for r in replayed] == [
+        (category, symbol) for category, symbols in CATEGORIES.items() for symbol in symbols if symbol in live
+    ]
+    for result in replayed:
+        expected = live[result.symbol]
+        assert (result.score, result.signal_mask, result.uptrend_days) == (
+            expected.score, expected.signal_mask, expected.uptrend_days
+        )
+        assert result.price == pytest.approx(expected.price)
+        assert result.change_pct == pytest.approx(expected.change_pct)
+        np.testing.assert_allclose(result.features, expected.features, rtol=1e-9, equal_nan=True)
+
+
+def test_dates_without_a_bar_use_the_last_one(replay):
+    friday, saturday = replay.at('2024-06-28'), replay.at('2024-06-29')
+    assert saturday == friday
+    assert replay.at('2000-01-01') == []
+
+
+def test_breadth_counts_only_listed_symbols(replay):
+    before_listing = replay.breadth.loc[replay.dates[100]]
+    uptrend = {r.symbol: r.is_uptrend for r in replay.at(replay.dates[100])}
+
+    assert before_listing['a'] == pytest.approx(np.mean([uptrend['AAA'], uptrend['BBB']]))
+    assert before_listing[BREADTH_TOTAL] == pytest.approx(np.mean(list(uptrend.values())))
+    assert list(replay.breadth.columns) == ['a', 'b', BREADTH_TOTAL]
+    assert isinstance(replay.breadth.index, pd.DatetimeIndex)
+
+
+def test_a_six_month_live_scan_differs_only_in_recursive_indicators(replay, frames):
+    date = '2024-06-28'
+    live = UptrendAnalyzer().analyze_frames({symbol: data.loc['2023-12-28':date] for symbol, data in frames.items()})
+    for result in replay.at(date, {'all': ['AAA', 'BBB', 'CCC']}):
+        replayed = dict(zip(FEATURE_COLUMNS, result.features))
+        expected = dict(zip(FEATURE_COLUMNS, live[result.symbol].features))
+        # Las ventanas simples solo miran las últimas barras; EMA, MACD, RSI y ADX dependen del arranque
+        for name in ['SMA_20', 'SMA_50', 'BB_High', 'BB_Low', 'Volume_SMA']:
+            assert replayed[name] == pytest.approx(expected[name], rel=1e-9)
+        assert replayed['EMA_12'] == pytest.approx(expected['EMA_12'], rel=1e-3)
@@ -0,0 +1,148 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from indicator_state import IndicatorState
+from rescan import EventLog, Rescanner, RescanState, post_webhook, series_fingerprint, state_fingerprint
+from uptrend_core import UptrendAnalyzer
+
+
+class WebhookServer:
+    """Servidor local que guarda el JSON de cada POST y responde con ``status``"""
+
+    def __init__(self, status=200):
+        self.status = status
+        self.payloads = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers['Content-Length'])
+                server.payloads.append(json.loads(self.rfile.read(length)))
+                self.send_response(server.status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/hook'
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class OfflineScheduler:
+    def fetch_many(self, jobs, on_result=None):
+        for symbol in jobs:
+            if on_result is not None:
+                on_result(symbol, None)
+        return dict.fromkeys(jobs)
+
+
+def test_series_fingerprint_covers_the_whole_series(daily):
+    fingerprint = series_fingerprint(daily)
+    assert series_fingerprint(daily.copy()) == fingerprint
+
+    # Un ajuste retroactivo cambia barras antiguas y deja la última igual
+    adjusted = daily.copy()
+    adjusted.iloc[:100, adjusted.columns.get_loc('Close')] *= 0.5
+    assert series_fingerprint(adjusted)[0] == fingerprint[0]
+    assert series_fingerprint(adjusted) != fingerprint
+
+    # La misma última barra con otra historia (menos barras) también cambia la huella
+    assert series_fingerprint(daily.iloc[10:]) != fingerprint
+
+
+def test_state_fingerprint_follows_the_history(daily):
+    state = IndicatorState.from_frame(daily)
+    adjusted = daily.copy()
+    adjusted.iloc[:100, adjusted.columns.get_loc('Close')] *= 0.5
+
+    assert state_fingerprint(IndicatorState.from_frame(daily)) == state_fingerprint(state)
+    assert state_fingerprint(IndicatorState.from_frame(adjusted)) != state_fingerprint(state)
+    assert state_fingerprint(state)[1] == len(daily)
+
+
+def test_event_log_only_appends(tmp_path):
+    log = EventLog(str(tmp_path / 'events.jsonl'))
+    assert log.read() == []
+    log.append([{'symbol': 'AAA', 'event': 'uptrend_started'}])
+    log.append([])
+    log.append([{'symbol': 'BBB', 'event': 'uptrend_ended'}, {'symbol': 'CCC', 'event': 'uptrend_ended'}])
+
+    assert [e['symbol'] for e in log.read()] == ['AAA', 'BBB', 'CCC']
+    assert [e['symbol'] for e in log.read(limit=2)] == ['BBB', 'CCC']
+    with open(log.path) as f:
+        assert len(f.readlines()) == 3
+
+
+def test_post_webhook_sends_json_and_reports_failures():
+    with WebhookServer() as server:
+        assert post_webhook(server.url, {'events': [1, 2]})
+    assert server.payloads == [{'events': [1, 2]}]
+
+    with WebhookServer(status=500) as server:
+        assert not post_webhook(server.url, {'events': []})
+
+    # Nadie escucha en el puerto: no se lanza la excepción
+    assert not post_webhook(server.url, {'events': []}, timeout=1.0)
+
+
+@pytest.fixture
+def analyzer():
+    return UptrendAnalyzer(demo_mode=True, fetcher=OfflineScheduler())
+
+
+def test_rescan_reuses_unchanged_series_and_reports_transitions(analyzer, tmp_path):
+    categories = {'demo': ['AAA', 'BBB', 'CCC', 'DDD']}
+    log = EventLog(str(tmp_path / 'events.jsonl'))
+    with WebhookServer() as server:
+        rescanner = Rescanner(analyzer, state_dir=str(tmp_path), events=log, webhook=server.url, workers=1)
+
+        first = rescanner.run(categories)
+        assert first['analyzed'] == 4 and first['events'] == []
+
+        second = rescanner.run(categories)
+        assert second['reused'] == 4 and second['analyzed'] == 0
+
+        # Estado anterior con score 0 y otra huella: se recalcula y cada cruce genera un evento
+        state = RescanState.load(rescanner.state_path('6mo'))
+        for symbol, (fingerprint, result) in state.entries.items():
+            result.score = 0
+            state.entries[symbol] = ([0, 0, 0], result)
+        state.save()
+        third = rescanner.run(categories)
+
+    scores = {r.symbol: r.score for r in third['results']}
+    expected = sum((score >= 40) + (score >= 80) + (score >= 60) for score in scores.values())
+    assert third['analyzed'] == 4
+    assert len(third['events']) == expected
+    assert log.read() == third['events']
+    if expected:
+        assert server.payloads[-1]['events'] == third['events']
+    else:
+        assert server.payloads == []
+
+
+def test_live_and_full_modes_keep_separate_baselines(analyzer, tmp_path):
+    categories = {'demo': ['AAA', 'BBB']}
+    full = Rescanner(analyzer, state_dir=str(tmp_path), events=EventLog(str(tmp_path / 'events.jsonl')), workers=1)
+    live = Rescanner(analyzer, state_dir=str(tmp_path), events=EventLog(str(tmp_path / 'events.jsonl')),
+                     workers=1, live=True)
+    assert full.state_path('6mo') != live.state_path('6mo')
+
+    assert full.run(categories)['analyzed'] == 2
+    assert live.run(categories)['events'] == []
+    # Volver al modo completo reutiliza su referencia: el modo en vivo no la ha sobrescrito
+    assert full.run(categories)['reused'] == 2
+    assert live.run(categories)['reused'] == 2
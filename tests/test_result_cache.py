@@ -0,0 +1,32 @@
+import result_cache
+from result_cache import MISSING, TTLCache
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, 'monotonic', lambda: now[0])
+    cache = TTLCache(ttl=60)
+
+    cache.set('k', 1)
+    now[0] += 59
+    assert cache.get('k') == 1
+    now[0] += 2
+    assert cache.get('k') is MISSING
+    assert len(cache) == 0
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get('b') is MISSING
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_default_ttl_is_a_server_setting():
+    assert TTLCache().ttl == result_cache.DEFAULT_TTL
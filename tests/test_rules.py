@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+import scoring
+from indicators import Panel, compute_indicators
+from rules import BUILTIN_RULES, RuleSet
+from scoring import bar_numbers, score_arrays
+from uptrend_core import UptrendAnalyzer
+
+
+@pytest.fixture
+def panel(market):
+    dates = market.dates('1y')
+    frames = {symbol: market.frame(symbol, dates) for symbol in ['AAA', 'BBB', 'CCC', 'DDD']}
+    return compute_indicators(Panel.from_frames(frames))
+
+
+@pytest.fixture
+def results(panel):
+    analyzer = UptrendAnalyzer(demo_mode=True)
+    return list(analyzer.analyze_panel(panel).values())
+
+
+def custom_rules(weights=None):
+    data = RuleSet.builtin().to_dict()
+    data['rules'] = [dict(rule, name=f'mi_{rule["name"]}') for rule in data['rules']][::-1]
+    for rule, weight in zip(data['rules'], weights or []):
+        rule['weight'] = weight
+    return RuleSet.from_dict(data)
+
+
+def test_builtin_rules_match_the_builtin_scoring(panel):
+    bars = bar_numbers(panel['Close'])
+    expected_signals, expected_score = score_arrays(panel.columns, bars)
+    signals, score = RuleSet.builtin().evaluate(panel.columns, bars)
+
+    np.testing.assert_array_equal(score, expected_score)
+    for name in scoring.SIGNAL_NAMES:
+        np.testing.assert_array_equal(signals[name], expected_signals[name])
+
+
+def test_rescoring_with_the_builtin_rules_changes_nothing(results):
+    assert RuleSet.builtin().rescore(results) == results
+
+
+def test_custom_rules_carry_their_own_signal_bits(results):
+    bits = dict(scoring.SIGNAL_BITS)
+    rescored = custom_rules().rescore(results)
+
+    assert scoring.SIGNAL_BITS == bits
+    for before, after in zip(results, rescored):
+        assert after.score == before.score
+        assert after.signals == {f'mi_{name}': True for name in before.signals}
+        assert after.in_category('x').signals == after.signals
+
+
+def test_scores_are_scaled_when_weights_exceed_100(results):
+    rules = custom_rules([50] * len(BUILTIN_RULES['rules']))
+    assert rules.total_weight == 350
+
+    rescored = rules.rescore(results)
+    assert all(0 <= r.score <= 100 for r in rescored)
+    active = [len(r.signals) for r in rescored]
+    assert [r.score for r in rescored] == [round(n * 50 * 100 / 350) for n in active]
+
+
+def test_invalid_rule_sets_are_rejected():
+    data = RuleSet.builtin().to_dict()
+    data['rules'][0]['weight'] = -5
+    with pytest.raises(ValueError):
+        RuleSet.from_dict(data)
+
+    data = RuleSet.builtin().to_dict()
+    data['rules'][1]['conditions'][0]['expression'] = '__import__("os")'
+    with pytest.raises(ValueError):
+        RuleSet.from_dict(data)
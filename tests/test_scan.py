@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+
+import fetcher
+import uptrend_scan
+from uptrend_core import UptrendAnalyzer
+
+
+def test_headless_entry_point_does_not_import_heavy_dependencies():
+    code = (
+        "import sys, uptrend_scan; "
+        "print(','.join(m for m in ('requests', 'urllib3', 'yfinance', 'ta', 'streamlit', 'plotly', 'fetcher') "
+        "if m in sys.modules))"
+    )
+    loaded = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(uptrend_scan.__file__)))
+    assert loaded.stdout.strip() == ''
+
+
+def test_backend_choices_match_the_fetcher():
+    assert uptrend_scan.FETCH_BACKENDS == fetcher.BACKENDS
+
+
+def test_scheduler_is_built_on_first_download_with_the_cli_options():
+    analyzer = UptrendAnalyzer(fetch_options={'max_in_flight': 3, 'rate': 2.0, 'backend': 'chart'})
+    assert analyzer.fetcher is None
+
+    scheduler = analyzer._fetch_scheduler()
+    assert (scheduler.max_in_flight, scheduler.rate, scheduler.backend) == (3, 2.0, 'chart')
+    assert analyzer._fetch_scheduler() is scheduler
@@ -0,0 +1,119 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from scan_result import FEATURE_COLUMNS, ScanResult
+from snapshot_service import Snapshot, SnapshotService, SnapshotStore
+
+
+def results(count=3):
+    features = np.arange(len(FEATURE_COLUMNS), dtype='float64')
+    features[3] = np.nan
+    return [
+        ScanResult(f'S{i}', 10.0 + i, 0.5 * i, 20 * i, 0b101, i or None, 'etfs', features if i else None)
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(str(tmp_path / 'snapshots'), keep=3)
+
+
+class CountingAnalyzer:
+    """Analizador de prueba: cuenta los escaneos y devuelve ``results``"""
+
+    symbols = {'etfs': ['S0', 'S1']}
+
+    def __init__(self, scan_results):
+        self.scan_results = scan_results
+        self.scans = 0
+
+    def scan(self, category_symbols, period='6mo', workers=None):
+        self.scans += 1
+        return self.scan_results
+
+
+def test_payload_round_trip_keeps_nan_features():
+    snapshot = Snapshot(7, 1234.5, results(), period='1y', elapsed=2.5)
+    # El fichero es JSON: se pasa por texto como al publicarlo
+    loaded = Snapshot.from_payload(json.loads(json.dumps(snapshot.to_payload())))
+
+    assert (loaded.version, loaded.created_at, loaded.period, loaded.elapsed) == (7, 1234.5, '1y', 2.5)
+    assert loaded.results == snapshot.results
+    assert np.isnan(loaded.get('etfs', 'S1').features[3])
+    assert loaded.get('etfs', 'S0').features is None
+    assert loaded.get('etfs', 'S2').signals == {'price_above_ma': True, 'macd_bullish': True}
+
+
+def test_publish_increments_the_version_and_moves_latest(store):
+    assert store.latest() is None
+    first = store.publish(results(), elapsed=1.0)
+    second = store.publish(results(2))
+
+    assert (first.version, second.version) == (1, 2)
+    assert store.latest_name() == 'snapshot-000002.json'
+    latest = store.latest()
+    assert latest.version == 2 and len(latest.results) == 2
+    # Otro proceso con su propio almacén lee el mismo snapshot
+    assert SnapshotStore(store.path).latest().results == latest.results
+
+
+def test_publish_prunes_to_keep_versions(store):
+    for _ in range(6):
+        store.publish(results())
+
+    kept = sorted(name for name in os.listdir(store.path) if name.startswith('snapshot-'))
+    assert kept == ['snapshot-000004.json', 'snapshot-000005.json', 'snapshot-000006.json']
+
+
+def test_concurrent_publishers_never_share_a_version(store):
+    published = []
+
+    def publish():
+        for _ in range(5):
+            published.append(SnapshotStore(store.path, keep=100).publish(results()).version)
+
+    threads = [threading.Thread(target=publish) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(published) == list(range(1, 21))
+    assert store.latest().version == 20
+
+
+def test_scan_lock_is_exclusive(store):
+    with store.scan_lock() as first:
+        with SnapshotStore(store.path).scan_lock() as second:
+            assert first and not second
+    with store.scan_lock() as again:
+        assert again
+
+
+def test_run_once_publishes_only_when_due(store):
+    analyzer = CountingAnalyzer(results())
+    service = SnapshotService(analyzer, store, interval=3600)
+
+    snapshot = service.run_once()
+    assert snapshot.version == 1 and analyzer.scans == 1
+    # El último snapshot sigue vigente: ni se escanea ni se publica
+    assert service.run_once() is None and analyzer.scans == 1
+    assert service.run_once(force=True).version == 2
+
+
+def test_run_once_skips_while_another_scan_holds_the_lock(store):
+    analyzer = CountingAnalyzer(results())
+    with store.scan_lock():
+        assert SnapshotService(analyzer, SnapshotStore(store.path)).run_once(force=True) is None
+    assert analyzer.scans == 0 and store.latest() is None
+
+
+def test_run_once_does_not_publish_empty_scans(store):
+    service = SnapshotService(CountingAnalyzer([]), store)
+    assert service.run_once() is None
+    assert store.latest() is None and not service.scanning
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from timeframes import (ANALYSIS_BARS, base_interval, enough_bars, resample, timezone_panels, trailing)
+
+AGGREGATES = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+
+
+def session_hours(start, end, tz):
+    """Barras horarias de sesión (9:30 a 15:30 locales) de los días hábiles, como las de Yahoo"""
+    days = pd.bdate_range(start, end)
+    stamps = [day + pd.Timedelta(hours=9, minutes=30) + pd.Timedelta(hours=h) for day in days for h in range(7)]
+    return pd.DatetimeIndex(stamps).tz_localize(tz)
+
+
+@pytest.fixture
+def hourly(market):
+    """Series horarias de Nueva York y Tokio, más una de Nueva York con menos historia"""
+    frames = {
+        'NYA': market.frame('NYA', session_hours('2024-03-01', '2024-06-28', 'America/New_York'), '1h'),
+        'TKY': market.frame('TKY', session_hours('2024-03-01', '2024-06-28', 'Asia/Tokyo'), '1h'),
+    }
+    frames['NYB'] = market.frame('NYB', session_hours('2024-05-01', '2024-06-28', 'America/New_York'), '1h')
+    return frames
+
+
+def column(panel, symbol):
+    """Barras de un símbolo del panel, sin las fechas de otros mercados"""
+    j = panel.symbols.index(symbol)
+    frame = pd.DataFrame({c: panel[c][:, j] for c in AGGREGATES}, index=panel.dates)
+    return frame.dropna(subset=['Close'])
+
+
+def test_base_interval_is_the_coarsest_that_fits():
+    assert base_interval(('1h', '4h', '1d')) == '1h'
+    assert base_interval(('15m', '1d')) == '15m'
+    assert base_interval(('1wk',)) == '1h'
+
+
+def test_daily_and_weekly_bars_follow_the_local_calendar(hourly):
+    groups = timezone_panels(hourly)
+    assert set(groups) == {'America/New_York', 'Asia/Tokyo'}
+
+    daily = resample(groups, '1d', '1h')
+    weekly = resample(groups, '1wk', '1h')
+    for symbol, data in hourly.items():
+        local = data.set_axis(data.index.tz_localize(None).as_unit('ns'))
+        expected = local.groupby(local.index.normalize()).agg(AGGREGATES)
+        pd.testing.assert_frame_equal(column(daily, symbol), expected, check_freq=False, check_names=False)
+
+        monday = local.index.normalize() - pd.to_timedelta(local.index.dayofweek, unit='D')
+        expected = local.groupby(monday).agg(AGGREGATES)
+        pd.testing.assert_frame_equal(column(weekly, symbol), expected, check_freq=False, check_names=False)
+
+
+def test_intraday_bars_start_at_the_first_bar_of_each_local_day(hourly):
+    groups = timezone_panels({'NYA': hourly['NYA']})
+    four_hours = column(resample(groups, '4h', '1h'), 'NYA')
+
+    # Dos barras por sesión: 9:30-13:30 (4 horarias) y 13:30-16:00 (3 horarias)
+    opens = four_hours.index.tz_localize('UTC').tz_convert('America/New_York')
+    assert set(opens.strftime('%H:%M')) == {'09:30', '13:30'}
+    assert len(four_hours) == 2 * len(set(opens.date))
+
+    local = hourly['NYA'].tz_localize(None)
+    first = local.loc['2024-06-28'].iloc[:4]
+    bar = four_hours.iloc[-2]
+    assert bar['Open'] == first['Open'].iloc[0] and bar['Close'] == first['Close'].iloc[-1]
+    assert bar['High'] == first['High'].max() and bar['Volume'] == first['Volume'].sum()
+
+
+def test_resample_rejects_targets_finer_than_the_base(hourly):
+    groups = timezone_panels(hourly)
+    with pytest.raises(ValueError):
+        resample(groups, '15m', '1h')
+    assert resample(groups, '1h', '1h').shape == (len(np.unique(np.concatenate(
+        [p.dates.asi8 for p in groups.values()]
+    ))), 3)
+
+
+def test_trailing_keeps_the_last_bars_of_every_symbol(hourly):
+    panel = resample(timezone_panels(hourly), '1h', '1h')
+    cut = trailing(panel, 100)
+
+    for symbol in panel.symbols:
+        assert len(column(cut, symbol)) >= 100
+        pd.testing.assert_frame_equal(column(cut, symbol).iloc[-100:], column(panel, symbol).iloc[-100:])
+    assert len(cut.dates) < len(panel.dates)
+    assert trailing(panel, ANALYSIS_BARS * 100).shape == panel.shape
+
+
+def test_enough_bars_needs_min_bars_per_symbol(hourly):
+    daily = resample(timezone_panels(hourly), '1d', '1h')
+    # Unos 85 días de NYA y TKY frente a unos 43 de NYB
+    assert enough_bars(daily) == {'NYA', 'TKY'}
@@ -0,0 +1,46 @@
+import numpy as np
+
+from universe import Universe, read_symbols_file
+
+
+def test_tickers_that_look_like_missing_values_are_kept(tmp_path):
+    path = tmp_path / 'odd.csv'
+    path.write_text("symbol,name\nNA,National Australia Bank\nnull,Null Inc\nNAN,Nan Corp\n\n# comentario\n AAPL ,Apple\n")
+    assert read_symbols_file(str(path)) == ['NA', 'NULL', 'NAN', 'AAPL']
+
+    text = tmp_path / 'odd.txt'
+    text.write_text("NA, aapl  # comentario\n\nNULL\n")
+    assert read_symbols_file(str(text)) == ['NA', 'AAPL', 'NULL']
+
+
+def test_membership_bitmap_has_one_row_per_unique_symbol():
+    universe = Universe({
+        'tech': ['AAPL', 'MSFT', 'NVDA', 'AAPL'],
+        'mega': ['NVDA', 'AAPL', 'BRK-B'],
+        'banks': ['JPM', 'NA'],
+    }, labels={'tech': 'Tecnología'})
+
+    assert universe.symbols.tolist() == ['AAPL', 'MSFT', 'NVDA', 'BRK-B', 'JPM', 'NA']
+    assert universe.bits.shape == (6, 1)
+    assert universe.category_symbols(['tech']) == {'tech': ['AAPL', 'MSFT', 'NVDA']}
+    assert universe.select(['tech', 'mega']) == ['AAPL', 'MSFT', 'NVDA', 'BRK-B']
+    assert universe.counts() == {'tech': 3, 'mega': 3, 'banks': 2}
+    assert universe.counts(['NVDA', 'JPM']) == {'tech': 1, 'mega': 1, 'banks': 1}
+    assert universe.categories_of('NVDA') == ['tech', 'mega'] and universe.categories_of('ZZZ') == []
+    np.testing.assert_array_equal(universe.mask(['banks']), [False] * 4 + [True] * 2)
+    assert universe.labels == {'tech': 'Tecnología', 'mega': 'mega', 'banks': 'banks'}
+
+
+def test_load_follows_the_manifest_and_rereads_changed_files(tmp_path):
+    (tmp_path / 'categories.csv').write_text("key,label,description\nbanks,Bancos,\ntech,Tecnología,Grandes\n")
+    (tmp_path / 'tech.csv').write_text("symbol\nAAPL\nMSFT\n")
+    (tmp_path / 'banks.txt').write_text("JPM\nNA\n")
+    (tmp_path / 'extra.csv').write_text("symbol\nXOM\n")
+
+    universe = Universe.load(str(tmp_path))
+    assert universe.categories == ['banks', 'tech', 'extra']
+    assert universe.category_symbols()['banks'] == ['JPM', 'NA']
+    assert Universe.load(str(tmp_path)) is universe
+
+    (tmp_path / 'extra.csv').write_text("symbol\nXOM\nCVX\n")
+    assert Universe.load(str(tmp_path)).category_symbols(['extra']) == {'extra': ['XOM', 'CVX']}
@@ -0,0 +1,183 @@
+"""Análisis en varias temporalidades a partir de una sola serie intradía.
+
+De cada símbolo se descarga (y se guarda en la caché local, de forma
+incremental) una única serie fina; las temporalidades mayores se obtienen
+remuestreándola, así que añadir temporalidades cuesta CPU pero ninguna petición.
+
+El remuestreo es vectorizado para todo el universo: los símbolos se agrupan por
+zona horaria (las barras diarias y de 4h se cortan en la hora local de cada
+mercado), cada grupo es un panel UTC (fechas × símbolos) y, con la primera fila
+de cada barra agregada, ``reduceat`` calcula a la vez apertura, máximo, mínimo,
+cierre y volumen de todas las columnas.
+"""
+import numpy as np
+import pandas as pd
+
+from indicators import OHLCV_COLUMNS, Panel
+from scoring import MIN_BARS
+
+MINUTE_NS = 60 * 10**9
+DAY_NS = 1440 * MINUTE_NS
+
+# Duración (minutos) de cada temporalidad soportada
+TIMEFRAME_MINUTES = {'15m': 15, '1h': 60, '4h': 240, '1d': 1440, '1wk': 10080}
+
+# Series base y periodo máximo que sirve Yahoo para cada una
+BASE_PERIODS = {'15m': '60d', '1h': '730d'}
+
+DEFAULT_TIMEFRAMES = ('1h', '4h', '1d', '1wk')
+
+# Barras por símbolo que se puntúan en cada temporalidad (las medias y la racha no necesitan más)
+ANALYSIS_BARS = 250
+
+
+def base_interval(timeframes):
+    """Serie base más gruesa que permite obtener todas las temporalidades pedidas"""
+    finest = min(TIMEFRAME_MINUTES[tf] for tf in timeframes)
+    candidates = [base for base in BASE_PERIODS if TIMEFRAME_MINUTES[base] <= finest]
+    if not candidates:
+        raise ValueError(f"Ninguna serie base permite la temporalidad de {finest} minutos")
+    return max(candidates, key=TIMEFRAME_MINUTES.get)
+
+
+def timezone_panels(frames):
+    """Paneles con índice UTC (naive), uno por zona horaria de los datos"""
+    groups = {}
+    for symbol, data in frames.items():
+        if data is None or data.empty:
+            continue
+        index = pd.DatetimeIndex(data.index)
+        tz = str(index.tz) if index.tz is not None else 'UTC'
+        if index.tz is not None:
+            index = index.tz_convert('UTC').tz_localize(None)
+        groups.setdefault(tz, {})[symbol] = (index.as_unit('ns').asi8, data)
+    return {tz: _utc_panel(group) for tz, group in groups.items()}
+
+
+def _utc_panel(group):
+    """Panel sobre la unión de instantes (enteros) de un grupo, sin pasar por objetos Timestamp"""
+    dates = np.unique(np.concatenate([ts for ts, _ in group.values()]))
+    symbols = list(group)
+    columns = {column: np.full((len(dates), len(symbols)), np.nan) for column in OHLCV_COLUMNS}
+    for j, (ts, data) in enumerate(group.values()):
+        rows = np.searchsorted(dates, ts)
+        values = data.reindex(columns=OHLCV_COLUMNS).to_numpy(dtype='float64')
+        for k, column in enumerate(OHLCV_COLUMNS):
+            columns[column][rows, j] = values[:, k]
+    return Panel(dates.astype('datetime64[ns]'), symbols, columns)
+
+
+def bucket_starts(dates, tz, timeframe):
+    """Primera fila de cada barra de ``timeframe`` y su etiqueta, para fechas UTC ordenadas
+
+    Diario y semanal (lunes a domingo) se cortan por la fecha local; las barras
+    intradía se cuentan desde la primera barra de cada día local (9:30-13:30 y
+    13:30-16:00 en Nueva York), como las de Yahoo.
+    """
+    local = pd.DatetimeIndex(dates).tz_localize('UTC').tz_convert(tz).tz_localize(None).asi8
+    day = local // DAY_NS
+    if timeframe == '1wk':
+        # El 1/1/1970 fue jueves: (día + 3) // 7 agrupa de lunes a domingo
+        key = (day + 3) // 7
+    elif timeframe == '1d':
+        key = day
+    else:
+        step = TIMEFRAME_MINUTES[timeframe]
+        minutes = (local - day * DAY_NS) // MINUTE_NS
+        new_day = np.r_[True, day[1:] != day[:-1]]
+        opening = minutes[new_day][np.cumsum(new_day) - 1]
+        key = day * (1440 // step + 1) + (minutes - opening) // step
+
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    if timeframe == '1wk':
+        labels = ((key[starts] * 7 - 3) * DAY_NS).astype('datetime64[ns]')
+    elif timeframe == '1d':
+        labels = (key[starts] * DAY_NS).astype('datetime64[ns]')
+    else:
+        labels = pd.DatetimeIndex(dates)[starts]
+    return starts, pd.DatetimeIndex(labels)
+
+
+def resample_panel(panel, starts, labels):
+    """Agrega las filas de ``panel`` en barras que empiezan en ``starts`` (todas las columnas a la vez)"""
+    close = panel['Close']
+    valid = ~np.isnan(close)
+    rows = np.arange(len(close))[:, None]
+    first = np.minimum.reduceat(np.where(valid, rows, len(close)), starts, axis=0)
+    last = np.maximum.reduceat(np.where(valid, rows, -1), starts, axis=0)
+    present = last >= 0
+
+    def take(values, index):
+        out = np.take_along_axis(values, np.clip(index, 0, len(values) - 1), axis=0)
+        out[~present] = np.nan
+        return out
+
+    volume = np.add.reduceat(np.nan_to_num(panel['Volume']), starts, axis=0)
+    volume[~present] = np.nan
+    return Panel(labels, panel.symbols, {
+        'Open': take(panel['Open'], first),
+        'High': np.fmax.reduceat(panel['High'], starts, axis=0),
+        'Low': np.fmin.reduceat(panel['Low'], starts, axis=0),
+        'Close': take(close, last),
+        'Volume': volume,
+    })
+
+
+def merge_panels(panels):
+    """Une paneles de símbolos distintos sobre la unión de sus fechas"""
+    panels = [p for p in panels if p.symbols]
+    if len(panels) == 1:
+        return panels[0]
+    if not panels:
+        return Panel.from_frames({})
+
+    dates = pd.DatetimeIndex(np.unique(np.concatenate([p.dates.asi8 for p in panels])).astype('datetime64[ns]'))
+    symbols = [s for p in panels for s in p.symbols]
+    columns = {column: np.full((len(dates), len(symbols)), np.nan) for column in OHLCV_COLUMNS}
+    offset = 0
+    for p in panels:
+        rows = dates.get_indexer(p.dates)
+        for column in OHLCV_COLUMNS:
+            columns[column][rows, offset:offset + len(p.symbols)] = p[column]
+        offset += len(p.symbols)
+    return Panel(dates, symbols, columns)
+
+
+def resample(groups, timeframe, base):
+    """Panel OHLCV de ``timeframe`` a partir de los paneles base por zona horaria"""
+    if TIMEFRAME_MINUTES[timeframe] < TIMEFRAME_MINUTES[base]:
+        raise ValueError(f"No se puede obtener {timeframe} a partir de barras de {base}")
+    if timeframe == base:
+        return merge_panels(groups.values())
+    return merge_panels(
+        resample_panel(panel, *bucket_starts(panel.dates, tz, timeframe))
+        for tz, panel in groups.items()
+        if len(panel.dates)
+    )
+
+
+def trailing(panel, bars=ANALYSIS_BARS):
+    """Recorta el panel a las filas que contienen las últimas ``bars`` barras de cada símbolo
+
+    Los indicadores recursivos (EMA, ADX) recorren las filas una a una: sin el
+    recorte, dos años de barras horarias costarían decenas de veces más que la
+    temporalidad diaria.
+    """
+    valid = ~np.isnan(panel['Close'])
+    from_end = np.cumsum(valid[::-1], axis=0)[::-1]
+    keep = (valid & (from_end <= bars)).any(axis=1)
+    if not keep.any():
+        return panel
+    start = int(np.argmax(keep))
+    return Panel(panel.dates[start:], panel.symbols, {c: v[start:] for c, v in panel.columns.items()})
+
+
+def enough_bars(panel):
+    """Símbolos con barras suficientes para puntuar (MIN_BARS) en el panel"""
+    counts = (~np.isnan(panel['Close'])).sum(axis=0)
+    return {symbol for symbol, n in zip(panel.symbols, counts) if n >= MIN_BARS}
+
+
+def timeframe_agreement(by_timeframe):
+    """(temporalidades en uptrend, temporalidades evaluadas) de un símbolo"""
+    return sum(r.is_uptrend for r in by_timeframe.values()), len(by_timeframe)
@@ -0,0 +1,176 @@
+"""Universos de símbolos cargados desde ficheros locales.
+
+Cada categoría es un fichero del directorio de universos (``universes/`` junto
+al código, o ``UPTREND_UNIVERSE_DIR``): CSV o Parquet con columna ``symbol``, o
+texto con un símbolo por línea. ``categories.csv`` fija el orden, la etiqueta y
+la descripción de las categorías; los ficheros que no aparecen en él se añaden
+al final con su nombre como etiqueta (basta con copiar ``russell3000.csv``).
+
+Al cargarse, las categorías se compilan en un índice de símbolos sin duplicados
+y un mapa de bits de pertenencia (símbolo × categoría, empaquetado con
+``np.packbits``): los símbolos de cualquiera de las categorías elegidas y los
+recuentos por categoría son operaciones sobre arrays, sin recorrer listas.
+"""
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+UNIVERSE_DIR = os.environ.get(
+    'UPTREND_UNIVERSE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'universes')
+)
+
+MANIFEST = 'categories.csv'
+SYMBOL_EXTENSIONS = ('.csv', '.parquet', '.txt')
+
+logger = logging.getLogger('uptrend')
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def read_symbols_file(path):
+    """Lee una lista de símbolos: CSV/Parquet con columna ``symbol`` o un símbolo por línea
+
+    Los símbolos se leen como texto tal cual: ``NA`` o ``NULL`` son tickers, no valores ausentes.
+    """
+    if path.endswith(('.csv', '.parquet')):
+        if path.endswith('.parquet'):
+            frame = pd.read_parquet(path)
+        else:
+            frame = pd.read_csv(path, comment='#', dtype=str, keep_default_na=False, na_filter=False)
+        column = 'symbol' if 'symbol' in frame.columns else frame.columns[0]
+        symbols = frame[column].dropna().astype(str).str.strip().str.upper()
+        return symbols[symbols != ''].tolist()
+
+    symbols = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                symbols.extend(s.strip().upper() for s in line.replace(',', ' ').split() if s.strip())
+    return symbols
+
+
+class Universe:
+    def __init__(self, categories, labels=None, descriptions=None):
+        """``categories``: diccionario clave -> lista de símbolos (en su orden)"""
+        self.categories = list(categories)
+        self.labels = {key: (labels or {}).get(key) or key for key in self.categories}
+        self.descriptions = {key: (descriptions or {}).get(key) or '' for key in self.categories}
+
+        # Índice sin duplicados, en orden de primera aparición
+        lengths = [len(categories[key]) for key in self.categories]
+        codes, symbols = pd.factorize(pd.Index(
+            [symbol for key in self.categories for symbol in categories[key]], dtype=object
+        ))
+        self.symbols = np.asarray(symbols, dtype=object)
+        self.position = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        # Un bit por (símbolo, categoría)
+        membership = np.zeros((len(self.symbols), len(self.categories)), dtype=bool)
+        membership[codes, np.repeat(np.arange(len(self.categories)), lengths)] = True
+        self.bits = np.packbits(membership, axis=1)
+
+        # Símbolos de cada categoría en su orden, sin repetidos dentro de la categoría
+        bounds = np.cumsum([0] + lengths)
+        self._members = {
+            key: self.symbols[pd.unique(codes[bounds[i]:bounds[i + 1]])].tolist()
+            for i, key in enumerate(self.categories)
+        }
+
+    @classmethod
+    def load(cls, path=None):
+        """Universo del directorio ``path`` (se relee solo si cambia algún fichero)"""
+        path = path or UNIVERSE_DIR
+        try:
+            names = sorted(os.listdir(path))
+        except FileNotFoundError:
+            logger.warning("No existe el directorio de universos %s", path)
+            return cls({})
+
+        stamp = []
+        for name in names:
+            info = os.stat(os.path.join(path, name))
+            stamp.append((name, info.st_mtime_ns, info.st_size))
+        with _loaded_lock:
+            cached = _loaded.get(path)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+
+        universe = cls._read(path, names)
+        with _loaded_lock:
+            _loaded[path] = (stamp, universe)
+        return universe
+
+    @classmethod
+    def _read(cls, path, names):
+        files = {
+            os.path.splitext(name)[0]: os.path.join(path, name)
+            for name in names
+            if name.endswith(SYMBOL_EXTENSIONS) and name != MANIFEST and not name.startswith('.')
+        }
+        labels, descriptions, order = {}, {}, []
+        if MANIFEST in names:
+            manifest = pd.read_csv(os.path.join(path, MANIFEST), dtype=str, keep_default_na=False)
+            for row in manifest.itertuples(index=False):
+                order.append(row.key)
+                labels[row.key] = getattr(row, 'label', '')
+                descriptions[row.key] = getattr(row, 'description', '')
+
+        categories = {}
+        for key in order + sorted(set(files) - set(order)):
+            if key not in files:
+                logger.warning("La categoría %s no tiene fichero de símbolos", key)
+                continue
+            try:
+                categories[key] = read_symbols_file(files[key])
+            except (OSError, ValueError, ImportError) as e:
+                logger.warning("No se pudo leer el universo %s: %s", files[key], e)
+        return cls(categories, labels, descriptions)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self.position
+
+    def _query(self, keys):
+        selected = np.isin(self.categories, list(keys))
+        return np.packbits(selected)
+
+    def mask(self, keys):
+        """Máscara (sobre ``symbols``) de los símbolos de cualquiera de las categorías ``keys``"""
+        if not len(self.categories):
+            return np.zeros(len(self.symbols), dtype=bool)
+        return (self.bits & self._query(keys)).any(axis=1)
+
+    def select(self, keys):
+        """Símbolos únicos de cualquiera de las categorías ``keys`` (en el orden del índice)"""
+        return self.symbols[self.mask(keys)].tolist()
+
+    def counts(self, mask=None):
+        """Símbolos por categoría, opcionalmente solo los de ``mask`` (máscara o lista de símbolos)"""
+        bits = self.bits
+        if mask is not None:
+            if not isinstance(mask, np.ndarray) or mask.dtype != bool:
+                mask = np.isin(self.symbols, list(mask))
+            bits = bits[mask]
+        totals = np.unpackbits(bits, axis=1, count=len(self.categories)).sum(axis=0)
+        return dict(zip(self.categories, totals.tolist()))
+
+    def categories_of(self, symbol):
+        """Categorías a las que pertenece un símbolo"""
+        i = self.position.get(symbol)
+        if i is None:
+            return []
+        flags = np.unpackbits(self.bits[i], count=len(self.categories)).astype(bool)
+        return [key for key, member in zip(self.categories, flags) if member]
+
+    def category_symbols(self, keys=None):
+        """Diccionario categoría -> símbolos (el formato de ``UptrendAnalyzer.scan``)"""
+        keys = self.categories if keys is None else keys
+        return {key: list(self._members[key]) for key in keys}
@@ -1,328 +1,425 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-import plotly.graph_objects as go
 import plotly.express as px
-from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor
+import time
 import warnings
-import requests
-import json
+from contextlib import nullcontext
 warnings.filterwarnings('ignore')
 
-# Instalación automática de dependencias si no están disponibles
-try:
-    import yfinance as yf
-except ImportError:
-    st.error("📦 Installing yfinance...")
-    import subprocess
-    import sys
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "yfinance"])
-    import yfinance as yf
+from charting import DOWNSAMPLERS, MAX_POINTS, THUMBNAIL_POINTS, price_figure, small_multiples
+from correlation import CLUSTER_CORRELATION, DEFAULT_LOOKBACK, cluster, cluster_summary
+from fetcher import FetchScheduler
+from instrumentation import PROFILERS, metrics, profile
+from replay import BREADTH_TOTAL
+from result_cache import TTLCache
+from rules import RuleSet
+from scoring import MIN_BARS
+from snapshot_service import SERVICE_ENABLED, SnapshotService
+from timeframes import TIMEFRAME_MINUTES, timeframe_agreement
+from uptrend_core import UptrendAnalyzer
 
-try:
-    import ta
-except ImportError:
-    st.error("📦 Installing ta...")
-    import subprocess
-    import sys
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "ta"])
-    import ta
+# Repintado de la vista parcial durante el escaneo
+UI_UPDATE_EVERY = 25
+UI_UPDATE_SECONDS = 0.3
+STREAM_TABLE_ROWS = 50
 
-# Configuración de la página
-st.set_page_config(
-    page_title="🚀 Uptrend Signals Pro",
-    page_icon="📈",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+DEFAULT_CATEGORIES = ['sp500_mega_cap', 'tech_leaders']
 
-# CSS personalizado para mejorar la apariencia
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 2.5rem;
-        font-weight: bold;
-        color: #1f77b4;
-        text-align: center;
-        margin-bottom: 2rem;
-    }
-    .metric-card {
-        background-color: #f0f2f6;
-        padding: 1rem;
-        border-radius: 10px;
-        border-left: 5px solid #1f77b4;
-        margin: 0.5rem 0;
-    }
-    .uptrend-signal {
-        background-color: #d4edda;
-        color: #155724;
-        padding: 0.5rem;
-        border-radius: 5px;
-        font-weight: bold;
-    }
-    .sidebar-info {
-        background-color: #e3f2fd;
-        padding: 1rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Histórico de los gráficos: etiqueta -> (periodo, intervalo)
+CHART_HISTORIES = {
+    '6 meses · diario': ('6mo', '1d'),
+    '1 año · diario': ('1y', '1d'),
+    '5 años · diario': ('5y', '1d'),
+    '10 años · diario': ('10y', '1d'),
+    '2 años · horario': ('730d', '1h'),
+    '60 días · 15 min': ('60d', '15m'),
+}
+# Histórico que se precalcula para evaluar el escáner en fechas pasadas
+REPLAY_PERIODS = ['1y', '2y', '5y']
+DOWNSAMPLING_LABELS = {'lttb': 'LTTB (forma)', 'minmax': 'Mín/máx por tramo (extremos)'}
+# Ventanas de correlación (barras diarias) y alcance de la agrupación
+CORRELATION_LOOKBACKS = [60, 120, 250]
+CORRELATION_SCOPES = {'flagged': 'Señales detectadas', 'universe': 'Todo el universo'}
+# Señales máximas en el mapa de correlaciones
+HEATMAP_MAX_SYMBOLS = 80
 
-class UptrendAnalyzer:
-    def __init__(self):
-        self.symbols = {
-            # S&P 500 - Top 100 por capitalización de mercado (2025)
-            'sp500_mega_cap': [
-                'NVDA', 'MSFT', 'AAPL', 'GOOGL', 'GOOG', 'AMZN', 'META', 'TSLA', 'BRK.B', 'AVGO',
-                'LLY', 'WMT', 'JPM', 'UNH', 'XOM', 'ORCL', 'MA', 'COST', 'HD', 'PG',
-                'NFLX', 'JNJ', 'BAC', 'CRM', 'ABBV', 'CVX', 'KO', 'AMD', 'PEP', 'TMO',
-                'MRK', 'WFC', 'LIN', 'CSCO', 'ACN', 'DIS', 'ABT', 'VZ', 'ADBE', 'DHR',
-                'TXN', 'PM', 'CMCSA', 'INTC', 'NKE', 'PFE', 'COP', 'NOW', 'QCOM', 'SPGI'
-            ],
-            
-            # S&P 500 - Large Cap (51-150)
-            'sp500_large_cap': [
-                'AMAT', 'CAT', 'INTU', 'UNP', 'GE', 'BKNG', 'T', 'LOW', 'TJX', 'PLD',
-                'UBER', 'AXP', 'UPS', 'RTX', 'BMY', 'ISRG', 'MS', 'SCHW', 'NEE', 'HON',
-                'MU', 'BLK', 'SYK', 'ELV', 'DE', 'AMGN', 'LMT', 'PGR', 'VRTX', 'ADI',
-                'IBM', 'GILD', 'MDLZ', 'TGT', 'CI', 'CB', 'BSX', 'SO', 'REGN', 'CL',
-                'TMUS', 'PYPL', 'PANW', 'LRCX', 'AON', 'CME', 'ITW', 'SHW', 'ZTS', 'APH'
-            ],
-            
-            # S&P 500 - Mid Cap (151-300)
-            'sp500_mid_cap': [
-                'CDNS', 'SNPS', 'MMC', 'CSX', 'PNC', 'ICE', 'APD', 'WM', 'ORLY', 'FCX',
-                'KLAC', 'TFC', 'F', 'ECL', 'NSC', 'USB', 'GM', 'EMR', 'MCO', 'HCA',
-                'DUK', 'EOG', 'FDX', 'WELL', 'GD', 'TDG', 'SLB', 'PSA', 'AJG', 'BDX',
-                'CARR', 'OXY', 'ADSK', 'EW', 'TRV', 'PCAR', 'ROP', 'NXPI', 'CMG', 'CNC',
-                'NOC', 'AFL', 'JCI', 'O', 'AEP', 'ROST', 'SRE', 'PAYX', 'EXC', 'KMB'
-            ],
-            
-            # S&P 500 - Small-Mid Cap (301-500)
-            'sp500_small_cap': [
-                'FAST', 'CTAS', 'EA', 'ODFL', 'KR', 'AMT', 'BK', 'GLW', 'VRSK', 'A',
-                'DOW', 'CTSH', 'IT', 'FANG', 'VMC', 'EXR', 'MCHP', 'SPG', 'GWW', 'XEL',
-                'DD', 'WY', 'VICI', 'KMI', 'MSCI', 'HPQ', 'PWR', 'CPRT', 'IQV', 'MPWR',
-                'DXCM', 'YUM', 'ANSS', 'GEHC', 'IDXX', 'CMI', 'GRMN', 'RMD', 'ED', 'WTW',
-                'ROK', 'OTIS', 'IR', 'ALL', 'FICO', 'EFX', 'ACGL', 'TRGP', 'HSY', 'HIG'
-            ],
-            
-            # NASDAQ Growth Stocks (no incluidas en S&P 500)
-            'nasdaq_growth': [
-                'QQQ', 'SQQQ', 'TQQQ', 'ARKK', 'ARKQ', 'ARKG', 'SHOP', 'ROKU', 'ZM', 'DOCU',
-                'SNOW', 'CRWD', 'OKTA', 'DDOG', 'NET', 'FSLY', 'TWLO', 'PLTR', 'COIN', 'HOOD',
-                'RBLX', 'U', 'PATH', 'DASH', 'ABNB', 'PINS', 'SNAP', 'SPOT', 'SQ', 'PYPL'
-            ],
-            
-            # NYSE Blue Chips y Industriales
-            'nyse_industrials': [
-                'BA', 'MMM', 'GS', 'MCD', 'IBM', 'DIS', 'DD', 'CAT', 'XOM', 'CVX',
-                'PG', 'JNJ', 'KO', 'MRK', 'PFE', 'WMT', 'T', 'VZ', 'NKE', 'HD',
-                'BAC', 'C', 'JPM', 'WFC', 'USB', 'PNC', 'TFC', 'COF', 'AXP', 'BLK'
-            ],
-            
-            # Sectores Específicos
-            'tech_leaders': [
-                'NVDA', 'MSFT', 'AAPL', 'GOOGL', 'META', 'TSLA', 'AMZN', 'NFLX', 'CRM', 'ORCL',
-                'AMD', 'INTC', 'QCOM', 'AVGO', 'TXN', 'ADI', 'LRCX', 'KLAC', 'AMAT', 'MU'
-            ],
-            
-            'biotech_pharma': [
-                'LLY', 'JNJ', 'PFE', 'ABBV', 'MRK', 'TMO', 'ABT', 'DHR', 'BMY', 'AMGN',
-                'GILD', 'VRTX', 'REGN', 'ZTS', 'BDX', 'EW', 'SYK', 'BSX', 'ISRG', 'DXCM'
-            ],
-            
-            'financial_services': [
-                'BRK.B', 'JPM', 'BAC', 'WFC', 'GS', 'MS', 'C', 'USB', 'PNC', 'TFC',
-                'SCHW', 'BLK', 'SPGI', 'ICE', 'CME', 'MCO', 'AON', 'MMC', 'AJG', 'CB'
-            ],
-            
-            'energy_utilities': [
-                'XOM', 'CVX', 'COP', 'EOG', 'SLB', 'OXY', 'FANG', 'KMI', 'TRGP', 'FCX',
-                'NEE', 'SO', 'DUK', 'AEP', 'EXC', 'XEL', 'ED', 'SRE', 'D', 'NGG'
-            ],
-            
-            'consumer_retail': [
-                'WMT', 'COST', 'HD', 'LOW', 'TGT', 'TJX', 'NKE', 'SBUX', 'MCD', 'CMG',
-                'YUM', 'KR', 'DG', 'DLTR', 'WBA', 'CVS', 'ROST', 'ORLY', 'AZO', 'AAP'
-            ],
-            
-            # Mantenemos categorías internacionales
-            'stocks_global': ['ASML', 'TSM', 'BABA', 'TM', 'NVO', 'NESN.SW', 'MC.PA', 'OR.PA', 'SAP', 'UL'],
-            'etfs': ['SPY', 'QQQ', 'IWM', 'EFA', 'EEM', 'VTI', 'VEA', 'IEFA', 'VWO', 'AGG'],
-            'crypto': ['BTC-USD', 'ETH-USD', 'BNB-USD', 'ADA-USD', 'SOL-USD', 'DOT-USD', 'AVAX-USD', 'MATIC-USD', 'LINK-USD', 'UNI-USD'],
-            'forex': ['EURUSD=X', 'GBPUSD=X', 'USDJPY=X', 'AUDUSD=X', 'USDCAD=X', 'USDCHF=X', 'NZDUSD=X', 'EURGBP=X', 'EURJPY=X', 'GBPJPY=X']
+@st.cache_resource
+def get_result_cache():
+    """Caché de datos y resultados compartida entre reruns y sesiones"""
+    return TTLCache(maxsize=4096)
+
+@st.cache_resource
+def get_fetcher():
+    """Planificador de descargas único: conexiones, límites y circuit breaker compartidos"""
+    return FetchScheduler()
+
+@st.cache_resource
+def get_snapshot_service():
+    """Escaneo periódico de todas las categorías, uno por proceso y compartido por todas las sesiones"""
+    analyzer = UptrendAnalyzer(result_cache=get_result_cache(), fetcher=get_fetcher())
+    service = SnapshotService(analyzer)
+    if SERVICE_ENABLED:
+        service.start()
+    return service
+
+def setup_page():
+    # Configuración de la página
+    st.set_page_config(
+        page_title="🚀 Uptrend Signals Pro",
+        page_icon="📈",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+
+    # CSS personalizado para mejorar la apariencia
+    st.markdown("""
+    <style>
+        .main-header {
+            font-size: 2.5rem;
+            font-weight: bold;
+            color: #1f77b4;
+            text-align: center;
+            margin-bottom: 2rem;
+        }
+        .metric-card {
+            background-color: #f0f2f6;
+            padding: 1rem;
+            border-radius: 10px;
+            border-left: 5px solid #1f77b4;
+            margin: 0.5rem 0;
+        }
+        .uptrend-signal {
+            background-color: #d4edda;
+            color: #155724;
+            padding: 0.5rem;
+            border-radius: 5px;
+            font-weight: bold;
+        }
+        .sidebar-info {
+            background-color: #e3f2fd;
+            padding: 1rem;
+            border-radius: 10px;
+            margin: 1rem 0;
         }
+    </style>
+    """, unsafe_allow_html=True)
+
+def filter_results(all_results, min_score, show_all):
+    """Resultados que pasan los filtros, ordenados por score (de mayor a menor)"""
+    if not show_all:
+        filtered = [r for r in all_results if r.is_uptrend and r.score >= min_score]
+    else:
+        filtered = [r for r in all_results if r.score >= min_score]
+    return sorted(filtered, key=lambda x: x.score, reverse=True)
+
+def render_metrics(all_results, filtered_results):
+    # Estadísticas generales
+    total_analyzed = len(all_results)
+    uptrend_count = len([r for r in all_results if r.is_uptrend])
     
-    def get_data(self, symbol, period='6mo'):
-        """Obtiene datos históricos del símbolo"""
-        try:
-            ticker = yf.Ticker(symbol)
-            data = ticker.history(period=period)
-            if data.empty:
-                return None
-            return data
-        except Exception as e:
-            # En caso de error, generar datos simulados para demostración
-            if st.session_state.get('demo_mode', False):
-                return self.generate_demo_data(symbol)
-            st.warning(f"Error obteniendo datos para {symbol}: {str(e)}")
-            return None
-    
-    def generate_demo_data(self, symbol):
-        """Genera datos simulados para demostración"""
-        try:
-            dates = pd.date_range(start=datetime.now() - timedelta(days=180), 
-                                end=datetime.now(), freq='D')
-            np.random.seed(hash(symbol) % 2147483647)  # Seed basado en el símbolo
-            
-            # Generar datos simulados con tendencia alcista
-            base_price = 100 + np.random.uniform(-50, 200)
-            returns = np.random.normal(0.001, 0.02, len(dates))  # Tendencia alcista leve
-            prices = [base_price]
-            
-            for ret in returns[1:]:
-                prices.append(prices[-1] * (1 + ret))
-            
-            # Crear DataFrame con formato de yfinance
-            data = pd.DataFrame({
-                'Open': prices,
-                'High': [p * (1 + np.random.uniform(0, 0.03)) for p in prices],
-                'Low': [p * (1 - np.random.uniform(0, 0.03)) for p in prices],
-                'Close': prices,
-                'Volume': np.random.randint(1000000, 10000000, len(dates))
-            }, index=dates)
-            
-            # Ajustar High y Low para que sean consistentes
-            data['High'] = np.maximum(data[['Open', 'Close']].max(axis=1), data['High'])
-            data['Low'] = np.minimum(data[['Open', 'Close']].min(axis=1), data['Low'])
-            
-            return data
-        except Exception as e:
-            st.error(f"Error generando datos demo: {str(e)}")
-            return None
-    
-    def calculate_indicators(self, data):
-        """Calcula indicadores técnicos"""
-        try:
-            # Medias móviles
-            data['SMA_20'] = ta.trend.sma_indicator(data['Close'], window=20)
-            data['SMA_50'] = ta.trend.sma_indicator(data['Close'], window=50)
-            data['EMA_12'] = ta.trend.ema_indicator(data['Close'], window=12)
-            data['EMA_26'] = ta.trend.ema_indicator(data['Close'], window=26)
-            
-            # MACD
-            data['MACD'] = ta.trend.macd_diff(data['Close'])
-            data['MACD_Signal'] = ta.trend.macd_signal(data['Close'])
-            
-            # RSI
-            data['RSI'] = ta.momentum.rsi(data['Close'], window=14)
-            
-            # Bandas de Bollinger
-            bollinger = ta.volatility.BollingerBands(data['Close'])
-            data['BB_High'] = bollinger.bollinger_hband()
-            data['BB_Low'] = bollinger.bollinger_lband()
-            data['BB_Mid'] = bollinger.bollinger_mavg()
-            
-            # ADX para fuerza de tendencia
-            data['ADX'] = ta.trend.adx(data['High'], data['Low'], data['Close'])
-            
-            # Volume indicators
-            data['Volume_SMA'] = data['Volume'].rolling(window=20).mean()
-            
-            return data
-        except Exception as e:
-            st.error(f"Error calculando indicadores: {str(e)}")
-            return data
-    
-    def detect_uptrend_signal(self, data):
-        """Detecta señales de uptrend basadas en condiciones cuantitativas"""
-        if data is None or len(data) < 50:
-            return False, 0, {}
-        
-        try:
-            latest = data.iloc[-1]
-            prev = data.iloc[-2]
-            
-            signals = {}
-            score = 0
-            
-            # 1. Precio por encima de medias móviles (25 puntos)
-            if latest['Close'] > latest['SMA_20'] > latest['SMA_50']:
-                signals['price_above_ma'] = True
-                score += 25
-            
-            # 2. Medias móviles en orden alcista (20 puntos)
-            if latest['SMA_20'] > latest['SMA_50']:
-                signals['ma_bullish_order'] = True
-                score += 20
-            
-            # 3. MACD por encima de señal y en territorio positivo (15 puntos)
-            if latest['MACD'] > latest['MACD_Signal'] and latest['MACD'] > 0:
-                signals['macd_bullish'] = True
-                score += 15
-            
-            # 4. RSI en zona favorable (30-70) (10 puntos)
-            if 30 < latest['RSI'] < 70:
-                signals['rsi_favorable'] = True
-                score += 10
-            
-            # 5. Precio rompiendo banda de Bollinger superior (15 puntos)
-            if latest['Close'] > latest['BB_High']:
-                signals['bb_breakout'] = True
-                score += 15
-            
-            # 6. ADX indica tendencia fuerte (>25) (10 puntos)
-            if latest['ADX'] > 25:
-                signals['strong_trend'] = True
-                score += 10
-            
-            # 7. Volumen por encima del promedio (5 puntos)
-            if latest['Volume'] > latest['Volume_SMA']:
-                signals['volume_confirmation'] = True
-                score += 5
-            
-            # Señal de uptrend si score >= 60
-            is_uptrend = score >= 60
-            
-            return is_uptrend, score, signals
-            
-        except Exception as e:
-            st.error(f"Error detectando señal: {str(e)}")
-            return False, 0, {}
-    
-    def analyze_symbol(self, symbol):
-        """Analiza un símbolo completo"""
-        data = self.get_data(symbol)
-        if data is None:
-            return None
-        
-        data = self.calculate_indicators(data)
-        is_uptrend, score, signals = self.detect_uptrend_signal(data)
-        
-        latest_price = data['Close'].iloc[-1]
-        price_change = ((latest_price - data['Close'].iloc[-2]) / data['Close'].iloc[-2]) * 100
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("📊 Total Analizados", total_analyzed)
+    
+    with col2:
+        st.metric("🚀 Señales Uptrend", uptrend_count)
+    
+    with col3:
+        percentage = (uptrend_count / total_analyzed * 100) if total_analyzed > 0 else 0
+        st.metric("📈 % en Uptrend", f"{percentage:.1f}%")
+    
+    with col4:
+        st.metric("🎯 Filtrados", len(filtered_results))
+
+def render_table(results, timeframe_results=None):
+    # Crear DataFrame para mostrar
+    display_data = []
+    for result in results:
+        signals_text = ", ".join([k.replace('_', ' ').title() for k, v in result.signals.items() if v])
         
-        return {
-            'symbol': symbol,
-            'price': latest_price,
-            'change_pct': price_change,
-            'is_uptrend': is_uptrend,
-            'score': score,
-            'signals': signals,
-            'data': data
+        row = {
+            'Símbolo': result.symbol,
+            'Categoría': result.category,
+            'Precio': f"${result.price:.2f}",
+            'Cambio %': f"{result.change_pct:+.2f}%",
+            'Score': result.score,
+            'Uptrend': "✅" if result.is_uptrend else "⚠️",
+            'Días Uptrend': result.uptrend_days,
+            'Señales Activas': signals_text[:50] + "..." if len(signals_text) > 50 else signals_text
+        }
+        if timeframe_results is not None:
+            by_timeframe = timeframe_results.get(result.symbol, {})
+            agreeing, evaluated = timeframe_agreement(by_timeframe)
+            row['Temporalidades'] = " · ".join(
+                f"{tf} {'✅' if r.is_uptrend else '⚠️'} {r.score}" for tf, r in by_timeframe.items()
+            )
+            row['Acuerdo'] = f"{agreeing}/{evaluated}" if evaluated else "—"
+        display_data.append(row)
+    
+    df_display = pd.DataFrame(display_data)
+    
+    # Mostrar tabla con formato
+    st.dataframe(
+        df_display,
+        use_container_width=True,
+        column_config={
+            'Score': st.column_config.ProgressColumn(
+                'Score',
+                help='Puntuación del algoritmo Uptrend',
+                min_value=0,
+                max_value=100,
+            ),
+            'Cambio %': st.column_config.NumberColumn(
+                'Cambio %',
+                format="%.2f%%"
+            )
+        }
+    )
+
+def render_signal_card(result):
+    st.markdown(f"""
+    <div class="metric-card">
+        <h4>{result.symbol}</h4>
+        <p><strong>Precio:</strong> ${result.price:.2f}</p>
+        <p><strong>Cambio:</strong> {result.change_pct:+.2f}%</p>
+        <p><strong>Score:</strong> {result.score}/100</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    st.write("**Señales Activas:**")
+    for signal, active in result.signals.items():
+        if active:
+            signal_name = signal.replace('_', ' ').title()
+            st.write(f"✅ {signal_name}")
+
+def render_partial(all_results, min_score, show_all, metrics_slot, best_slot, table_slot):
+    """Vista parcial durante el escaneo; la tabla se limita a las mejores filas para acotar el coste"""
+    filtered_results = filter_results(all_results, min_score, show_all)
+    
+    with metrics_slot.container():
+        render_metrics(all_results, filtered_results)
+    
+    if filtered_results:
+        with best_slot.container():
+            st.subheader("🏆 Mejor Señal (hasta ahora)")
+            render_signal_card(filtered_results[0])
+        with table_slot.container():
+            st.subheader("🎯 Señales Detectadas")
+            render_table(filtered_results[:STREAM_TABLE_ROWS])
+
+def snapshot_results(snapshot, category_symbols, categories):
+    """Resultados del snapshot para las categorías elegidas, con su nombre visible y en su orden"""
+    results = []
+    for cat_name, symbols in category_symbols.items():
+        for symbol in symbols:
+            result = snapshot.get(categories[cat_name], symbol)
+            if result is not None:
+                results.append(result.in_category(cat_name))
+    return results
+
+def format_age(seconds):
+    if seconds < 90:
+        return f"{seconds:.0f} s"
+    if seconds < 5400:
+        return f"{seconds / 60:.0f} min"
+    return f"{seconds / 3600:.1f} h"
+
+def render_snapshot_status(snapshot, service):
+    """Indicador de antigüedad del snapshot mostrado"""
+    status = (
+        f"📦 Snapshot v{snapshot.version} · generado hace {format_age(snapshot.age)} · "
+        f"{len(snapshot.results)} resultados · escaneo de {snapshot.elapsed or 0:.1f} s"
+    )
+    if service.scanning:
+        status += " · actualizando en segundo plano…"
+    if snapshot.age > 2 * service.interval:
+        st.warning(f"⚠️ Datos desactualizados. {status}")
+    else:
+        st.caption(status)
+
+def render_rules_editor(base_rules):
+    """Pesos y umbrales editables de las reglas; devuelve el conjunto de reglas resultante"""
+    if st.button("Restablecer reglas"):
+        for key in [key for key in st.session_state if str(key).startswith('rule_')]:
+            del st.session_state[key]
+    
+    rules = base_rules.copy()
+    rules.threshold = st.slider("Umbral de señal Uptrend", 0, 100, rules.threshold, key='rule_threshold')
+    for rule in rules.rules:
+        col1, col2 = st.columns([1, 2])
+        rule.weight = col1.number_input(
+            rule.label, min_value=0, max_value=100, value=rule.weight, step=5, key=f'rule_{rule.name}_weight'
+        )
+        for i, condition in enumerate(rule.conditions):
+            condition.threshold = col2.number_input(
+                f"{condition.expression} {condition.op}",
+                value=condition.threshold,
+                step=0.5,
+                format="%.2f",
+                key=f'rule_{rule.name}_{i}'
+            )
+    if rules.total_weight > 100:
+        st.caption(f"Los pesos suman {rules.total_weight}: las puntuaciones se escalan a 0-100")
+    
+    st.download_button("⬇️ Reglas (JSON)", rules.to_json(), file_name='rules.json', mime='application/json')
+    return rules
+
+def render_price_chart(symbol, data, downsampling):
+    """Gráfico de detalle reducido; al acotar la ventana se reduce de nuevo solo ese tramo"""
+    # El control trabaja en hora local sin zona; la ventana se devuelve a la zona de la serie
+    tz = data.index.tz
+    first, last = (ts.tz_localize(None).to_pydatetime() for ts in (data.index[0], data.index[-1]))
+    window = None
+    if first < last:
+        window = st.slider(
+            "Ventana del gráfico", min_value=first, max_value=last, value=(first, last),
+            format="YYYY-MM-DD", help="Acota las fechas para ver el tramo con todo su detalle"
+        )
+        window = tuple(pd.Timestamp(ts).tz_localize(tz) for ts in window)
+    fig, shown = price_figure(data, f'{symbol} - Análisis Técnico', method=downsampling, window=window)
+    st.plotly_chart(fig, use_container_width=True)
+    total = len(data.loc[window[0]:window[1]]) if window else len(data)
+    if shown < total:
+        st.caption(f"{shown} de {total} barras ({DOWNSAMPLING_LABELS[downsampling]})")
+
+def render_replay(replay):
+    """Fecha del replay y amplitud del mercado hasta ella; devuelve la fecha elegida"""
+    first = replay.dates[min(MIN_BARS - 1, len(replay.dates) - 1)]
+    last = replay.dates[-1]
+    date = last.date()
+    if first < last:
+        date = st.slider(
+            "📅 Fecha del escáner",
+            min_value=first.date(),
+            max_value=last.date(),
+            value=last.date(),
+            format="DD/MM/YYYY",
+            help="Resultados que habría dado el escáner con los datos disponibles hasta ese día"
+        )
+    
+    breadth = replay.breadth.loc[first:] * 100
+    fig = px.line(
+        breadth,
+        title='Amplitud del mercado: % de cada categoría en uptrend',
+        labels={'value': '% en uptrend', 'index': 'Fecha', 'variable': 'Categoría'}
+    )
+    fig.update_traces(line=dict(width=3), selector=dict(name=BREADTH_TOTAL))
+    fig.add_vline(x=pd.Timestamp(date), line_dash='dot', line_color='gray')
+    fig.update_layout(height=300, yaxis_range=[0, 100])
+    st.plotly_chart(fig, use_container_width=True)
+    return date
+
+def render_diversification(correlation, filtered_results, all_results, scope, threshold):
+    """Grupos de señales correlacionadas, con el mejor score de cada grupo como representante"""
+    scores = {}
+    for result in all_results:
+        scores[result.symbol] = max(result.score, scores.get(result.symbol, result.score))
+    flagged = [s for s in dict.fromkeys(r.symbol for r in filtered_results) if s in correlation.position]
+    if not flagged:
+        st.info("Sin datos de precio suficientes para correlacionar las señales.")
+        return
+    
+    # Con todo el universo, los símbolos sin señal también unen grupos (y se listan tras las señales)
+    matrix = correlation.frame(flagged if scope == 'flagged' else None)
+    labels = cluster(matrix.to_numpy(), threshold)
+    summary = cluster_summary(matrix.index, matrix.to_numpy(), labels, scores, flagged)
+    summary = summary.sort_values(['score', 'flagged'], ascending=False)
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("🎯 Señales", len(flagged))
+    with col2:
+        st.metric("🧩 Grupos independientes", len(summary))
+    with col3:
+        st.metric("🔗 Señales redundantes", len(flagged) - len(summary))
+    
+    table = pd.DataFrame({
+        'Representante': summary['representative'],
+        'Score': summary['score'],
+        'Señales': summary['flagged'],
+        'Símbolos': summary['size'],
+        'Correlación media': summary['mean_correlation'],
+        'Miembros': [", ".join(m[:12]) + ("..." if len(m) > 12 else "") for m in summary['members']],
+    })
+    st.dataframe(
+        table,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            'Score': st.column_config.ProgressColumn('Score', min_value=0, max_value=100),
+            'Correlación media': st.column_config.NumberColumn('Correlación media', format="%.2f"),
         }
+    )
+    
+    # Mapa de correlaciones de las señales, ordenadas por grupo
+    label_of = dict(zip(matrix.index, labels))
+    order = sorted(flagged, key=lambda s: (label_of[s], -scores.get(s, 0)))[:HEATMAP_MAX_SYMBOLS]
+    if len(order) > 1:
+        fig = px.imshow(
+            matrix.loc[order, order],
+            zmin=-1,
+            zmax=1,
+            color_continuous_scale='RdBu_r',
+            title=f'Correlación de rentabilidades diarias ({correlation.lookback} barras)'
+        )
+        fig.update_layout(height=max(350, 14 * len(order)))
+        st.plotly_chart(fig, use_container_width=True)
+
+def render_diagnostics(slot, report=None):
+    """Panel de diagnóstico: latencias por etapa, eventos, aciertos de caché y exportación"""
+    snapshot = metrics.snapshot()
+    with slot.container():
+        if not snapshot['stages']:
+            st.caption("Sin mediciones todavía")
+        else:
+            st.dataframe(pd.DataFrame([
+                {
+                    'Etapa': name,
+                    'N': stats['count'],
+                    'Total (s)': round(stats['total_seconds'], 3),
+                    'p50 (ms)': round(stats['p50_seconds'] * 1000, 1),
+                    'p95 (ms)': round(stats['p95_seconds'] * 1000, 1),
+                    'p99 (ms)': round(stats['p99_seconds'] * 1000, 1),
+                    'Máx (ms)': round(stats['max_seconds'] * 1000, 1),
+                }
+                for name, stats in snapshot['stages'].items()
+            ]), hide_index=True, use_container_width=True)
+            
+            slowest = snapshot['stages'].get('fetch.request', {}).get('slowest_symbols', [])
+            if slowest:
+                st.caption("Descargas más lentas: " + ", ".join(
+                    f"{item['symbol']} ({item['seconds'] * 1000:.0f} ms)" for item in slowest
+                ))
+            for name, rate in snapshot['hit_rates'].items():
+                st.caption(f"Aciertos de caché ({name.removeprefix('cache.')}): {rate:.0%}")
+            if snapshot['counters']:
+                st.caption(" · ".join(f"{name}: {value}" for name, value in sorted(snapshot['counters'].items())))
+        
+        col1, col2 = st.columns(2)
+        col1.download_button("⬇️ JSON", metrics.to_json(), file_name='uptrend_metrics.json',
+                             mime='application/json')
+        col2.download_button("⬇️ Prometheus", metrics.to_prometheus(), file_name='uptrend_metrics.prom',
+                             mime='text/plain')
+        if report is not None and report.text:
+            st.write(f"**Perfil del escaneo ({report.kind}):**")
+            st.code(report.text)
 
 def main():
+    setup_page()
     st.markdown('<h1 class="main-header">🚀 Uptrend Signals Pro</h1>', unsafe_allow_html=True)
     
     # Inicializar session state
     if 'demo_mode' not in st.session_state:
         st.session_state.demo_mode = False
     
-    analyzer = UptrendAnalyzer()
+    result_cache = get_result_cache()
+    analyzer = UptrendAnalyzer(
+        demo_mode=st.session_state.demo_mode,
+        notify=lambda level, message: getattr(st, level)(message),
+        result_cache=result_cache,
+        fetcher=get_fetcher()
+    )
     
     # Sidebar
     st.sidebar.markdown('<div class="sidebar-info"><h3>📊 Panel de Control</h3></div>', unsafe_allow_html=True)
@@ -334,33 +431,30 @@ def main():
         help="Usa datos simulados si no tienes conexión a internet"
     )
     st.session_state.demo_mode = demo_mode
+    analyzer.demo_mode = demo_mode
     
     if demo_mode:
         st.sidebar.warning("⚠️ Usando datos simulados para demostración")
     
-    # Selección de categorías
-    categories = {
-        '🏆 S&P 500 Mega Cap': 'sp500_mega_cap',
-        '📈 S&P 500 Large Cap': 'sp500_large_cap', 
-        '📊 S&P 500 Mid Cap': 'sp500_mid_cap',
-        '🔹 S&P 500 Small Cap': 'sp500_small_cap',
-        '🚀 NASDAQ Growth': 'nasdaq_growth',
-        '🏭 NYSE Industrials': 'nyse_industrials',
-        '💻 Tech Leaders': 'tech_leaders',
-        '🧬 Biotech/Pharma': 'biotech_pharma',
-        '🏦 Financial Services': 'financial_services',
-        '⚡ Energy/Utilities': 'energy_utilities',
-        '🛍️ Consumer/Retail': 'consumer_retail',
-        '🌍 Global Stocks': 'stocks_global',
-        '📊 ETFs': 'etfs',
-        '₿ Crypto': 'crypto',
-        '💱 Forex': 'forex'
-    }
+    # Origen de los resultados: el snapshot compartido (datos reales) o un escaneo propio
+    snapshot_service = get_snapshot_service()
+    use_snapshot = not demo_mode and st.sidebar.radio(
+        "Origen de los resultados",
+        ["📦 Snapshot compartido", "🔴 Escaneo en vivo"],
+        help=f"El snapshot se recalcula cada {format_age(snapshot_service.interval)} para todas las sesiones; "
+             "el escaneo en vivo descarga y analiza solo para esta"
+    ) == "📦 Snapshot compartido"
+    
+    # Selección de categorías (ficheros de universes/: etiqueta visible -> clave)
+    universe = analyzer.universe
+    categories = {universe.labels[key]: key for key in universe.categories}
+    category_counts = universe.counts()
     
     selected_categories = st.sidebar.multiselect(
         "Selecciona categorías a analizar:",
         list(categories.keys()),
-        default=['🏆 S&P 500 Mega Cap', '💻 Tech Leaders']
+        default=[universe.labels[key] for key in DEFAULT_CATEGORIES if key in universe.labels],
+        format_func=lambda label: f"{label} ({category_counts[categories[label]]})"
     )
     
     # Configuración de filtros
@@ -368,7 +462,94 @@ def main():
     show_all = st.sidebar.checkbox("Mostrar todos los símbolos (no solo uptrends)")
     
     if st.sidebar.button("🔄 Actualizar Análisis", type="primary"):
-        st.rerun()
+        # Fuerza una descarga y un análisis nuevos (en el snapshot, en segundo plano)
+        result_cache.invalidate()
+        if use_snapshot:
+            snapshot_service.trigger()
+            st.toast("📦 Snapshot en actualización")
+        else:
+            st.rerun()
+    
+    # Caché entre reruns: cambiar filtros no vuelve a descargar ni analizar
+    with st.sidebar.expander("⚡ Caché de resultados"):
+        # La caché es común a todas las sesiones: su vigencia se fija en el servidor
+        st.caption(
+            f"Datos y análisis se reutilizan durante {result_cache.ttl:g} s sin volver a descargarlos "
+            "(UPTREND_CACHE_TTL en el servidor)"
+        )
+        cache_info = st.empty()
+    
+    # Varias temporalidades: una serie intradía por símbolo remuestreada (sin más descargas por temporalidad)
+    with st.sidebar.expander("⏱️ Multi-temporalidad"):
+        timeframes = st.multiselect(
+            "Temporalidades de las señales",
+            list(TIMEFRAME_MINUTES),
+            default=[],
+            help="Añade a la tabla el score en cada temporalidad y cuántas coinciden en uptrend. "
+                 "Con 15m solo hay 60 días de historia (la semanal no se puntúa)"
+        )
+        timeframes = sorted(timeframes, key=TIMEFRAME_MINUTES.get)
+    
+    # Reglas de puntuación: se vuelven a aplicar sobre los indicadores ya calculados de cada resultado
+    with st.sidebar.expander("🧮 Reglas de puntuación"):
+        rules = render_rules_editor(RuleSet.load())
+        rules_info = st.empty()
+    
+    # Gráficos: histórico, reducción de puntos y miniaturas de las mejores señales
+    with st.sidebar.expander("📈 Gráficos"):
+        chart_period, chart_interval = CHART_HISTORIES[st.selectbox("Histórico", list(CHART_HISTORIES))]
+        downsampling = st.selectbox(
+            "Reducción de puntos",
+            list(DOWNSAMPLERS),
+            format_func=DOWNSAMPLING_LABELS.get,
+            help=f"Se envían como máximo {MAX_POINTS} puntos por gráfico ({THUMBNAIL_POINTS} por miniatura)"
+        )
+        thumbnails = st.slider("Miniaturas de las mejores señales", 0, 12, 6)
+    
+    # Replay: el escáner en una fecha pasada, a partir de un panel de puntuaciones precalculado
+    with st.sidebar.expander("⏪ Replay histórico"):
+        replay_enabled = st.checkbox(
+            "Evaluar en una fecha pasada",
+            help="Muestra lo que habría detectado el escáner en cualquier fecha del histórico, "
+                 "junto con la amplitud del mercado por categoría"
+        )
+        replay_period = st.selectbox("Histórico disponible", REPLAY_PERIODS, disabled=not replay_enabled)
+    
+    # Diversificación: correlación de rentabilidades y grupos de señales redundantes
+    with st.sidebar.expander("🧩 Diversificación"):
+        diversification = st.checkbox(
+            "Agrupar señales correlacionadas",
+            help="Agrupa las señales que son la misma operación y muestra el mejor score de cada grupo"
+        )
+        correlation_lookback = st.select_slider(
+            "Ventana de correlación (barras)",
+            CORRELATION_LOOKBACKS,
+            value=DEFAULT_LOOKBACK,
+            disabled=not diversification
+        )
+        correlation_scope = st.radio(
+            "Agrupar con",
+            list(CORRELATION_SCOPES),
+            format_func=CORRELATION_SCOPES.get,
+            disabled=not diversification,
+            help="Con todo el universo, dos señales también se agrupan si se parecen a los mismos símbolos"
+        )
+        cluster_threshold = st.slider(
+            "Correlación mínima para agrupar", 0.3, 0.95, CLUSTER_CORRELATION, 0.05,
+            disabled=not diversification
+        )
+    
+    # Diagnóstico: tiempos por etapa y perfilado opcional de un escaneo
+    with st.sidebar.expander("🩺 Diagnóstico"):
+        # Las métricas son del proceso (todas las sesiones): se activan en el servidor
+        if metrics.enabled:
+            st.caption("Midiendo tiempos de descarga, indicadores, puntuación y pintado")
+        else:
+            st.caption("Medición por etapas desactivada (UPTREND_METRICS=1 en el servidor)")
+        profiler = st.selectbox("Perfilar el escaneo", ['No'] + PROFILERS)
+        if st.button("Reiniciar métricas"):
+            metrics.reset()
+        diagnostics = st.empty()
     
     # Test de conexión
     if not demo_mode:
@@ -383,116 +564,139 @@ def main():
     
     # Información sobre el algoritmo
     with st.sidebar.expander("ℹ️ Sobre el Algoritmo Uptrend"):
-        st.write("""
-        **Condiciones para señal Uptrend:**
-        - Precio > SMA20 > SMA50 (25 pts)
-        - Orden alcista de MAs (20 pts)
-        - MACD bullish (15 pts)
-        - RSI 30-70 (10 pts)
-        - Breakout Bollinger (15 pts)
-        - ADX > 25 (10 pts)
-        - Volumen alto (5 pts)
-        
-        **Señal:** Score ≥ 60 puntos
-        """)
+        st.write("**Condiciones para señal Uptrend:**\n" + "\n".join(
+            f"- {rule.label}: {' y '.join(str(c) for c in rule.conditions)} ({rule.weight} pts)"
+            for rule in rules.rules
+        ) + f"\n\n**Señal:** Score ≥ {rules.threshold} puntos")
     
     if not selected_categories:
         st.warning("⚠️ Selecciona al menos una categoría para analizar.")
         return
     
-    # Análisis principal
-    with st.spinner("🔍 Analizando mercados..."):
-        all_results = []
-        
-        for cat_name in selected_categories:
-            cat_key = categories[cat_name]
-            symbols = analyzer.symbols[cat_key]
-            
-            # Análisis paralelo para mejor rendimiento
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                results = list(executor.map(analyzer.analyze_symbol, symbols))
-            
-            valid_results = [r for r in results if r is not None]
-            
-            for result in valid_results:
-                result['category'] = cat_name
-                all_results.append(result)
+    # Análisis principal: los resultados se muestran a medida que llegan
+    category_symbols = {
+        cat_name: analyzer.symbols[categories[cat_name]]
+        for cat_name in selected_categories
+    }
+    total_symbols = int(universe.mask([categories[cat_name] for cat_name in selected_categories]).sum())
     
-    if not all_results:
-        st.error("❌ No se pudieron obtener datos. Verifica tu conexión a internet.")
-        return
+    # Replay: se calcula una vez el histórico de puntuaciones; cambiar de fecha solo lo indexa
+    replay = None
+    if replay_enabled:
+        with st.spinner("⏪ Preparando el histórico de puntuaciones..."):
+            replay = analyzer.replay(category_symbols, replay_period)
     
-    # Filtrar resultados
-    if not show_all:
-        filtered_results = [r for r in all_results if r['is_uptrend'] and r['score'] >= min_score]
+    # Snapshot compartido: solo se filtra el último escaneo publicado por el servicio
+    snapshot = snapshot_service.store.latest() if use_snapshot and replay is None else None
+    if snapshot is not None:
+        render_snapshot_status(snapshot, snapshot_service)
+    elif use_snapshot and replay is None:
+        st.info("⏳ Aún no hay un snapshot compartido: se analiza en vivo mientras se prepara el primero.")
+    
+    progress = st.progress(0.0, text="🔍 Analizando mercados...")
+    metrics_slot = st.empty()
+    best_slot = st.empty()
+    table_slot = st.empty()
+    
+    all_results = []
+    report = None
+    custom_rules = not rules.is_builtin()
+    rescore_seconds = 0.0
+    if replay is not None:
+        replay_date = render_replay(replay)
+        with metrics.stage('replay.at'):
+            all_results = replay.at(replay_date)
+    elif snapshot is not None:
+        all_results = snapshot_results(snapshot, category_symbols, categories)
     else:
-        filtered_results = [r for r in all_results if r['score'] >= min_score]
+        analyzed_symbols = set()
+        last_render, unrendered = 0.0, 0
+        with (profile(profiler) if profiler != 'No' else nullcontext()) as report:
+            for batch in analyzer.scan_iter(category_symbols):
+                if custom_rules:
+                    # Cada tanda se re-puntúa al llegar: la vista parcial ya usa las reglas propias
+                    rescore_started = time.perf_counter()
+                    with metrics.stage('rescore'):
+                        batch = rules.rescore(batch)
+                    rescore_seconds += time.perf_counter() - rescore_started
+                all_results.extend(batch)
+                analyzed_symbols.update(result.symbol for result in batch)
+                unrendered += len(batch)
+                
+                # Repintado por tandas: cada UI_UPDATE_EVERY resultados o UI_UPDATE_SECONDS
+                now = time.monotonic()
+                if unrendered >= UI_UPDATE_EVERY or now - last_render >= UI_UPDATE_SECONDS:
+                    progress.progress(
+                        min(len(analyzed_symbols) / total_symbols, 1.0),
+                        text=f"🔍 Analizando mercados... {len(analyzed_symbols)}/{total_symbols}"
+                    )
+                    with metrics.stage('render.partial'):
+                        render_partial(all_results, min_score, show_all, metrics_slot, best_slot, table_slot)
+                    last_render, unrendered = now, 0
     
-    # Estadísticas generales
-    total_analyzed = len(all_results)
-    uptrend_count = len([r for r in all_results if r['is_uptrend']])
+    progress.empty()
+    best_slot.empty()
     
-    col1, col2, col3, col4 = st.columns(4)
+    cache_stats = result_cache.stats()
+    cache_info.caption(
+        f"Aciertos: {cache_stats['hits']} · Fallos: {cache_stats['misses']} · "
+        f"Tasa: {cache_stats['hit_rate']:.0%} · Entradas: {cache_stats['size']}/{cache_stats['maxsize']}"
+    )
     
-    with col1:
-        st.metric("📊 Total Analizados", total_analyzed)
+    if not all_results:
+        metrics_slot.empty()
+        table_slot.empty()
+        st.error("❌ No se pudieron obtener datos. Verifica tu conexión a internet.")
+        render_diagnostics(diagnostics, report)
+        return
     
-    with col2:
-        st.metric("🚀 Señales Uptrend", uptrend_count)
+    # Orden estable (el de las categorías), independiente del orden de llegada
+    position = {
+        (category, symbol): i
+        for i, (category, symbol) in enumerate(
+            (category, symbol) for category, symbols in category_symbols.items() for symbol in symbols
+        )
+    }
+    all_results.sort(key=lambda r: position[(r.category, r.symbol)])
     
-    with col3:
-        percentage = (uptrend_count / total_analyzed * 100) if total_analyzed > 0 else 0
-        st.metric("📈 % en Uptrend", f"{percentage:.1f}%")
+    # Reglas propias: solo se re-puntúa (sin descargar ni recalcular indicadores)
+    if custom_rules:
+        if replay is not None or snapshot is not None:
+            rescore_started = time.perf_counter()
+            with metrics.stage('rescore'):
+                all_results = rules.rescore(all_results)
+            rescore_seconds += time.perf_counter() - rescore_started
+        rules_info.caption(
+            f"Re-puntuados {len(all_results)} resultados en {rescore_seconds * 1000:.1f} ms"
+        )
+    filtered_results = filter_results(all_results, min_score, show_all)
+    render_started = time.perf_counter()
     
-    with col4:
-        st.metric("🎯 Filtrados", len(filtered_results))
+    with metrics_slot.container():
+        render_metrics(all_results, filtered_results)
     
     # Mostrar resultados
     if filtered_results:
-        st.subheader("🎯 Señales Detectadas")
-        
-        # Ordenar por score
-        filtered_results.sort(key=lambda x: x['score'], reverse=True)
-        
-        # Crear DataFrame para mostrar
-        display_data = []
-        for result in filtered_results:
-            signals_text = ", ".join([k.replace('_', ' ').title() for k, v in result['signals'].items() if v])
-            
-            display_data.append({
-                'Símbolo': result['symbol'],
-                'Categoría': result['category'],
-                'Precio': f"${result['price']:.2f}",
-                'Cambio %': f"{result['change_pct']:+.2f}%",
-                'Score': result['score'],
-                'Uptrend': "✅" if result['is_uptrend'] else "⚠️",
-                'Señales Activas': signals_text[:50] + "..." if len(signals_text) > 50 else signals_text
-            })
-        
-        df_display = pd.DataFrame(display_data)
-        
-        # Mostrar tabla con formato
-        st.dataframe(
-            df_display,
-            use_container_width=True,
-            column_config={
-                'Score': st.column_config.ProgressColumn(
-                    'Score',
-                    help='Puntuación del algoritmo Uptrend',
-                    min_value=0,
-                    max_value=100,
-                ),
-                'Cambio %': st.column_config.NumberColumn(
-                    'Cambio %',
-                    format="%.2f%%"
+        timeframe_results = None
+        if timeframes:
+            with st.spinner("⏱️ Analizando temporalidades..."):
+                timeframe_results = analyzer.analyze_timeframes(
+                    [r.symbol for r in filtered_results], timeframes
                 )
-            }
-        )
+                if custom_rules:
+                    timeframe_results = {
+                        symbol: dict(zip(by_timeframe, rules.rescore(by_timeframe.values())))
+                        for symbol, by_timeframe in timeframe_results.items()
+                    }
+        with table_slot.container():
+            st.subheader("🎯 Señales Detectadas")
+            render_table(filtered_results, timeframe_results)
         
         # Gráfico de distribución por categoría
         st.subheader("📊 Distribución por Categoría")
         
-        category_counts = pd.DataFrame(filtered_results).groupby('category').size().reset_index(name='count')
+        categories_found = pd.Series([r.category for r in filtered_results], name='category')
+        category_counts = categories_found.groupby(categories_found).size().reset_index(name='count')
         
         fig_bar = px.bar(
             category_counts,
@@ -505,92 +709,62 @@ def main():
         fig_bar.update_layout(showlegend=False)
         st.plotly_chart(fig_bar, use_container_width=True)
         
+        # Diversificación: la matriz se guarda en caché y solo se suman las barras nuevas
+        if diversification:
+            st.subheader("🧩 Diversificación")
+            if replay is not None:
+                st.info("La diversificación usa las últimas barras: desactiva el replay para verla.")
+            else:
+                correlation_started = time.perf_counter()
+                with st.spinner("🧩 Calculando correlaciones..."):
+                    correlation = analyzer.correlation(
+                        [s for symbols in category_symbols.values() for s in symbols], correlation_lookback
+                    )
+                render_diversification(
+                    correlation, filtered_results, all_results, correlation_scope, cluster_threshold
+                )
+                st.caption(
+                    f"Correlaciones de {len(correlation.symbols)} símbolos en "
+                    f"{(time.perf_counter() - correlation_started) * 1000:.0f} ms"
+                )
+        
         # Análisis detallado del mejor símbolo
         if filtered_results:
             st.subheader("🏆 Análisis Detallado - Mejor Señal")
             
             best_result = filtered_results[0]
+            top_results = filtered_results[:max(thumbnails, 1)]
+            
+            # Los resultados no guardan las series: se rematerializan solo las que se grafican (de una vez)
+            chart_frames = analyzer.chart_data_bulk([r.symbol for r in top_results], chart_period, chart_interval)
             
             col1, col2 = st.columns([2, 1])
             
             with col1:
-                # Gráfico de precio
-                data = best_result['data']
-                fig = go.Figure()
-                
-                # Precio
-                fig.add_trace(go.Scatter(
-                    x=data.index,
-                    y=data['Close'],
-                    mode='lines',
-                    name='Precio',
-                    line=dict(color='blue', width=2)
-                ))
-                
-                # Medias móviles
-                fig.add_trace(go.Scatter(
-                    x=data.index,
-                    y=data['SMA_20'],
-                    mode='lines',
-                    name='SMA 20',
-                    line=dict(color='orange', width=1)
-                ))
-                
-                fig.add_trace(go.Scatter(
-                    x=data.index,
-                    y=data['SMA_50'],
-                    mode='lines',
-                    name='SMA 50',
-                    line=dict(color='red', width=1)
-                ))
-                
-                # Bandas de Bollinger
-                fig.add_trace(go.Scatter(
-                    x=data.index,
-                    y=data['BB_High'],
-                    mode='lines',
-                    name='BB Superior',
-                    line=dict(color='gray', dash='dash', width=1)
-                ))
-                
-                fig.add_trace(go.Scatter(
-                    x=data.index,
-                    y=data['BB_Low'],
-                    mode='lines',
-                    name='BB Inferior',
-                    line=dict(color='gray', dash='dash', width=1),
-                    fill='tonexty',
-                    fillcolor='rgba(128,128,128,0.1)'
-                ))
-                
-                fig.update_layout(
-                    title=f'{best_result["symbol"]} - Análisis Técnico',
-                    xaxis_title='Fecha',
-                    yaxis_title='Precio',
-                    height=400
-                )
-                
-                st.plotly_chart(fig, use_container_width=True)
+                data = chart_frames.get(best_result.symbol)
+                if data is None:
+                    st.info(f"Sin datos de precio para {best_result.symbol}")
+                else:
+                    render_price_chart(best_result.symbol, data, downsampling)
             
             with col2:
-                st.markdown(f"""
-                <div class="metric-card">
-                    <h4>{best_result['symbol']}</h4>
-                    <p><strong>Precio:</strong> ${best_result['price']:.2f}</p>
-                    <p><strong>Cambio:</strong> {best_result['change_pct']:+.2f}%</p>
-                    <p><strong>Score:</strong> {best_result['score']}/100</p>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                st.write("**Señales Activas:**")
-                for signal, active in best_result['signals'].items():
-                    if active:
-                        signal_name = signal.replace('_', ' ').title()
-                        st.write(f"✅ {signal_name}")
+                render_signal_card(best_result)
+            
+            # Miniaturas de las siguientes señales (una sola figura WebGL)
+            charts = [
+                (f"{r.symbol} · {r.score}", chart_frames[r.symbol]) for r in top_results if r.symbol in chart_frames
+            ]
+            if len(charts) > 1:
+                st.subheader(f"🗂️ Top {len(charts)} señales")
+                st.plotly_chart(small_multiples(charts, method=downsampling), use_container_width=True)
     
     else:
+        table_slot.empty()
         st.info("🔍 No se encontraron señales Uptrend con los filtros actuales. Prueba reducir la puntuación mínima.")
     
+    metrics.observe('render.final', time.perf_counter() - render_started)
+    render_diagnostics(diagnostics, report)
+    
     # Footer
     st.markdown("---")
     st.markdown("""
@@ -0,0 +1,644 @@
+"""Núcleo de análisis Uptrend sin dependencias de interfaz.
+
+``UptrendAnalyzer`` descarga datos, calcula indicadores y puntúa señales. Se
+puede usar desde la aplicación Streamlit, desde el escáner de línea de
+comandos (``uptrend_scan.py``) o desde cualquier otro servicio. Las librerías
+de red (``fetcher``/requests) y ``ta`` se importan solo cuando se necesitan.
+"""
+import logging
+import os
+import time
+
+import numpy as np
+
+from backtest import run_backtest
+from column_store import ColumnStore
+from correlation import DEFAULT_LOOKBACK, RollingCorrelation, lookback_period
+from indicator_state import IndicatorState, load_states, save_states
+from pipeline import ScanPipeline
+from indicators import INDICATOR_COLUMNS, OHLCV_COLUMNS, Panel, compute_indicators
+from instrumentation import metrics
+from optimize import run_sweep
+from price_cache import PriceCache, period_start
+from replay import ReplayPanel
+from result_cache import MISSING
+from scan_result import FEATURE_COLUMNS, ScanResult
+from scoring import (MIN_BARS, UPTREND_THRESHOLD, latest_rows, score_arrays, score_frame,
+                     score_panel, signal_mask, signals_at)
+from synthetic import DEFAULT_SEED, SyntheticMarket
+from timeframes import (BASE_PERIODS, DEFAULT_TIMEFRAMES, base_interval, enough_bars, resample,
+                        timezone_panels, trailing)
+from universe import Universe
+
+logger = logging.getLogger('uptrend')
+
+# Días de caché local que se releen antes de la última barra de un estado en vivo (fines de semana y festivos)
+LIVE_OVERLAP_DAYS = 10
+
+def _fetcher():
+    """Importa el planificador de descargas (y requests) bajo demanda"""
+    import fetcher
+    return fetcher
+
+
+def _ta():
+    """Importa ta bajo demanda (solo para el cálculo símbolo a símbolo)"""
+    import ta
+    return ta
+
+
+def _log_message(level, message):
+    getattr(logger, level, logger.info)(message)
+
+
+class UptrendAnalyzer:
+    def __init__(self, demo_mode=False, notify=None, result_cache=None, fetcher=None, universe=None,
+                 fetch_options=None):
+        # Modo demo: datos simulados cuando no hay conexión (mercado sintético con semilla fija)
+        self.demo_mode = demo_mode
+        self.synthetic = SyntheticMarket(seed=int(os.environ.get('UPTREND_DEMO_SEED', DEFAULT_SEED)))
+        # Destino de avisos y errores (la interfaz puede mostrarlos; por defecto, logging)
+        self.notify = notify or _log_message
+        # Caché opcional (TTLCache) de datos y resultados compartida entre reruns
+        self.result_cache = result_cache
+        # Planificador de descargas (FetchScheduler); por defecto se crea al descargar, con ``fetch_options``
+        self.fetcher = fetcher
+        self.fetch_options = dict(fetch_options or {})
+        
+        # Universo de símbolos (ficheros de ``universes/``): índice sin duplicados y pertenencia por categoría
+        self.universe = universe if universe is not None else Universe.load()
+        self.symbols = self.universe.category_symbols()
+        
+        # Caché persistente de precios (descarga incremental)
+        self.price_cache = PriceCache()
+        
+        # Copia columnar mapeada en memoria de las series diarias (lecturas de universo sin pandas)
+        self.column_store = ColumnStore(os.path.join(os.path.dirname(self.price_cache.path), 'columns'))
+        
+        # Estado incremental de indicadores para el refresco en vivo (se carga bajo demanda)
+        self.indicator_states = None
+        self.indicator_states_path = os.path.join(
+            os.path.dirname(self.price_cache.path), 'indicator_states.json'
+        )
+    
+    def _cache_get(self, key):
+        if self.result_cache is None:
+            return MISSING
+        value = self.result_cache.get(key)
+        metrics.count(f"cache.{key[0]}.{'misses' if value is MISSING else 'hits'}")
+        return value
+    
+    def _cache_set(self, key, value):
+        if self.result_cache is not None and value is not None:
+            self.result_cache.set(key, value)
+    
+    def _data_key(self, symbol, period, interval='1d'):
+        return ('data', symbol, period, interval, self.demo_mode)
+    
+    def _analysis_key(self, symbol, period, data):
+        """Clave de un análisis: cambia en cuanto cambia (o se revisa) la última barra"""
+        return ('analysis', symbol, period, self.demo_mode, len(data),
+                data.index[-1], float(data['Close'].iloc[-1]))
+    
+    def get_data(self, symbol, period='6mo'):
+        """Obtiene datos históricos del símbolo (caché en memoria, caché local + barras nuevas)"""
+        data = self._cache_get(self._data_key(symbol, period))
+        if data is MISSING:
+            with metrics.stage('get_data', symbol):
+                data = self._fetch_data(symbol, period)
+            self._cache_set(self._data_key(symbol, period), data)
+        return data
+    
+    def _fetch_data(self, symbol, period='6mo'):
+        """Descarga los datos de un símbolo (solo las barras nuevas si ya están en la caché local)"""
+        return self._fetch_data_bulk([symbol], period)[symbol]
+    
+    def get_data_bulk(self, symbols, period='6mo', on_frame=None, interval='1d', notify=None):
+        """Descarga los datos históricos de varios símbolos, una sola vez por símbolo
+        
+        ``on_frame(símbolo, datos)`` recibe cada serie en cuanto está disponible
+        (las de la caché en memoria primero). ``notify`` sustituye a ``self.notify``
+        para los avisos de esta descarga (p. ej. si se ejecuta en otro hilo).
+        """
+        with metrics.stage('get_data'):
+            return self._get_data_bulk(list(dict.fromkeys(symbols)), period, on_frame, interval, notify)
+    
+    def _get_data_bulk(self, unique_symbols, period, on_frame, interval='1d', notify=None):
+        frames = {
+            symbol: self._cache_get(self._data_key(symbol, period, interval)) for symbol in unique_symbols
+        }
+        
+        missing = [symbol for symbol, data in frames.items() if data is MISSING]
+        if on_frame is not None:
+            for symbol, data in frames.items():
+                if data is not MISSING:
+                    on_frame(symbol, data)
+        
+        def fetched(symbol, data):
+            frames[symbol] = data
+            self._cache_set(self._data_key(symbol, period, interval), data)
+            if on_frame is not None:
+                on_frame(symbol, data)
+        
+        if missing:
+            self._fetch_data_bulk(missing, period, on_frame=fetched, interval=interval, notify=notify)
+        return frames
+    
+    def _fetch_data_bulk(self, unique_symbols, period='6mo', on_frame=None, interval='1d', notify=None):
+        """Descarga con el planificador común los símbolos que no están en la caché en memoria"""
+        notify = notify or self.notify
+        fetcher = _fetcher()
+        scheduler = self._fetch_scheduler()
+        starts = {symbol: self.price_cache.fetch_start(symbol, period, interval) for symbol in unique_symbols}
+        frames = {}
+        failed = []
+        retry_full = []
+        stored = {}
+        
+        def finish(symbol):
+            data = self.price_cache.load(symbol, interval, start=period_start(period))
+            if data is not None:
+                stored[symbol] = data
+            elif self.demo_mode:
+                data = self.generate_demo_data(symbol, interval, period, notify=notify)
+            frames[symbol] = data
+            if on_frame is not None:
+                on_frame(symbol, data)
+        
+        def received(symbol, data):
+            if data is fetcher.FAILED:
+                # Reintentos agotados o circuito abierto: se usa la caché local
+                failed.append(symbol)
+            elif starts[symbol] is None:
+                self.price_cache.replace(symbol, data, interval, period=period)
+            elif not self.price_cache.merge(symbol, data, interval):
+                # Sin solapamiento válido (split, ajuste o error): descarga completa
+                retry_full.append(symbol)
+                return
+            finish(symbol)
+        
+        # Símbolos ya cacheados: solo barras nuevas más la ventana de solapamiento;
+        # símbolos nuevos: historial completo del periodo (todo en una sola tanda)
+        scheduler.fetch_many({
+            symbol: fetcher.fetch_params(period=period, start=start, interval=interval)
+            for symbol, start in starts.items()
+        }, on_result=received)
+        
+        # Símbolos con precios ajustados: se vuelven a descargar completos (como si fueran nuevos)
+        starts.update(dict.fromkeys(retry_full))
+        scheduler.fetch_many(
+            {symbol: fetcher.fetch_params(period=period, interval=interval) for symbol in retry_full},
+            on_result=received
+        )
+        
+        if failed:
+            fallback = "caché local o datos simulados" if self.demo_mode else "caché local"
+            notify('warning', f"No se pudieron descargar {len(failed)} símbolos; se usa la {fallback}")
+        
+        # Descargas completas (símbolos nuevos o ajustados): se sustituye su historia en el almacén
+        if interval == '1d':
+            replaced = [symbol for symbol, start in starts.items() if start is None]
+            self._store_columns(stored, replaced)
+        return {symbol: frames[symbol] for symbol in unique_symbols}
+    
+    def _store_columns(self, frames, replace=()):
+        """Refleja en el almacén columnar las series leídas de la caché local"""
+        try:
+            self.column_store.write(frames, replace=replace)
+        except (OSError, ValueError) as e:
+            logger.warning("No se pudo actualizar el almacén columnar: %s", e)
+    
+    def _fetch_scheduler(self):
+        """Planificador de descargas compartido (se crea en la primera descarga)"""
+        if self.fetcher is None:
+            self.fetcher = _fetcher().FetchScheduler(**self.fetch_options)
+        return self.fetcher
+    
+    def generate_demo_data(self, symbol, interval='1d', period='6mo', notify=None):
+        """Genera datos simulados para demostración (deterministas para la semilla del mercado sintético)"""
+        try:
+            return self.synthetic.frame(symbol, self.synthetic.dates(period, interval), interval)
+        except Exception as e:
+            (notify or self.notify)('error', f"Error generando datos demo: {str(e)}")
+            return None
+    
+    def calculate_indicators(self, data):
+        """Calcula indicadores técnicos"""
+        try:
+            ta = _ta()
+            data = data.copy()
+            
+            # Medias móviles
+            data['SMA_20'] = ta.trend.sma_indicator(data['Close'], window=20)
+            data['SMA_50'] = ta.trend.sma_indicator(data['Close'], window=50)
+            data['EMA_12'] = ta.trend.ema_indicator(data['Close'], window=12)
+            data['EMA_26'] = ta.trend.ema_indicator(data['Close'], window=26)
+            
+            # MACD
+            data['MACD'] = ta.trend.macd_diff(data['Close'])
+            data['MACD_Signal'] = ta.trend.macd_signal(data['Close'])
+            
+            # RSI
+            data['RSI'] = ta.momentum.rsi(data['Close'], window=14)
+            
+            # Bandas de Bollinger
+            bollinger = ta.volatility.BollingerBands(data['Close'])
+            data['BB_High'] = bollinger.bollinger_hband()
+            data['BB_Low'] = bollinger.bollinger_lband()
+            data['BB_Mid'] = bollinger.bollinger_mavg()
+            
+            # ADX para fuerza de tendencia
+            data['ADX'] = ta.trend.adx(data['High'], data['Low'], data['Close'])
+            
+            # Volume indicators
+            data['Volume_SMA'] = data['Volume'].rolling(window=20).mean()
+            
+            return data
+        except Exception as e:
+            self.notify('error', f"Error calculando indicadores: {str(e)}")
+            return data
+    
+    def detect_uptrend_signal(self, data):
+        """Detecta señales de uptrend basadas en condiciones cuantitativas"""
+        if data is None or len(data) < 50:
+            return False, 0, {}
+        
+        try:
+            # Última fila del histórico vectorizado de señales y puntuación
+            signals, score = score_arrays(data, np.arange(1, len(data) + 1))
+            return self._signal_result(signals, score, -1)
+        except Exception as e:
+            self.notify('error', f"Error detectando señal: {str(e)}")
+            return False, 0, {}
+    
+    def score_latest(self, latest):
+        """Puntúa la última barra (fila de DataFrame o diccionario de indicadores)"""
+        try:
+            signals, score = score_arrays(latest)
+            return self._signal_result(signals, score, ())
+        except Exception as e:
+            self.notify('error', f"Error detectando señal: {str(e)}")
+            return False, 0, {}
+    
+    def _signal_result(self, signals, score, index):
+        """Tupla (is_uptrend, score, signals) en una posición de los arrays de señales"""
+        score = int(score[index])
+        return score >= UPTREND_THRESHOLD, score, signals_at(signals, index)
+    
+    def score_history(self, data):
+        """Señales y puntuación de cada barra del histórico (no solo la última)"""
+        return score_frame(data)
+    
+    def analyze_symbol(self, symbol):
+        """Analiza un símbolo completo"""
+        data = self.get_data(symbol)
+        if data is None or data.empty:
+            return self.analyze_data(symbol, data)
+        key = self._analysis_key(symbol, '6mo', data)
+        result = self._cache_get(key)
+        if result is MISSING:
+            result = self.analyze_data(symbol, data)
+            self._cache_set(key, result)
+        return result
+    
+    def analyze_symbols(self, symbols, period='6mo', workers=None):
+        """Analiza varios símbolos descargando y calculando cada símbolo único una sola vez"""
+        results = {}
+        for batch in self.analyze_symbols_iter(symbols, period=period, workers=workers):
+            results.update(batch)
+        return {symbol: results[symbol] for symbol in dict.fromkeys(symbols) if symbol in results}
+    
+    def analyze_symbols_iter(self, symbols, period='6mo', workers=None, reuse=None):
+        """Genera los resultados por tandas a medida que se descargan y calculan (ver ``pipeline``)
+        
+        ``reuse(símbolo, datos)`` puede devolver un resultado anterior aún válido
+        para no recalcular ese símbolo (ver ``rescan``).
+        """
+        return ScanPipeline(self, workers=workers, reuse=reuse).run(list(dict.fromkeys(symbols)), period=period)
+    
+    def cached_analysis(self, symbol, period, data):
+        """Resultado ya calculado para la última barra de ``data`` (None si no está en caché)"""
+        result = self._cache_get(self._analysis_key(symbol, period, data))
+        return None if result is MISSING else result
+    
+    def store_analysis(self, period, frames, results):
+        """Guarda en caché los resultados calculados a partir de ``frames`` y los devuelve"""
+        for symbol, result in results.items():
+            self._cache_set(self._analysis_key(symbol, period, frames[symbol]), result)
+        return results
+    
+    def analyze_frames(self, frames):
+        """Indicadores y puntuación de un conjunto de símbolos en una sola pasada vectorizada"""
+        try:
+            with metrics.stage('indicators'):
+                panel = compute_indicators(Panel.from_frames(frames))
+        except Exception as e:
+            self.notify('error', f"Error calculando indicadores: {str(e)}")
+            results = (self.analyze_data(symbol, data) for symbol, data in frames.items())
+            return {r.symbol: r for r in results if r is not None}
+        with metrics.stage('scoring'):
+            return self.analyze_panel(panel)
+    
+    def scan(self, category_symbols, period='6mo', workers=None):
+        """Escanea varias categorías analizando una sola vez cada símbolo único
+        
+        ``category_symbols`` es un diccionario nombre de categoría -> lista de
+        símbolos; se devuelve un resultado por cada par (símbolo, categoría).
+        """
+        unique_symbols = list(dict.fromkeys(
+            symbol for symbols in category_symbols.values() for symbol in symbols
+        ))
+        results_by_symbol = self.analyze_symbols(unique_symbols, period=period, workers=workers)
+        
+        results = []
+        for category, symbols in category_symbols.items():
+            for symbol in symbols:
+                result = results_by_symbol.get(symbol)
+                if result is not None:
+                    results.append(result.in_category(category))
+        return results
+    
+    def scan_iter(self, category_symbols, period='6mo', workers=None):
+        """Versión progresiva de ``scan``: genera listas de resultados a medida que se completan"""
+        categories_of = {}
+        for category, symbols in category_symbols.items():
+            for symbol in symbols:
+                categories_of.setdefault(symbol, []).append(category)
+        
+        started = time.perf_counter()
+        try:
+            for batch in self.analyze_symbols_iter(list(categories_of), period=period, workers=workers):
+                yield [
+                    result.in_category(category)
+                    for symbol, result in batch.items()
+                    for category in categories_of[symbol]
+                ]
+        finally:
+            metrics.observe('scan', time.perf_counter() - started)
+    
+    def analyze_timeframes(self, symbols, timeframes=DEFAULT_TIMEFRAMES, base=None):
+        """Resultados de cada símbolo en varias temporalidades: {símbolo: {temporalidad: resultado}}
+        
+        Solo se descarga una serie por símbolo (la de ``base``, por defecto la más
+        gruesa que sirve para todas las temporalidades); el resto se obtiene
+        remuestreándola. Las temporalidades con menos de MIN_BARS barras no se puntúan.
+        """
+        base = base or base_interval(timeframes)
+        frames = self.get_data_bulk(symbols, period=BASE_PERIODS[base], interval=base)
+        groups = timezone_panels(frames)
+        results = {}
+        for timeframe in timeframes:
+            with metrics.stage(f'timeframe.{timeframe}'):
+                panel = trailing(resample(groups, timeframe, base))
+                scored = enough_bars(panel)
+                if not scored:
+                    continue
+                for symbol, result in self.analyze_panel(compute_indicators(panel)).items():
+                    if symbol in scored:
+                        results.setdefault(symbol, {})[timeframe] = result
+        return results
+    
+    def analyze_panel(self, panel):
+        """Resultados de todos los símbolos de un panel con indicadores (última fila del score vectorizado)"""
+        scores = score_panel(panel)
+        last_rows = latest_rows(panel)
+        masks = signal_mask(scores['signals'])
+        close = panel['Close']
+        valid = ~np.isnan(close)
+        results = {}
+        
+        # Valores de la última barra de cada símbolo, para volver a puntuar con otras reglas
+        rows, columns = np.maximum(last_rows, 0), np.arange(len(panel.symbols))
+        features = np.stack([
+            (scores['bars'] if name == 'bars' else panel[name])[rows, columns] for name in FEATURE_COLUMNS
+        ], axis=1)
+        
+        for j, symbol in enumerate(panel.symbols):
+            rows = np.flatnonzero(valid[:, j])
+            if len(rows) < 2:
+                continue
+            
+            row = last_rows[j]
+            latest_price = close[row, j]
+            prev_price = close[rows[-2], j]
+            results[symbol] = ScanResult(
+                symbol,
+                latest_price,
+                (latest_price - prev_price) / prev_price * 100,
+                scores['score'][row, j],
+                masks[row, j],
+                scores['uptrend_age'][row, j],
+                features=features[j],
+            )
+        return results
+    
+    def analyze_data(self, symbol, data, has_indicators=False):
+        """Analiza un símbolo a partir de datos ya descargados"""
+        if data is None or len(data) < 2:
+            return None
+        
+        if not has_indicators:
+            with metrics.stage('indicators', symbol):
+                data = self.calculate_indicators(data)
+        with metrics.stage('scoring', symbol):
+            is_uptrend, score, signals = self.detect_uptrend_signal(data)
+        uptrend_days = 0
+        if is_uptrend:
+            uptrend_days = int(self.score_history(data)['Uptrend_Days'].iloc[-1])
+        
+        latest_price = data['Close'].iloc[-1]
+        price_change = ((latest_price - data['Close'].iloc[-2]) / data['Close'].iloc[-2]) * 100
+        latest = data.iloc[-1]
+        features = [len(data) if name == 'bars' else latest.get(name, np.nan) for name in FEATURE_COLUMNS]
+        
+        return ScanResult.from_signals(symbol, latest_price, price_change, score, signals, uptrend_days, features)
+    
+    def replay(self, category_symbols, period='1y'):
+        """Panel para evaluar el escáner en cualquier fecha del periodo (``ReplayPanel``)
+        
+        Se calcula una vez con los datos de todo el periodo y se guarda en la
+        caché de resultados: moverse por las fechas solo indexa arrays.
+        """
+        symbols = list(dict.fromkeys(s for symbols in category_symbols.values() for s in symbols))
+        key = ('replay', tuple(category_symbols), tuple(symbols), period, self.demo_mode)
+        replay = self._cache_get(key)
+        if replay is MISSING:
+            frames = self.get_data_bulk(symbols, period)
+            with metrics.stage('replay.build'):
+                replay = ReplayPanel(compute_indicators(Panel.from_frames(frames)), category_symbols)
+            self._cache_set(key, replay)
+        return replay
+    
+    def correlation(self, symbols, lookback=DEFAULT_LOOKBACK):
+        """Correlación de rentabilidades diarias de los símbolos en las últimas ``lookback`` barras
+        
+        Devuelve un ``RollingCorrelation`` que se guarda en la caché de resultados:
+        en cada rerun solo se suman las barras nuevas y se restan las que salen de
+        la ventana.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        key = ('correlation', tuple(symbols), lookback, self.demo_mode)
+        correlation = self._cache_get(key)
+        if correlation is MISSING:
+            correlation = RollingCorrelation(symbols, lookback)
+        frames = self.get_data_bulk(symbols, lookback_period(lookback))
+        with metrics.stage('correlation'):
+            correlation.update(Panel.from_frames(frames, columns=['Close']))
+        self._cache_set(key, correlation)
+        return correlation
+    
+    def _chart_key(self, symbol, period, interval, data):
+        """Clave de una serie con indicadores para gráficos (como ``_analysis_key``)"""
+        return ('chart', symbol, period, interval, self.demo_mode, len(data),
+                data.index[-1], float(data['Close'].iloc[-1]))
+    
+    def chart_data(self, symbol, period='6mo', interval='1d'):
+        """Serie con indicadores de un símbolo para graficarla (los resultados no guardan las series)"""
+        return self.chart_data_bulk([symbol], period, interval).get(symbol)
+    
+    def chart_data_bulk(self, symbols, period='6mo', interval='1d'):
+        """Series con indicadores de varios símbolos para graficarlas: {símbolo: DataFrame}
+        
+        Se rematerializan desde la caché en memoria o la caché local de precios
+        (si cubre el periodo pedido); solo se descarga lo que no esté en ninguna de
+        las dos. Los indicadores de los símbolos de una misma zona horaria se
+        calculan juntos, en un solo panel.
+        """
+        with metrics.stage('chart_data'):
+            frames, missing = {}, []
+            for symbol in dict.fromkeys(symbols):
+                data = self._cache_get(self._data_key(symbol, period, interval))
+                if data is MISSING:
+                    data = None
+                    if self.price_cache.fetch_start(symbol, period, interval) is not None:
+                        data = self.price_cache.load(symbol, interval, start=period_start(period))
+                    if data is None and self.demo_mode:
+                        data = self.generate_demo_data(symbol, interval, period)
+                    self._cache_set(self._data_key(symbol, period, interval), data)
+                if data is None:
+                    missing.append(symbol)
+                else:
+                    frames[symbol] = data
+            if missing:
+                frames.update(self.get_data_bulk(missing, period, interval=interval))
+            
+            charts, groups = {}, {}
+            for symbol, data in frames.items():
+                if data is None or data.empty:
+                    continue
+                chart = self._cache_get(self._chart_key(symbol, period, interval, data))
+                if chart is MISSING:
+                    groups.setdefault(str(data.index.tz), {})[symbol] = data
+                else:
+                    charts[symbol] = chart
+            
+            for group in groups.values():
+                panel = compute_indicators(Panel.from_frames(group))
+                for symbol, chart in panel.to_frames(OHLCV_COLUMNS + INDICATOR_COLUMNS).items():
+                    self._cache_set(self._chart_key(symbol, period, interval, group[symbol]), chart)
+                    charts[symbol] = chart
+            return {symbol: charts[symbol] for symbol in symbols if symbol in charts}
+    
+    def backtest(self, symbols, period='10y', **kwargs):
+        """Backtest de la regla de puntuación sobre el histórico largo de los símbolos
+        
+        Los procesos leen del almacén columnar los símbolos guardados en él; solo
+        los datos simulados viajan como DataFrames.
+        """
+        frames = self.get_data_bulk(symbols, period=period)
+        return run_backtest(frames, store=self.column_store, start=period_start(period), **kwargs)
+    
+    def optimize(self, symbols, candidates, period='10y', **kwargs):
+        """Barrido de ventanas, pesos y umbrales (``candidates``) sobre el histórico largo de los símbolos
+        
+        Como en ``backtest``, los procesos leen del almacén columnar los símbolos
+        guardados en él. Devuelve las candidatas ordenadas (ver ``optimize.run_sweep``).
+        """
+        frames = self.get_data_bulk(symbols, period=period)
+        return run_sweep(frames, candidates, store=self.column_store, start=period_start(period), **kwargs)
+    
+    def analyze_live(self, symbols, period='6mo'):
+        """Refresco en vivo: cada símbolo pasa solo sus barras nuevas a su estado de indicadores (O(1) por barra)
+        
+        Los símbolos con estado guardado no leen su serie: se descargan y guardan
+        sus barras nuevas y de la caché local solo se leen las posteriores a la
+        última barra del estado. Los que no tienen estado, o cuya serie ha cambiado
+        hacia atrás (ajustes), se reconstruyen una vez con la serie completa.
+        """
+        if self.indicator_states is None:
+            self.indicator_states = load_states(self.indicator_states_path)
+        
+        symbols = list(dict.fromkeys(symbols))
+        fresh = self._refresh_bars([s for s in symbols if s in self.indicator_states], period)
+        results, rebuild = {}, []
+        
+        for symbol in symbols:
+            state = self.indicator_states.get(symbol)
+            bars = None
+            if symbol in fresh:
+                # Unos días antes de la última barra del estado: la anterior sirve para validarlo
+                bars = self.price_cache.load(symbol, start=state.last_ts - np.timedelta64(LIVE_OVERLAP_DAYS, 'D'))
+            if bars is None or not self._state_matches(state, bars):
+                rebuild.append(symbol)
+                continue
+            # Solo la barra abierta (revisada) y las barras nuevas
+            new_bars = bars[bars.index >= state.last_ts]
+            for ts, row in zip(new_bars.index, new_bars[OHLCV_COLUMNS].itertuples(index=False)):
+                state.update(ts, *row)
+            results[symbol] = self._live_result(symbol, state)
+        
+        if rebuild:
+            for symbol, data in self.get_data_bulk(rebuild, period=period).items():
+                if data is None or len(data) < 2:
+                    continue
+                state = self.indicator_states[symbol] = IndicatorState.from_frame(data)
+                results[symbol] = self._live_result(symbol, state)
+        metrics.count('live.incremental', len(symbols) - len(rebuild))
+        metrics.count('live.rebuilt', len(rebuild))
+        
+        save_states(self.indicator_states_path, self.indicator_states)
+        return {symbol: results[symbol] for symbol in symbols if symbol in results}
+    
+    def _refresh_bars(self, symbols, period='6mo', interval='1d'):
+        """Descarga y guarda las barras nuevas de símbolos ya guardados, sin leer sus series
+        
+        Devuelve los símbolos cuya serie guardada se puede usar tal cual: al día o,
+        si la descarga ha fallado, la de la caché. El resto (sin caché, sin datos o
+        con precios ajustados) necesita la descarga completa.
+        """
+        fetcher = _fetcher()
+        starts = {symbol: self.price_cache.fetch_start(symbol, period, interval) for symbol in symbols}
+        fresh = set()
+        
+        def received(symbol, data):
+            if data is fetcher.FAILED or self.price_cache.merge(symbol, data, interval):
+                fresh.add(symbol)
+        
+        self._fetch_scheduler().fetch_many({
+            symbol: fetcher.fetch_params(start=start, interval=interval)
+            for symbol, start in starts.items() if start is not None
+        }, on_result=received)
+        return fresh
+    
+    def _live_result(self, symbol, state):
+        """``ScanResult`` de la última barra de un estado incremental"""
+        latest = state.values()
+        if latest['bars'] < MIN_BARS:
+            is_uptrend, score, signals = False, 0, {}
+        else:
+            is_uptrend, score, signals = self.score_latest(latest)
+        prev_close = state.state['prev_close']
+        return ScanResult.from_signals(
+            symbol, latest['Close'], (latest['Close'] - prev_close) / prev_close * 100, score, signals,
+            features=[latest.get(name, np.nan) for name in FEATURE_COLUMNS]
+        )
+    
+    def _state_matches(self, state, data):
+        """Comprueba que el estado incremental sigue siendo coherente con la serie cacheada"""
+        if state.last_ts is None or state.last_ts not in data.index:
+            return False
+        position = data.index.get_loc(state.last_ts)
+        if position == 0:
+            return False
+        cached_prev = data['Close'].iloc[position - 1]
+        return np.isclose(cached_prev, state.state['prev_close'], rtol=1e-4)
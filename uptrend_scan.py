@@ -0,0 +1,457 @@
+"""Escáner Uptrend sin interfaz gráfica (cron, servicios, scripts).
+
+Ejemplos:
+    python uptrend_scan.py categories
+    python uptrend_scan.py scan --categories sp500_mega_cap tech_leaders -o resultados.json
+    python uptrend_scan.py scan --symbols-file watchlist.txt -o resultados.csv --min-score 70
+    python uptrend_scan.py scan -c tech_leaders --timeframes 1h 4h 1d 1wk -o resultados.csv
+    python uptrend_scan.py rules > rules.json
+    python uptrend_scan.py scan -c etfs --rules mis_reglas.json -o resultados.csv
+    python uptrend_scan.py scan -c etfs --period 1y --as-of 2024-03-15 -o resultados.csv
+    python uptrend_scan.py breadth -c etfs tech_leaders --period 2y -o amplitud.csv
+    python uptrend_scan.py rescan -c etfs tech_leaders --levels 40 80 --webhook http://localhost:9000/hook
+    python uptrend_scan.py backtest --categories etfs --period 10y -o backtest.json
+    python uptrend_scan.py optimize -c sp500_mega_cap --samples 2000 --horizon 20 -o barrido.csv
+    python uptrend_scan.py optimize -c etfs --search grid --param sma_fast=10,20,30 --param threshold=50,60,70
+    python uptrend_scan.py --metrics metrics.prom --profile cprofile scan -c etfs
+    python uptrend_scan.py -v snapshot --interval 600
+
+Solo importa el núcleo de análisis (``uptrend_core``); el planificador de
+descargas (``fetcher``, con requests) se carga con la primera descarga y
+Streamlit y Plotly no se cargan nunca.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import nullcontext
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from instrumentation import PROFILERS, metrics, profile
+from optimize import METRICS, PARAMETERS, grid_candidates, random_candidates
+from rescan import SCORE_LEVELS, Rescanner
+from rules import RuleSet
+from scoring import MIN_BARS
+from snapshot_service import DEFAULT_INTERVAL, SnapshotService, SnapshotStore
+from timeframes import TIMEFRAME_MINUTES, timeframe_agreement
+from universe import Universe, read_symbols_file
+from uptrend_core import UptrendAnalyzer
+
+# Backends de descarga (``fetcher.BACKENDS``, repetidos aquí para no importar requests al arrancar)
+FETCH_BACKENDS = ('yfinance', 'chart')
+
+RESULT_COLUMNS = [
+    'symbol', 'category', 'price', 'change_pct', 'score', 'is_uptrend', 'uptrend_days', 'signals'
+]
+EVENT_COLUMNS = [
+    'time', 'symbol', 'categories', 'event', 'level', 'score', 'previous_score', 'price', 'change_pct',
+    'period', 'bar'
+]
+
+
+def collect_categories(analyzer, categories, symbols_files):
+    """Diccionario categoría -> símbolos a partir de claves de categoría y ficheros de símbolos"""
+    category_symbols = {}
+    for key in categories or []:
+        if key not in analyzer.symbols:
+            raise SystemExit(f"Categoría desconocida: {key} (usa 'categories' para ver la lista)")
+        category_symbols[key] = analyzer.symbols[key]
+    for path in symbols_files or []:
+        name = os.path.splitext(os.path.basename(path))[0]
+        category_symbols[name] = read_symbols_file(path)
+    if not category_symbols:
+        raise SystemExit("Indica al menos una categoría (--categories) o un fichero (--symbols-file)")
+    return category_symbols
+
+
+def results_to_frame(results, timeframe_results=None):
+    """Convierte los resultados (``ScanResult``) de ``UptrendAnalyzer.scan`` en una tabla
+
+    Con ``timeframe_results`` (de ``analyze_timeframes``) se añaden el score de
+    cada temporalidad (``score_1h``...) y el acuerdo entre ellas.
+    """
+    rows = [
+        dict(r.to_dict(), signals=';'.join(name for name, active in r.signals.items() if active))
+        for r in results
+    ]
+    columns = list(RESULT_COLUMNS)
+    if timeframe_results is not None:
+        timeframes = list(dict.fromkeys(tf for by_tf in timeframe_results.values() for tf in by_tf))
+        timeframes.sort(key=TIMEFRAME_MINUTES.get)
+        columns += [f'score_{tf}' for tf in timeframes] + ['timeframes_uptrend', 'timeframes_evaluated']
+        for row in rows:
+            by_timeframe = timeframe_results.get(row['symbol'], {})
+            row.update({f'score_{tf}': r.score for tf, r in by_timeframe.items()})
+            row['timeframes_uptrend'], row['timeframes_evaluated'] = timeframe_agreement(by_timeframe)
+    frame = pd.DataFrame(rows, columns=columns)
+    return frame.sort_values('score', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def write_frame(frame, output, fmt=None, metadata=None):
+    """Escribe la tabla en JSON, CSV o Parquet (según ``fmt`` o la extensión de ``output``)"""
+    if fmt is None:
+        extension = os.path.splitext(output or '')[1].lower().lstrip('.')
+        fmt = extension if extension in ('json', 'csv', 'parquet') else 'json'
+
+    if fmt == 'csv':
+        frame.to_csv(output or sys.stdout, index=False)
+    elif fmt == 'parquet':
+        if not output:
+            raise SystemExit("El formato Parquet necesita un fichero de salida (-o)")
+        frame.to_parquet(output, index=False)
+    else:
+        payload = dict(metadata or {}, results=json.loads(frame.to_json(orient='records')))
+        text = json.dumps(payload, indent=2, ensure_ascii=False)
+        if output:
+            with open(output, 'w') as f:
+                f.write(text)
+        else:
+            print(text)
+
+
+def cmd_categories(args, analyzer):
+    universe = analyzer.universe
+    for key, count in universe.counts().items():
+        print(f"{key:22s} {count:5d} símbolos  {universe.descriptions[key]}")
+    print(f"{'(únicos)':22s} {len(universe):5d} símbolos")
+
+
+def cmd_rules(args, analyzer):
+    print(RuleSet.load(args.rules).to_json())
+
+
+def cmd_scan(args, analyzer):
+    category_symbols = collect_categories(analyzer, args.categories, args.symbols_file)
+    rules = RuleSet.load(args.rules)
+    started = time.perf_counter()
+    if args.as_of:
+        # El escáner en una fecha pasada: panel de puntuaciones del periodo, evaluado en esa fecha
+        results = analyzer.replay(category_symbols, args.period).at(args.as_of)
+    else:
+        results = analyzer.scan(category_symbols, period=args.period, workers=args.workers)
+    timeframe_results = None
+    if args.timeframes:
+        timeframe_results = analyzer.analyze_timeframes(
+            list(dict.fromkeys(r.symbol for r in results)), args.timeframes
+        )
+    if not rules.is_builtin():
+        # Reglas propias: se re-puntúa sobre los indicadores de la última barra de cada resultado
+        results = rules.rescore(results)
+        if timeframe_results is not None:
+            timeframe_results = {
+                symbol: dict(zip(by_timeframe, rules.rescore(by_timeframe.values())))
+                for symbol, by_timeframe in timeframe_results.items()
+            }
+    elapsed = time.perf_counter() - started
+
+    frame = results_to_frame(results, timeframe_results)
+    if not args.all:
+        frame = frame[frame['is_uptrend'] & (frame['score'] >= args.min_score)]
+    else:
+        frame = frame[frame['score'] >= args.min_score]
+
+    metadata = {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'period': args.period,
+        'categories': list(category_symbols),
+        'as_of': args.as_of,
+        'analyzed': len(results),
+        'elapsed_seconds': round(elapsed, 3),
+    }
+    write_frame(frame, args.output, args.format, metadata)
+    logging.getLogger('uptrend').info(
+        "%d resultados (%d filtrados) en %.2fs", len(results), len(frame), elapsed
+    )
+
+
+def cmd_breadth(args, analyzer):
+    category_symbols = collect_categories(analyzer, args.categories, args.symbols_file)
+    breadth = analyzer.replay(category_symbols, args.period).breadth.iloc[MIN_BARS - 1:]
+    frame = breadth.rename_axis('date').reset_index()
+    frame['date'] = frame['date'].dt.strftime('%Y-%m-%d')
+    metadata = {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'period': args.period,
+        'categories': list(category_symbols),
+    }
+    write_frame(frame, args.output, args.format, metadata)
+
+
+def cmd_rescan(args, analyzer):
+    category_symbols = collect_categories(analyzer, args.categories, args.symbols_file)
+    rescanner = Rescanner(
+        analyzer, state_dir=args.state_dir, events=args.events, webhook=args.webhook,
+        levels=args.levels, rules=RuleSet.load(args.rules), workers=args.workers, live=args.live,
+    )
+    rescan = rescanner.run(category_symbols, period=args.period)
+    frame = pd.DataFrame(rescan['events'], columns=EVENT_COLUMNS)
+    frame['categories'] = frame['categories'].str.join(';')
+    metadata = {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'period': args.period,
+        'categories': list(category_symbols),
+        'analyzed': rescan['analyzed'],
+        'reused': rescan['reused'],
+        'elapsed_seconds': round(rescan['elapsed'], 3),
+    }
+    write_frame(frame, args.output, args.format, metadata)
+    logging.getLogger('uptrend').info(
+        "%d símbolos recalculados, %d reutilizados, %d eventos en %.2fs",
+        rescan['analyzed'], rescan['reused'], len(frame), rescan['elapsed']
+    )
+
+
+def cmd_backtest(args, analyzer):
+    category_symbols = collect_categories(analyzer, args.categories, args.symbols_file)
+    symbols = list(dict.fromkeys(s for group in category_symbols.values() for s in group))
+    result = analyzer.backtest(
+        symbols,
+        period=args.period,
+        threshold=args.threshold,
+        horizons=tuple(args.horizons),
+        workers=args.workers,
+    )
+
+    payload = {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'period': args.period,
+        'threshold': args.threshold,
+        'summary': result['summary'],
+        'horizons': json.loads(result['horizons'].reset_index().to_json(orient='records')),
+    }
+    text = json.dumps(payload, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.trades:
+        result['trades'].to_csv(args.trades, index=False)
+
+
+def parse_parameters(items):
+    """Valores de cada parámetro a partir de argumentos ``nombre=v1,v2,...``"""
+    space = {}
+    for item in items or []:
+        name, _, values = item.partition('=')
+        if name not in PARAMETERS or not values:
+            raise SystemExit(f"Parámetro no válido: {item!r} (usa nombre=v1,v2 con {', '.join(PARAMETERS)})")
+        try:
+            space[name] = tuple(int(v) for v in values.split(','))
+        except ValueError:
+            raise SystemExit(f"Valores no enteros en {item!r}")
+    return space
+
+
+def cmd_optimize(args, analyzer):
+    category_symbols = collect_categories(analyzer, args.categories, args.symbols_file)
+    symbols = list(dict.fromkeys(s for group in category_symbols.values() for s in group))
+    space = parse_parameters(args.param)
+    if args.search == 'grid':
+        try:
+            candidates = grid_candidates(space)
+        except ValueError as e:
+            raise SystemExit(str(e))
+    else:
+        candidates = random_candidates(space, args.samples, seed=args.seed)
+
+    started = time.perf_counter()
+    ranking = analyzer.optimize(
+        symbols, candidates,
+        period=args.period,
+        horizons=tuple(args.horizons),
+        metric=args.metric,
+        horizon=args.horizon,
+        min_signals=args.min_signals,
+        workers=args.workers,
+    )
+    elapsed = time.perf_counter() - started
+
+    default_rank = ranking.index[ranking['default']]
+    metadata = {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'period': args.period,
+        'categories': list(category_symbols),
+        'symbols': len(symbols),
+        'candidates': len(candidates),
+        'metric': f"{args.metric}_{args.horizon or args.horizons[-1]}",
+        'default_rank': int(default_rank[0]) + 1 if len(default_rank) else None,
+        'elapsed_seconds': round(elapsed, 3),
+    }
+    write_frame(ranking.head(args.top), args.output, args.format, metadata)
+    logging.getLogger('uptrend').info(
+        "%d configuraciones en %.1fs; las actuales quedan en el puesto %s", len(candidates), elapsed,
+        metadata['default_rank']
+    )
+
+
+def cmd_snapshot(args, analyzer):
+    service = SnapshotService(
+        analyzer, SnapshotStore(args.dir), interval=args.interval, period=args.period, workers=args.workers
+    )
+    if not args.once:
+        try:
+            service.run_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    snapshot = service.run_once(force=True)
+    if snapshot is None:
+        raise SystemExit("No se publicó ningún snapshot (sin resultados u otro escaneo en curso)")
+    print(f"Snapshot v{snapshot.version}: {len(snapshot.results)} resultados en {snapshot.elapsed:.1f}s "
+          f"({service.store.path})")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Escáner Uptrend Signals sin interfaz")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Muestra el progreso y los avisos")
+    parser.add_argument('--demo', action='store_true', help="Usa datos simulados si no hay conexión")
+    parser.add_argument('--max-in-flight', type=int, default=8, help="Descargas simultáneas como máximo")
+    parser.add_argument('--rate', type=float, default=10.0, help="Peticiones por segundo como máximo")
+    parser.add_argument('--backend', choices=FETCH_BACKENDS, default=None,
+                        help="Origen de las descargas: yfinance (por defecto) o la API de gráficos de Yahoo")
+    parser.add_argument('--universe', metavar='DIRECTORIO',
+                        help="Directorio de universos (CSV/Parquet por categoría; por defecto, universes/)")
+    parser.add_argument('--metrics', metavar='FICHERO',
+                        help="Mide las etapas y escribe las métricas (.prom/.txt: Prometheus; si no, JSON)")
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'],
+                        help="Perfila la ejecución y escribe el informe en stderr")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('categories', help="Lista las categorías disponibles")
+
+    rules = subparsers.add_parser('rules', help="Muestra las reglas de puntuación en JSON (base para editarlas)")
+    rules.add_argument('--rules', metavar='FICHERO', help="Fichero de reglas (por defecto, UPTREND_RULES)")
+
+    def add_universe(sub):
+        sub.add_argument('-c', '--categories', nargs='+', help="Claves de categoría (ver 'categories')")
+        sub.add_argument('-s', '--symbols-file', action='append',
+                         help="Fichero de símbolos (uno por línea o CSV con columna 'symbol')")
+        sub.add_argument('-o', '--output', help="Fichero de salida (por defecto, stdout)")
+
+    scan = subparsers.add_parser('scan', help="Escanea categorías y escribe los resultados")
+    add_universe(scan)
+    scan.add_argument('-f', '--format', choices=['json', 'csv', 'parquet'],
+                      help="Formato de salida (por defecto, según la extensión)")
+    scan.add_argument('--period', default='6mo', help="Periodo de datos (6mo, 1y, ...)")
+    scan.add_argument('--min-score', type=int, default=60, help="Puntuación mínima")
+    scan.add_argument('--all', action='store_true', help="Incluye símbolos sin señal Uptrend")
+    scan.add_argument('--workers', type=int, default=None,
+                      help="Procesos para el cálculo de indicadores (por defecto, uno por núcleo)")
+    scan.add_argument('--rules', metavar='FICHERO',
+                      help="Reglas de puntuación en JSON (por defecto rules.json o UPTREND_RULES, si existen)")
+    scan.add_argument('--as-of', metavar='FECHA',
+                      help="Resultados que habría dado el escáner en esa fecha (dentro de --period)")
+    scan.add_argument('--timeframes', nargs='+', choices=list(TIMEFRAME_MINUTES),
+                      help="Añade el score en cada temporalidad (una sola descarga intradía por símbolo)")
+
+    breadth = subparsers.add_parser('breadth', help="Amplitud diaria: fracción de cada categoría en uptrend")
+    add_universe(breadth)
+    breadth.add_argument('-f', '--format', choices=['json', 'csv', 'parquet'],
+                         help="Formato de salida (por defecto, según la extensión)")
+    breadth.add_argument('--period', default='1y', help="Periodo histórico (por defecto 1y)")
+
+    rescan = subparsers.add_parser(
+        'rescan', help="Reescanea solo los símbolos con barras nuevas y registra las transiciones de señal"
+    )
+    add_universe(rescan)
+    rescan.add_argument('-f', '--format', choices=['json', 'csv', 'parquet'],
+                        help="Formato de salida de los eventos (por defecto, según la extensión)")
+    rescan.add_argument('--period', default='6mo', help="Periodo de datos (6mo, 1y, ...)")
+    rescan.add_argument('--levels', type=int, nargs='+', default=list(SCORE_LEVELS),
+                        help="Niveles de score cuyo cruce genera un evento")
+    rescan.add_argument('--events', metavar='FICHERO',
+                        help="Registro JSONL de eventos (por defecto UPTREND_EVENTS o events.jsonl de la caché)")
+    rescan.add_argument('--webhook', metavar='URL',
+                        help="URL a la que enviar los eventos por POST (por defecto, UPTREND_WEBHOOK_URL)")
+    rescan.add_argument('--state-dir', metavar='DIRECTORIO',
+                        help="Directorio del estado entre reescaneos (por defecto, el de la caché)")
+    rescan.add_argument('--workers', type=int, default=None, help="Procesos para el cálculo de indicadores")
+    rescan.add_argument('--rules', metavar='FICHERO',
+                        help="Reglas de puntuación en JSON (por defecto rules.json o UPTREND_RULES, si existen)")
+    rescan.add_argument('--live', action='store_true',
+                        help="Estado incremental de indicadores: solo se descargan y procesan las barras nuevas")
+
+    backtest = subparsers.add_parser('backtest', help="Backtest de la regla de puntuación")
+    add_universe(backtest)
+    backtest.add_argument('--period', default='10y', help="Periodo histórico (por defecto 10y)")
+    backtest.add_argument('--threshold', type=int, default=60, help="Umbral de entrada del score")
+    backtest.add_argument('--horizons', type=int, nargs='+', default=[5, 10, 20],
+                          help="Horizontes (en barras) de los retornos futuros")
+    backtest.add_argument('--workers', type=int, default=None, help="Procesos en paralelo")
+    backtest.add_argument('--trades', help="CSV opcional con todas las operaciones")
+
+    optimize = subparsers.add_parser('optimize', help="Barrido de ventanas, pesos y umbrales del algoritmo")
+    add_universe(optimize)
+    optimize.add_argument('-f', '--format', choices=['json', 'csv', 'parquet'],
+                          help="Formato de salida (por defecto, según la extensión)")
+    optimize.add_argument('--period', default='10y', help="Periodo histórico (por defecto 10y)")
+    optimize.add_argument('--search', choices=['random', 'grid'], default='random',
+                          help="Búsqueda aleatoria en todo el espacio o rejilla de los valores de --param")
+    optimize.add_argument('--samples', type=int, default=2000, help="Configuraciones de la búsqueda aleatoria")
+    optimize.add_argument('--seed', type=int, default=0, help="Semilla de la búsqueda aleatoria")
+    optimize.add_argument('--param', action='append', metavar='NOMBRE=V1,V2',
+                          help="Valores de un parámetro (en la rejilla, los omitidos valen lo de siempre)")
+    optimize.add_argument('--horizons', type=int, nargs='+', default=[5, 10, 20],
+                          help="Horizontes (en barras) de los retornos futuros")
+    optimize.add_argument('--horizon', type=int, help="Horizonte por el que se ordena (por defecto, el último)")
+    optimize.add_argument('--metric', choices=METRICS, default='excess_return', help="Métrica por la que se ordena")
+    optimize.add_argument('--min-signals', type=int, default=100,
+                          help="Barras con señal mínimas para clasificar una configuración")
+    optimize.add_argument('--top', type=int, default=50, help="Configuraciones que se escriben")
+    optimize.add_argument('--workers', type=int, default=None, help="Procesos en paralelo")
+
+    snapshot = subparsers.add_parser('snapshot', help="Publica snapshots periódicos de todas las categorías")
+    snapshot.add_argument('--interval', type=int, default=DEFAULT_INTERVAL,
+                          help=f"Segundos entre escaneos (por defecto {DEFAULT_INTERVAL})")
+    snapshot.add_argument('--once', action='store_true', help="Publica un snapshot y termina")
+    snapshot.add_argument('--period', default='6mo', help="Periodo de datos (6mo, 1y, ...)")
+    snapshot.add_argument('--workers', type=int, default=None, help="Procesos para el cálculo de indicadores")
+    snapshot.add_argument('--dir', help="Directorio de snapshots (por defecto, el de la caché)")
+
+    return parser
+
+
+COMMANDS = {
+    'categories': cmd_categories,
+    'rules': cmd_rules,
+    'scan': cmd_scan,
+    'breadth': cmd_breadth,
+    'rescan': cmd_rescan,
+    'backtest': cmd_backtest,
+    'optimize': cmd_optimize,
+    'snapshot': cmd_snapshot,
+}
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.ERROR,
+        format='%(asctime)s %(levelname)s %(message)s'
+    )
+    analyzer = UptrendAnalyzer(
+        demo_mode=args.demo, universe=Universe.load(args.universe),
+        fetch_options={'max_in_flight': args.max_in_flight, 'rate': args.rate, 'backend': args.backend}
+    )
+    if args.metrics:
+        metrics.enabled = True
+    if args.profile and args.profile not in PROFILERS:
+        raise SystemExit(f"{args.profile} no está instalado")
+
+    with (profile(args.profile) if args.profile else nullcontext()) as report:
+        COMMANDS[args.command](args, analyzer)
+
+    if report is not None:
+        print(report.text, file=sys.stderr)
+    if args.metrics:
+        metrics.write(args.metrics)
+
+
+if __name__ == '__main__':
+    main()